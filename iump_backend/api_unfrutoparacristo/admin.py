@@ -1,13 +1,21 @@
-from django.contrib import admin
+import io
+
+from django import forms
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
 from .models import (
     Usuario, Alumno, Profesor, Clase, Mascota,
     Cesta, Fruto, FrutoAsignado, Servicio, TipoServicio,
     Actividad, TipoActividad, ActividadDetalle,
-    Desafio, DesafioDetalle, Regla, Asistencia, FrutoColocado, MascotaEstado, 
+    Desafio, DesafioDetalle, Regla, Asistencia, AsistenciaAlumno, FrutoColocado, MascotaEstado, 
     CestaDetalle, DesafioCumplido, DesafioClase,
-    Noticia
+    Noticia, CorreoSaliente
 )
+from .importacion_alumnos import comprobar_codificacion, importar_alumnos, leer_archivo
 
 # --- Inlines para una mejor gestión ---
 
@@ -35,9 +43,30 @@ class CestaDetalleInline(admin.TabularInline):
     extra = 1 # Cuántos campos vacíos mostrar
     autocomplete_fields = ['cestadetalle_fruto']
 
+# Inline para los alumnos presentes en una asistencia
+class AsistenciaAlumnoInline(admin.TabularInline):
+    model = AsistenciaAlumno
+    extra = 0
+    fk_name = 'asistenciaalumno_asistencia'
+    autocomplete_fields = ['asistenciaalumno_usuario']
+
 
 # --- Configuraciones del Admin para cada Modelo ---
 
+class ImportarAlumnosForm(forms.Form):
+    archivo = forms.FileField(help_text="Nómina de texto (bloques NOMBRE / RUT / FECHA NACIMIENTO por CLASE) o CSV en UTF-8.")
+    formato = forms.ChoiceField(choices=[('auto', 'Detectar'), ('nomina', 'Nómina de texto'), ('csv', 'CSV')], initial='auto')
+    clase = forms.ModelChoiceField(
+        queryset=Clase.objects.all(), required=False,
+        help_text="Si se elige, todos los alumnos quedan en esta clase. Si no, se usa la clase indicada en el archivo.",
+    )
+    password_inicial = forms.CharField(
+        required=False, widget=forms.PasswordInput,
+        help_text="Contraseña inicial común. Sin ella las cuentas quedan sin contraseña hasta que un profesor la asigne.",
+    )
+    simular = forms.BooleanField(required=False, help_text="Solo valida el archivo, sin crear nada.")
+
+
 @admin.register(Usuario)
 class UsuarioAdmin(BaseUserAdmin):
     """
@@ -62,6 +91,52 @@ class UsuarioAdmin(BaseUserAdmin):
         ('Fechas Importantes', {'fields': ('last_login', 'date_joined')}),
     )
     readonly_fields = ('last_login', 'date_joined')
+    # Agrega el botón "Importar alumnos" sobre la lista
+    change_list_template = 'admin/api_unfrutoparacristo/usuario/change_list.html'
+
+    def get_urls(self):
+        propias = [
+            path('importar-alumnos/', self.admin_site.admin_view(self.importar_alumnos_view), name='importar_alumnos'),
+        ]
+        return propias + super().get_urls()
+
+    def importar_alumnos_view(self, request):
+        """Sube una nómina o CSV y crea los alumnos en lote (ver importacion_alumnos.py)."""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        resultado = None
+        form = ImportarAlumnosForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            datos = form.cleaned_data
+            # Se decodifica el archivo subido como flujo, sin leerlo completo en memoria
+            archivo = io.TextIOWrapper(datos['archivo'].file, encoding='utf-8-sig', newline='')
+            try:
+                comprobar_codificacion(datos['archivo'].file, 'utf-8-sig')
+                resultado = importar_alumnos(
+                    leer_archivo(archivo, datos['formato']),
+                    clase=datos['clase'],
+                    password=datos['password_inicial'] or None,
+                    simular=datos['simular'],
+                )
+            except UnicodeDecodeError:
+                form.add_error('archivo', "El archivo debe estar en UTF-8. No se importó ningún alumno.")
+            else:
+                accion = "se crearían" if datos['simular'] else "se crearon"
+                nivel = messages.WARNING if resultado.errores else messages.SUCCESS
+                self.message_user(
+                    request, f"{resultado.creados} alumnos {accion}; {len(resultado.errores)} filas con errores.", nivel,
+                )
+
+        contexto = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Importar alumnos",
+            'form': form,
+            'resultado': resultado,
+        }
+        return TemplateResponse(request, 'admin/api_unfrutoparacristo/usuario/importar_alumnos.html', contexto)
+
 
 
 @admin.register(Clase)
@@ -93,10 +168,10 @@ class ServicioAdmin(admin.ModelAdmin):
 
 @admin.register(Asistencia)
 class AsistenciaAdmin(admin.ModelAdmin):
+    inlines = [AsistenciaAlumnoInline]
     list_display = ('asistencia_servicio', 'asistencia_fecha', 'asistencia_tipo_clase')
     list_filter = ('asistencia_tipo_clase', 'asistencia_fecha')
     autocomplete_fields = ['asistencia_servicio', 'asistencia_tipo_clase', 'asistencia_fruto_asociado']
-    readonly_fields = ('asistencia_rutAsistentes',) # Es mejor no editar esta cadena directamente
 
 @admin.register(Fruto)
 class FrutoAdmin(admin.ModelAdmin):
@@ -222,3 +297,20 @@ class DesafioClaseAdmin(admin.ModelAdmin):
     def desactivar_desafios(self, request, queryset):
         queryset.update(desafio_activo=False)
     desactivar_desafios.short_description = "Desactivar desafíos seleccionados"
+
+
+@admin.register(CorreoSaliente)
+class CorreoSalienteAdmin(admin.ModelAdmin):
+    """
+    Permite revisar la cola de correos y reintentar los fallidos.
+    """
+    list_display = ('correo_asunto', 'correo_estado', 'correo_intentos', 'correo_proximo_intento', 'correo_enviado')
+    list_filter = ('correo_estado',)
+    search_fields = ('correo_asunto',)
+    readonly_fields = ('correo_creado', 'correo_enviado', 'correo_ultimo_error')
+
+    actions = ['reintentar_correos']
+
+    def reintentar_correos(self, request, queryset):
+        queryset.update(correo_estado='pendiente', correo_intentos=0, correo_proximo_intento=timezone.now())
+    reintentar_correos.short_description = "Reintentar correos seleccionados"
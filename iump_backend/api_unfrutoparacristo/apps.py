@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 class ApiUnfrutoparacristoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
@@ -6,5 +7,8 @@ class ApiUnfrutoparacristoConfig(AppConfig):
 
     def ready(self):
         import api_unfrutoparacristo.signals  # noqa: F401
+        from api_unfrutoparacristo.base_datos import aplicar_pragmas
+
+        connection_created.connect(aplicar_pragmas, dispatch_uid='api_unfrutoparacristo.aplicar_pragmas')
 
 
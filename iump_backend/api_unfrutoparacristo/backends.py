@@ -1,19 +1,59 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from . import rut
+from .throttling import segundos_bloqueo_restantes
+
+
+def buscar_usuario_por_identificador(identificador):
+    """
+    Encuentra al usuario que corresponde a un username, email o RUT con una sola consulta.
+    Si el identificador parece un email o un RUT se busca también por ese campo
+    normalizado; el username exacto tiene prioridad, igual que antes.
+    """
+    UserModel = get_user_model()
+    identificador = (identificador or '').strip()
+    if not identificador:
+        return None
+
+    condicion = Q(username=identificador)
+    usuarios = UserModel.objects.select_related('usuario_clase_actual')
+
+    if '@' in identificador:
+        usuarios = usuarios.annotate(email_normalizado=Lower('usuario_email'))
+        condicion |= Q(email_normalizado=identificador.lower())
+    elif set(identificador) <= rut.CARACTERES and rut.PATRON.match(rut.limpiar(identificador)):
+        condicion |= UserModel.filtro_rut(identificador)
+
+    candidatos = list(usuarios.filter(condicion)[:2])
+    for usuario in candidatos:
+        if usuario.username == identificador:
+            return usuario
+    return candidatos[0] if candidatos else None
+
 
 class EmailOrUsernameBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
         UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        user = buscar_usuario_por_identificador(username)
+        if request is not None:
+            # El login cuenta los fallos también por cuenta (ver throttling.py)
+            request.usuario_identificado = user
+        if user is None:
+            # Se calcula el hash igual para que un usuario inexistente no responda más rápido
+            UserModel().set_password(password)
+            return None
 
-        try:
-            # Intentamos con email
-            user = UserModel.objects.get(email=username)
-        except UserModel.DoesNotExist:
-            try:
-                # Intentamos con username
-                user = UserModel.objects.get(username=username)
-            except UserModel.DoesNotExist:
-                return None
+        if segundos_bloqueo_restantes(username, user.pk) is not None:
+            # Cuenta bloqueada por fallos con otro identificador: no se verifica la contraseña
+            return None
 
         if user.check_password(password) and self.user_can_authenticate(user):
             return user
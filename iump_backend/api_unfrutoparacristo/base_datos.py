@@ -0,0 +1,66 @@
+# api_unfrutoparacristo/base_datos.py
+"""
+Ajustes de SQLite para instalaciones de un solo servidor.
+
+`aplicar_pragmas` se conecta a la señal connection_created (ver apps.py) y
+ejecuta los PRAGMA de settings.SQLITE_PRAGMAS en cada conexión nueva:
+
+- journal_mode=WAL: los lectores no esperan al escritor, así un GET que
+  guarda el desgaste de la mascota no bloquea al resto. Queda guardado en el
+  archivo de la base.
+- synchronous=NORMAL: con WAL sigue siendo seguro ante caídas del proceso;
+  solo un corte de energía puede perder las últimas transacciones.
+- busy_timeout: milisegundos que un escritor espera el bloqueo antes de
+  fallar con "database is locked".
+- mmap_size / cache_size: lecturas desde memoria en lugar de llamadas read().
+
+Un valor None en SQLITE_PRAGMAS omite ese PRAGMA. Con PostgreSQL no hace nada.
+"""
+import re
+
+from django.conf import settings
+
+PRAGMAS_POR_DEFECTO = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 64 * 1024 * 1024,
+    # Negativo: tamaño en KiB en lugar de páginas
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+
+# Los PRAGMA no aceptan parámetros; se validan nombre y valor antes de armar el SQL
+_IDENTIFICADOR = re.compile(r'^[A-Za-z_]+$')
+
+
+def pragmas():
+    """PRAGMA a aplicar: los por defecto con los de settings.SQLITE_PRAGMAS encima."""
+    return {**PRAGMAS_POR_DEFECTO, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+
+
+def _sentencia(nombre, valor):
+    if not _IDENTIFICADOR.match(nombre):
+        raise ValueError(f"Nombre de PRAGMA inválido: {nombre!r}")
+    if not (isinstance(valor, int) or (isinstance(valor, str) and _IDENTIFICADOR.match(valor))):
+        raise ValueError(f"Valor inválido para PRAGMA {nombre}: {valor!r}")
+    return f'PRAGMA {nombre} = {valor}'
+
+
+def aplicar_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for nombre, valor in pragmas().items():
+            if valor is not None:
+                cursor.execute(_sentencia(nombre, valor))
+
+
+def estadisticas_sqlite(cursor):
+    """Tamaño de página, páginas totales y libres, y modo del journal de la base abierta."""
+    datos = {}
+    for pragma in ('page_size', 'page_count', 'freelist_count', 'journal_mode'):
+        cursor.execute(f'PRAGMA {pragma}')
+        datos[pragma] = cursor.fetchone()[0]
+    datos['bytes'] = datos['page_size'] * datos['page_count']
+    return datos
@@ -0,0 +1,104 @@
+# api_unfrutoparacristo/bitacora.py
+"""
+Registro (logging) estructurado de la aplicación.
+
+- ManejadorCola: el hilo de la petición solo deja el registro en una cola en
+  memoria (QueueHandler); un QueueListener en segundo plano lo escribe en la
+  salida. Así una salida lenta no bloquea las peticiones.
+- FiltroMuestreo: deja pasar solo una fracción de los registros de bajo nivel
+  (configurable). Las advertencias y errores siempre pasan.
+- FormatoEstructurado: una línea JSON por registro, con los campos de `extra`.
+
+Cada módulo usa su propio logger con `logging.getLogger(__name__)`. El nivel
+y la tasa de muestreo se configuran en settings.LOGGING.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+# Atributos propios de LogRecord; el resto proviene de `extra`
+_ATRIBUTOS_ESTANDAR = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'tasa_muestreo'}
+
+
+class FormatoEstructurado(logging.Formatter):
+    """Formatea cada registro como una línea JSON."""
+
+    def format(self, record):
+        datos = {
+            'fecha': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+        }
+        datos.update({clave: valor for clave, valor in vars(record).items() if clave not in _ATRIBUTOS_ESTANDAR})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            datos['excepcion'] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class FiltroMuestreo(logging.Filter):
+    """
+    Deja pasar cada registro bajo `nivel_minimo` con probabilidad `tasa`.
+    Un registro puede indicar su propia tasa con extra={'tasa_muestreo': 0.01}.
+    """
+
+    def __init__(self, tasa=1.0, nivel_minimo='WARNING'):
+        super().__init__()
+        self.tasa = float(tasa)
+        self.nivel_minimo = logging.getLevelName(nivel_minimo) if isinstance(nivel_minimo, str) else nivel_minimo
+
+    def filter(self, record):
+        if record.levelno >= self.nivel_minimo:
+            return True
+        tasa = getattr(record, 'tasa_muestreo', self.tasa)
+        return tasa >= 1 or random.random() < tasa
+
+
+class ManejadorCola(QueueHandler):
+    """
+    QueueHandler con su propio QueueListener, que escribe en `stream`
+    (stderr por defecto) con FormatoEstructurado desde un hilo aparte.
+    """
+
+    def __init__(self, stream=None, capacidad=10000):
+        super().__init__(queue.Queue(capacidad))
+        destino = logging.StreamHandler(stream or sys.stderr)
+        destino.setFormatter(FormatoEstructurado())
+        self.listener = QueueListener(self.queue, destino, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self._detener_listener)
+
+    def _detener_listener(self):
+        # Vacía la cola pendiente; puede llamarse desde close() y desde atexit
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def prepare(self, record):
+        # Se copia el registro con sus campos de `extra`; el JSON se arma en el
+        # hilo del listener. El traceback pasa como texto para no retener los
+        # frames de la petición.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Si la salida no da abasto se descarta el registro antes que bloquear la petición
+            pass
+
+    def close(self):
+        self._detener_listener()
+        super().close()
@@ -0,0 +1,49 @@
+# api_unfrutoparacristo/catalogo_clases.py
+"""
+Catálogo público de clases (/clases/) ya renderizado como JSON.
+
+La página de registro lo pide antes de que nadie inicie sesión y casi nunca
+cambia, así que el JSON completo se guarda en la caché junto con la versión
+'clases' (ver versiones.py) con la que se armó. Mientras esa versión no
+cambie, la vista devuelve los bytes guardados: solo se consulta la versión,
+sin cargar clases ni pasar por el serializer.
+
+La versión 'clases' la incrementan las señales al guardar o borrar una Clase
+o una Mascota, y cuando cambia el profesor jefe que se muestra (su username,
+o se borra y la clase queda sin jefe). Al reconstruir se cargan mascota y
+profesor jefe con select_related: una consulta para todo el catálogo.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from . import versiones
+from .models import Clase
+from .serializers import ClaseSerializer
+
+CLAVE = 'catalogo_clases'
+# Lo que decide cuándo reconstruir es la versión; el TTL solo evita guardar la copia para siempre
+TTL = getattr(settings, 'CATALOGO_CLASES_TTL', 24 * 60 * 60)
+
+
+def _construir():
+    clases = Clase.objects.select_related('clase_mascota', 'clase_profesor_jefe').order_by('clase_id')
+    return JSONRenderer().render(ClaseSerializer(clases, many=True).data)
+
+
+def contenido(version=None):
+    """
+    JSON (bytes) del catálogo de clases; se reconstruye solo si cambió la
+    versión 'clases'. `version` es la ya leída por respuesta_condicional, si la hay.
+    """
+    if version is None:
+        version = versiones.obtener('clases')[0]['clases']
+    guardado = cache.get(CLAVE)
+    if guardado is not None and guardado[0] == version:
+        return guardado[1]
+
+    # La versión se lee antes que la base: si algo cambia entremedio, lo
+    # guardado queda con la versión vieja y el siguiente GET lo reconstruye.
+    json_clases = _construir()
+    cache.set(CLAVE, (version, json_clases), TTL)
+    return json_clases
@@ -0,0 +1,62 @@
+# api_unfrutoparacristo/catalogo_frutos.py
+"""
+Catálogo de frutos en memoria del proceso.
+
+Los tipos de fruto casi nunca cambian, así que cada worker los carga una
+sola vez (una consulta) y los busca por id o por color sin volver a la base
+de datos. Las señales post_save/post_delete de Fruto invalidan el catálogo
+del proceso que hizo el cambio; los demás workers lo recargan al cumplirse
+CATALOGO_FRUTOS_TTL.
+
+Las instancias devueltas se comparten entre peticiones: son de solo lectura.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Fruto
+
+TTL = getattr(settings, 'CATALOGO_FRUTOS_TTL', 5 * 60)
+
+# (por_id, por_color, momento de carga). Se reemplaza completo para que
+# los hilos nunca vean un catálogo a medio construir.
+_estado = None
+_lock = threading.Lock()
+
+
+def _catalogo():
+    global _estado
+    estado = _estado
+    if estado is not None and time.monotonic() - estado[2] < TTL:
+        return estado
+
+    with _lock:
+        if _estado is None or time.monotonic() - _estado[2] >= TTL:
+            frutos = list(Fruto.objects.order_by('fruto_id'))
+            _estado = (
+                {fruto.fruto_id: fruto for fruto in frutos},
+                {fruto.fruto_color: fruto for fruto in frutos if fruto.fruto_color},
+                time.monotonic(),
+            )
+        return _estado
+
+
+def por_id(fruto_id):
+    """Devuelve el Fruto con ese id, o None si no existe."""
+    return _catalogo()[0].get(fruto_id)
+
+
+def por_color(color):
+    """Devuelve el Fruto de ese color, o None si no existe."""
+    return _catalogo()[1].get(color)
+
+
+def todos():
+    """Todos los frutos ordenados por id."""
+    return list(_catalogo()[0].values())
+
+
+def invalidar():
+    global _estado
+    _estado = None
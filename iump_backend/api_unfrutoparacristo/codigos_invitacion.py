@@ -0,0 +1,101 @@
+# api_unfrutoparacristo/codigos_invitacion.py
+"""
+Códigos de invitación de los alumnos: 6 caracteres A-Z0-9, únicos.
+
+En lugar de sortear un código y preguntar si existe, cada código sale de un
+número de secuencia (Secuencia 'codigo_invitacion') pasado por una
+permutación con clave: una red de Feistel sobre los dos bloques de tres
+caracteres. La permutación es biyectiva sobre los 36^6 códigos posibles, así
+que números distintos dan códigos distintos, y sin la clave no se puede
+adivinar el código siguiente a partir de uno conocido.
+
+Pedir N códigos cuesta una reserva de la secuencia y una consulta IN que
+descarta los pocos que coincidan con códigos antiguos (generados al azar
+antes de este módulo o con otra clave). La restricción unique de
+alumno_codigo_invitacion sigue siendo la garantía final.
+
+La clave es settings.CODIGO_INVITACION_CLAVE o, si no está, una derivada de
+SECRET_KEY. Cambiarla no invalida los códigos ya entregados.
+"""
+import hashlib
+import hmac
+import string
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import Alumno, Secuencia
+
+ALFABETO = string.ascii_uppercase + string.digits
+LARGO = 6
+# Cada mitad de la red de Feistel es un bloque de tres caracteres
+MITAD = len(ALFABETO) ** (LARGO // 2)
+ESPACIO = MITAD * MITAD
+RONDAS = 4
+
+NOMBRE_SECUENCIA = 'codigo_invitacion'
+
+
+def _clave():
+    clave = getattr(settings, 'CODIGO_INVITACION_CLAVE', None)
+    if clave is None:
+        clave = hashlib.sha256(b'codigo_invitacion:' + settings.SECRET_KEY.encode()).hexdigest()
+    return clave.encode()
+
+
+def _ronda(mac, ronda, valor):
+    mac = mac.copy()
+    mac.update(f'{ronda}:{valor}'.encode())
+    return int.from_bytes(mac.digest()[:8], 'big') % MITAD
+
+
+def permutar(numero, clave=None):
+    """Lleva un número de [0, 36^6) a otro del mismo rango; distinto número, distinto resultado."""
+    if not 0 <= numero < ESPACIO:
+        raise ValueError(f"El número {numero} está fuera del espacio de códigos.")
+    mac = hmac.new(clave or _clave(), digestmod=hashlib.sha256)
+    izquierda, derecha = divmod(numero, MITAD)
+    for ronda in range(RONDAS):
+        izquierda, derecha = derecha, (izquierda + _ronda(mac, ronda, derecha)) % MITAD
+    return izquierda * MITAD + derecha
+
+
+def codificar(numero):
+    """Escribe el número en base 36 con LARGO caracteres."""
+    caracteres = []
+    for _ in range(LARGO):
+        numero, resto = divmod(numero, len(ALFABETO))
+        caracteres.append(ALFABETO[resto])
+    return ''.join(reversed(caracteres))
+
+
+def generar(cantidad):
+    """
+    Devuelve `cantidad` códigos distintos que ningún alumno tiene todavía.
+    Normalmente cuesta una reserva de secuencia y una consulta.
+    """
+    if cantidad <= 0:
+        return []
+    clave = _clave()
+    codigos = []
+    while len(codigos) < cantidad:
+        faltan = cantidad - len(codigos)
+        candidatos = [codificar(permutar(numero, clave)) for numero in Secuencia.reservar(NOMBRE_SECUENCIA, faltan)]
+        usados = set(
+            Alumno.objects.filter(alumno_codigo_invitacion__in=candidatos).values_list('alumno_codigo_invitacion', flat=True)
+        )
+        codigos += [codigo for codigo in candidatos if codigo not in usados]
+    return codigos
+
+
+def asignar_codigo(alumno):
+    """Asigna y guarda un código nuevo en el perfil `alumno`."""
+    while True:
+        alumno.alumno_codigo_invitacion = generar(1)[0]
+        try:
+            with transaction.atomic():
+                alumno.save(update_fields=['alumno_codigo_invitacion'])
+            return
+        except IntegrityError:
+            # Alguien guardó ese código por otra vía entre la consulta y el UPDATE
+            continue
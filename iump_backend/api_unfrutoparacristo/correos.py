@@ -0,0 +1,143 @@
+# api_unfrutoparacristo/correos.py
+"""
+Cola de salida de correos.
+
+ColaCorreoBackend es un backend de correo de Django: `send_mail` y compañía
+solo insertan filas en CorreoSaliente, así la petición responde sin esperar
+al servidor SMTP. El comando `enviar_correos` llama a `enviar_pendientes`, que
+despacha la cola por lotes reutilizando una sola conexión, con reintentos y
+espera exponencial.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CorreoSaliente
+
+MAX_INTENTOS = getattr(settings, 'CORREO_MAX_INTENTOS', 5)
+ESPERA_BASE_SEGUNDOS = getattr(settings, 'CORREO_ESPERA_BASE_SEGUNDOS', 60)
+
+# Tiempo que un worker reserva un lote. Si el worker muere, el correo
+# vuelve a estar disponible cuando se cumple este plazo.
+RESERVA = datetime.timedelta(minutes=10)
+
+
+class ColaCorreoBackend(BaseEmailBackend):
+    """
+    Backend que encola los mensajes en la base de datos en lugar de enviarlos.
+    Los adjuntos no se guardan en la cola.
+    """
+
+    def send_messages(self, email_messages):
+        correos = [
+            CorreoSaliente(
+                correo_asunto=mensaje.subject,
+                correo_cuerpo=mensaje.body,
+                correo_remitente=mensaje.from_email or settings.DEFAULT_FROM_EMAIL,
+                correo_destinatarios=list(mensaje.to),
+                correo_cc=list(mensaje.cc),
+                correo_bcc=list(mensaje.bcc),
+                correo_responder_a=list(mensaje.reply_to),
+                correo_alternativas=[list(alternativa) for alternativa in getattr(mensaje, 'alternatives', [])],
+            )
+            for mensaje in email_messages
+            if mensaje.recipients()
+        ]
+        CorreoSaliente.objects.bulk_create(correos)
+        return len(correos)
+
+
+def _construir_mensaje(correo, conexion):
+    mensaje = EmailMultiAlternatives(
+        subject=correo.correo_asunto,
+        body=correo.correo_cuerpo,
+        from_email=correo.correo_remitente,
+        to=correo.correo_destinatarios,
+        cc=correo.correo_cc,
+        bcc=correo.correo_bcc,
+        reply_to=correo.correo_responder_a,
+        connection=conexion,
+    )
+    for contenido, tipo in correo.correo_alternativas:
+        mensaje.attach_alternative(contenido, tipo)
+    return mensaje
+
+
+def _reservar_lote(limite):
+    """
+    Toma hasta `limite` correos pendientes y los reserva para este worker.
+    En bases que lo soportan (PostgreSQL) se saltan las filas que otro worker tiene bloqueadas.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        pendientes = CorreoSaliente.objects.filter(
+            correo_estado='pendiente',
+            correo_proximo_intento__lte=ahora,
+        ).order_by('correo_proximo_intento')
+        if connection.features.has_select_for_update_skip_locked:
+            pendientes = pendientes.select_for_update(skip_locked=True)
+
+        ids = list(pendientes.values_list('correo_id', flat=True)[:limite])
+        CorreoSaliente.objects.filter(correo_id__in=ids).update(
+            correo_intentos=F('correo_intentos') + 1,
+            correo_proximo_intento=ahora + RESERVA,
+        )
+    return list(CorreoSaliente.objects.filter(correo_id__in=ids).order_by('correo_id'))
+
+
+def enviar_pendientes(limite=50):
+    """
+    Envía un lote de la cola con una sola conexión al servidor de correo.
+    Devuelve una tupla (enviados, fallidos).
+    """
+    correos = _reservar_lote(limite)
+    if not correos:
+        return 0, 0
+
+    enviados = fallidos = 0
+    # Backend que realmente entrega los correos de la cola (SMTP en producción)
+    backend_envio = getattr(settings, 'CORREO_BACKEND_ENVIO', 'django.core.mail.backends.smtp.EmailBackend')
+    conexion = get_connection(backend_envio, fail_silently=False)
+    try:
+        conexion.open()
+    except Exception as e:
+        # Sin servidor no se envía nada: todo el lote queda para reintentar
+        for correo in correos:
+            _registrar_fallo(correo, e)
+        return 0, len(correos)
+
+    try:
+        for correo in correos:
+            try:
+                conexion.send_messages([_construir_mensaje(correo, conexion)])
+            except Exception as e:
+                fallidos += 1
+                _registrar_fallo(correo, e)
+                # La conexión pudo quedar inutilizable; el siguiente envío abre una nueva
+                conexion.close()
+            else:
+                enviados += 1
+                CorreoSaliente.objects.filter(correo_id=correo.correo_id).update(
+                    correo_estado='enviado',
+                    correo_enviado=timezone.now(),
+                    correo_ultimo_error=None,
+                )
+    finally:
+        conexion.close()
+
+    return enviados, fallidos
+
+
+def _registrar_fallo(correo, error):
+    if correo.correo_intentos >= MAX_INTENTOS:
+        cambios = {'correo_estado': 'fallido'}
+    else:
+        espera = ESPERA_BASE_SEGUNDOS * 2 ** (correo.correo_intentos - 1)
+        cambios = {'correo_proximo_intento': timezone.now() + datetime.timedelta(seconds=espera)}
+
+    CorreoSaliente.objects.filter(correo_id=correo.correo_id).update(correo_ultimo_error=str(error), **cambios)
@@ -0,0 +1,196 @@
+# api_unfrutoparacristo/estadisticas.py
+"""
+Estadísticas guardadas en el framework de caché de Django.
+
+- Estadísticas generales del Home.
+- Resumen por clase para el panel del profesor (TeacherDashboardView).
+
+Cada valor se calcula una sola vez y queda en caché. Las señales de
+signals.py incrementan los contadores cuando se crea o elimina un registro
+e invalidan los valores que no se pueden ajustar de forma incremental.
+Así las vistas no recorren la base de datos en cada petición.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Usuario, Clase, FrutoAsignado, AsistenciaAlumno, Servicio
+
+PREFIJO_CLAVE = 'estadisticas'
+
+# Tiempo máximo en caché. Es solo una red de seguridad; normalmente las
+# señales mantienen los valores al día.
+TIMEOUT = getattr(settings, 'ESTADISTICAS_CACHE_TIMEOUT', 60 * 60)
+
+
+def _calcular_total_alumnos():
+    return Usuario.objects.filter(usuario_rol='alumno').count()
+
+
+def _calcular_frutos_recolectados():
+    return FrutoAsignado.objects.count()
+
+
+def _calcular_clases_activas():
+    return Clase.objects.count()
+
+
+def _calcular_asistencia_promedio():
+    """
+    Porcentaje de alumnos presentes sobre los alumnos esperados
+    (tamaño actual de la clase por cada asistencia registrada).
+    """
+    clases = Clase.objects.annotate(
+        total_alumnos=Count('alumnos_actuales', filter=Q(alumnos_actuales__usuario_rol='alumno'), distinct=True),
+        total_asistencias=Count('asistencias', distinct=True),
+    ).values_list('total_alumnos', 'total_asistencias')
+    esperados = sum(alumnos * asistencias for alumnos, asistencias in clases)
+    if not esperados:
+        return 0.0
+
+    presentes = AsistenciaAlumno.objects.filter(asistenciaalumno_usuario__usuario_rol='alumno').count()
+    return min(100.0, presentes * 100.0 / esperados)
+
+
+CALCULOS = {
+    'total_alumnos': _calcular_total_alumnos,
+    'frutos_recolectados': _calcular_frutos_recolectados,
+    'clases_activas': _calcular_clases_activas,
+    'asistencia_promedio': _calcular_asistencia_promedio,
+}
+
+
+def _clave(nombre):
+    return f'{PREFIJO_CLAVE}:{nombre}'
+
+
+def obtener_estadisticas():
+    """
+    Devuelve el diccionario de estadísticas del Home.
+    Solo se calculan los valores que no están en caché.
+    """
+    claves = {nombre: _clave(nombre) for nombre in CALCULOS}
+    en_cache = cache.get_many(claves.values())
+
+    valores = {}
+    nuevos = {}
+    for nombre, clave in claves.items():
+        if clave in en_cache:
+            valores[nombre] = en_cache[clave]
+        else:
+            valores[nombre] = nuevos[clave] = CALCULOS[nombre]()
+
+    if nuevos:
+        cache.set_many(nuevos, TIMEOUT)
+
+    valores['asistencia_promedio'] = f"{round(valores['asistencia_promedio'])}%"
+    return valores
+
+
+def incrementar(nombre, delta=1):
+    """
+    Ajusta un contador en caché. Si no está cargado no se hace nada:
+    se calculará completo en la próxima lectura.
+    """
+    try:
+        cache.incr(_clave(nombre), delta)
+    except ValueError:
+        pass
+
+
+def invalidar(*nombres):
+    """Elimina de la caché los valores indicados para que se recalculen."""
+    cache.delete_many([_clave(nombre) for nombre in nombres])
+
+
+# ===================================================================
+# RESUMEN POR CLASE PARA EL PANEL DEL PROFESOR
+# ===================================================================
+
+PREFIJO_PANEL = 'panel_clase'
+
+# Semanas de historia que se incluyen en las tendencias del panel
+SEMANAS_TENDENCIA = getattr(settings, 'PANEL_SEMANAS_TENDENCIA', 4)
+
+TIMEOUT_PANEL = getattr(settings, 'PANEL_CACHE_TIMEOUT', 60 * 60)
+
+
+def _clave_panel(clase_id, fecha):
+    # La fecha forma parte de la clave: cada día empieza con un resumen nuevo
+    return f'{PREFIJO_PANEL}:{clase_id}:{fecha.isoformat()}'
+
+
+def _calcular_resumen_clase(clase_id, hoy):
+    from .serializers import ServicioSerializer
+
+    desde = hoy - datetime.timedelta(weeks=SEMANAS_TENDENCIA)
+
+    total_alumnos = Usuario.objects.filter(usuario_clase_actual_id=clase_id, usuario_rol='alumno').count()
+
+    frutos_por_fecha = dict(
+        FrutoAsignado.objects.filter(
+            frutoasignado_usuario__usuario_clase_actual_id=clase_id,
+            frutoasignado_fecha__gte=desde,
+        ).order_by().values('frutoasignado_fecha').annotate(total=Count('pk')).values_list('frutoasignado_fecha', 'total')
+    )
+    dias = (hoy - desde).days
+    frutos_por_dia = [
+        {'fecha': fecha.isoformat(), 'total': frutos_por_fecha.get(fecha, 0)}
+        for fecha in (desde + datetime.timedelta(days=i) for i in range(1, dias + 1))
+    ]
+
+    asistencia_por_servicio = [
+        {
+            'servicio_id': servicio_id,
+            'fecha': fecha_hora.isoformat(),
+            'presentes': presentes,
+        }
+        for servicio_id, fecha_hora, presentes in Servicio.objects.filter(
+            servicio_clase_id=clase_id,
+            servicio_fecha_hora__date__gt=desde,
+            servicio_fecha_hora__date__lte=hoy,
+        ).annotate(presentes=Count('asistencia__registros')).order_by('servicio_fecha_hora')
+        .values_list('servicio_id', 'servicio_fecha_hora', 'presentes')
+    ]
+
+    proximo_servicio = Servicio.objects.filter(
+        servicio_clase_id=clase_id,
+        servicio_fecha_hora__gte=timezone.now()
+    ).select_related('servicio_tiposervicio', 'servicio_profesor_encargado').order_by('servicio_fecha_hora').first()
+
+    return {
+        'total_alumnos': total_alumnos,
+        'frutos_recolectados_hoy': frutos_por_fecha.get(hoy, 0),
+        'servicio_actual': dict(ServicioSerializer(proximo_servicio).data) if proximo_servicio else None,
+        'servicio_actual_fecha': proximo_servicio.servicio_fecha_hora if proximo_servicio else None,
+        'tendencia': {
+            'semanas': SEMANAS_TENDENCIA,
+            'frutos_por_dia': frutos_por_dia,
+            'asistencia_por_servicio': asistencia_por_servicio,
+        },
+    }
+
+
+def obtener_resumen_clase(clase_id):
+    """
+    Devuelve el resumen en caché de una clase y lo recalcula si no existe
+    o si el próximo servicio guardado ya pasó.
+    """
+    hoy = timezone.localdate()
+    clave = _clave_panel(clase_id, hoy)
+    resumen = cache.get(clave)
+
+    vencido = resumen is not None and resumen['servicio_actual_fecha'] and resumen['servicio_actual_fecha'] < timezone.now()
+    if resumen is None or vencido:
+        resumen = _calcular_resumen_clase(clase_id, hoy)
+        cache.set(clave, resumen, TIMEOUT_PANEL)
+    return resumen
+
+
+def invalidar_resumen_clase(*clase_ids):
+    """Descarta el resumen del día de las clases indicadas."""
+    hoy = timezone.localdate()
+    cache.delete_many([_clave_panel(clase_id, hoy) for clase_id in clase_ids if clase_id])
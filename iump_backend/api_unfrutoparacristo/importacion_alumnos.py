@@ -0,0 +1,409 @@
+# api_unfrutoparacristo/importacion_alumnos.py
+"""
+Importación masiva de alumnos desde nóminas de texto y archivos CSV.
+
+Formatos:
+- Nómina (como "Data Alumnos.txt"): una línea "=== CLASE <nombre> ===" y
+  luego bloques separados por líneas en blanco con "NOMBRE:", "RUT:",
+  "FECHA NACIMIENTO:" (dd/mm/aa o dd/mm/aaaa), "APODERADO:", etc. Las
+  claves que no se reconocen (EDAD, MASCOTA, TALLA...) se ignoran.
+- CSV con encabezado (separado por coma, punto y coma o tabulación) con
+  columnas nombre, rut, fecha_nacimiento, apoderado, telefono_apoderado,
+  email, username, clase.
+
+Antes de importar, `comprobar_codificacion` recorre el archivo completo: un
+byte que no corresponde a la codificación al final del archivo se detecta
+antes de guardar el primer lote, no después. Luego el archivo se lee como un
+flujo y se procesa por lotes: cada lote valida
+las restricciones de unicidad con consultas IN (RUT, username, correo) y
+crea usuarios, perfiles, cestas y estados de mascota con bulk_create dentro
+de una transacción. Las filas con problemas no detienen la importación;
+quedan en el reporte de errores con su número de línea.
+
+bulk_create no envía señales, así que las estadísticas del Home y el
+resumen del panel se actualizan aquí al confirmar cada lote.
+"""
+import codecs
+import csv
+import datetime
+import itertools
+import re
+import unicodedata
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+from . import codigos_invitacion, estadisticas, rut
+from .models import Alumno, Cesta, Clase, MascotaEstado, Usuario
+
+TAMANO_LOTE = 500
+
+ENCABEZADO_CLASE = re.compile(r'^=*\s*CLASE\s+(?P<clase>.*?)\s*=*\s*$', re.IGNORECASE)
+LINEA_CAMPO = re.compile(r'^(?P<clave>[^:]+):\s*(?P<valor>.*)$')
+
+# Clave de la nómina o columna del CSV (normalizada) -> campo de la fila
+CAMPOS = {
+    'nombre': 'nombre',
+    'nombre_completo': 'nombre',
+    'rut': 'rut',
+    'fecha_nacimiento': 'fecha_nacimiento',
+    'fecha_de_nacimiento': 'fecha_nacimiento',
+    'apoderado': 'apoderado',
+    'nombre_apoderado': 'apoderado',
+    'telefono_apoderado': 'telefono_apoderado',
+    'telefono': 'telefono',
+    'email': 'email',
+    'correo': 'email',
+    'username': 'username',
+    'usuario': 'username',
+    'clase': 'clase',
+}
+
+FORMATOS_FECHA = ('%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%y')
+
+
+def _sin_tildes(texto):
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode()
+
+
+def _normalizar_clave(clave):
+    """'FECHA NACIMIENTO' -> 'fecha_nacimiento', 'Teléfono' -> 'telefono'."""
+    return re.sub(r'\W+', '_', _sin_tildes(clave).strip().lower()).strip('_')
+
+
+def _normalizar_clase(nombre):
+    """'TRANSICIÓN NIÑOS(AS)' -> 'transicion ninos': sin tildes, mayúsculas ni texto entre paréntesis."""
+    return ' '.join(_sin_tildes(re.sub(r'\(.*?\)', ' ', nombre)).casefold().split())
+
+
+# ===================================================================
+# LECTURA
+# ===================================================================
+
+def leer_nomina(lineas):
+    """Genera una fila (dict con 'linea' y los campos reconocidos) por cada bloque de la nómina."""
+    clase = None
+    fila = None
+    for numero, linea in enumerate(lineas, 1):
+        linea = linea.strip()
+        encabezado = ENCABEZADO_CLASE.match(linea)
+        if not linea or encabezado:
+            if fila:
+                yield fila
+            fila = None
+            if encabezado:
+                clase = encabezado.group('clase')
+            continue
+
+        campo = LINEA_CAMPO.match(linea)
+        if not campo:
+            continue
+        nombre_campo = CAMPOS.get(_normalizar_clave(campo.group('clave')))
+        if nombre_campo is None:
+            continue
+        if fila is None:
+            fila = {'linea': numero, 'clase': clase}
+        fila[nombre_campo] = campo.group('valor').strip()
+    if fila:
+        yield fila
+
+
+def leer_csv(lineas):
+    """Genera una fila por registro del CSV. El separador se detecta en el encabezado."""
+    lineas = iter(lineas)
+    encabezado = next(lineas, '')
+    try:
+        dialecto = csv.Sniffer().sniff(encabezado, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(itertools.chain([encabezado], lineas), dialecto)
+    columnas = [CAMPOS.get(_normalizar_clave(columna)) for columna in next(lector, [])]
+
+    for valores in lector:
+        if not any(valor.strip() for valor in valores):
+            continue
+        fila = {'linea': lector.line_num}
+        for columna, valor in zip(columnas, valores):
+            if columna and valor.strip():
+                fila[columna] = valor.strip()
+        yield fila
+
+
+def comprobar_codificacion(binario, codificacion, tamano_bloque=64 * 1024):
+    """
+    Decodifica por bloques el archivo binario `binario` completo sin guardar el
+    texto y lo deja de vuelta al inicio. Lanza UnicodeDecodeError si algún
+    byte no corresponde a `codificacion`.
+    """
+    decodificador = codecs.getincrementaldecoder(codificacion)()
+    for bloque in iter(lambda: binario.read(tamano_bloque), b''):
+        decodificador.decode(bloque)
+    decodificador.decode(b'', final=True)
+    binario.seek(0)
+
+
+def leer_archivo(lineas, formato='auto'):
+    """
+    Lee un archivo de texto ya decodificado como nómina o como CSV.
+    Con formato 'auto' se decide por la primera línea con contenido.
+    """
+    lineas = iter(lineas)
+    if formato == 'auto':
+        vacias = []
+        primera = ''
+        for primera in lineas:
+            if primera.strip():
+                break
+            vacias.append(primera)
+        lineas = itertools.chain(vacias, [primera], lineas)
+        es_nomina = ENCABEZADO_CLASE.match(primera.strip()) or LINEA_CAMPO.match(primera.strip())
+        formato = 'nomina' if es_nomina else 'csv'
+    return leer_nomina(lineas) if formato == 'nomina' else leer_csv(lineas)
+
+
+# ===================================================================
+# NORMALIZACIÓN
+# ===================================================================
+
+def _leer_fecha(texto):
+    for formato in FORMATOS_FECHA:
+        try:
+            fecha = datetime.datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+        # Con año de dos dígitos, strptime toma 69-99 como 19xx; un alumno no puede nacer en el futuro
+        if fecha > datetime.date.today():
+            fecha = fecha.replace(year=fecha.year - 100)
+        return fecha
+    return None
+
+
+def _normalizar_fila(fila, rut_normalizado):
+    """
+    Devuelve (datos, errores) de una fila leída del archivo. `rut_normalizado`
+    es el resultado de rut.normalizar para la columna rut (calculado por lote).
+    """
+    errores = []
+    datos = {
+        'linea': fila['linea'],
+        'nombre': fila.get('nombre'),
+        'apoderado': fila.get('apoderado'),
+        'telefono_apoderado': fila.get('telefono_apoderado'),
+        'telefono': fila.get('telefono'),
+        'clase': fila.get('clase'),
+        'rut': None,
+        'rut_original': fila.get('rut'),
+        'email': None,
+        'username': fila.get('username'),
+        'fecha_nacimiento': None,
+    }
+
+    if not datos['nombre']:
+        errores.append("Falta el nombre.")
+
+    if fila.get('rut'):
+        datos['rut'] = rut_normalizado
+        if datos['rut'] is None:
+            errores.append(f"RUT inválido: {fila['rut']}.")
+
+    if not datos['username']:
+        # Sin username explícito se usa el RUT limpio; el login acepta el RUT igual
+        datos['username'] = rut.limpiar(datos['rut']) if datos['rut'] else None
+        if not datos['username'] and not fila.get('rut'):
+            errores.append("Falta el RUT o el username.")
+
+    if fila.get('fecha_nacimiento'):
+        datos['fecha_nacimiento'] = _leer_fecha(fila['fecha_nacimiento'])
+        if datos['fecha_nacimiento'] is None:
+            errores.append(f"Fecha de nacimiento inválida: {fila['fecha_nacimiento']}.")
+    else:
+        errores.append("Falta la fecha de nacimiento.")
+
+    if fila.get('email'):
+        try:
+            validate_email(fila['email'])
+            datos['email'] = fila['email']
+        except ValidationError:
+            errores.append(f"Correo inválido: {fila['email']}.")
+
+    return datos, errores
+
+
+# ===================================================================
+# IMPORTACIÓN
+# ===================================================================
+
+class ResultadoImportacion:
+    """Acumula lo creado y los errores por fila a lo largo de todos los lotes."""
+
+    def __init__(self):
+        self.creados = 0
+        self.errores = []
+        # Valores ya usados por filas anteriores del mismo archivo
+        self.ruts = set()
+        self.usernames = set()
+        self.emails = set()
+        # nombre de clase normalizado -> Clase; se carga al necesitarlo
+        self.clases = None
+
+    def agregar_error(self, datos, mensajes):
+        self.errores.append({
+            'linea': datos['linea'],
+            'nombre': datos.get('nombre') or '',
+            'rut': datos.get('rut') or datos.get('rut_original') or '',
+            'errores': mensajes,
+        })
+
+
+def _lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while lote := list(itertools.islice(iterador, tamano)):
+        yield lote
+
+
+def importar_alumnos(filas, clase=None, password=None, tamano_lote=TAMANO_LOTE, simular=False):
+    """
+    Crea los alumnos de `filas` (ver leer_archivo) y devuelve un ResultadoImportacion.
+
+    - clase: si se indica, todos los alumnos quedan en esa Clase; si no, se
+      usa la columna/encabezado "clase" de cada fila (la clase debe existir).
+    - password: contraseña inicial común, hasheada una sola vez para todo el
+      archivo. Sin ella las cuentas quedan sin contraseña utilizable hasta
+      que un profesor la asigne.
+    - simular: valida todo y cuenta lo que se crearía, sin guardar nada.
+    """
+    resultado = ResultadoImportacion()
+    hash_password = make_password(password) if password else None
+    for lote in _lotes(filas, tamano_lote):
+        _importar_lote(lote, resultado, clase, hash_password, simular)
+    return resultado
+
+
+def _importar_lote(lote, resultado, clase_fija, hash_password, simular):
+    validas = []
+    ruts_normalizados = rut.normalizar_lote([fila.get('rut') or '' for fila in lote])
+    for fila, rut_normalizado in zip(lote, ruts_normalizados):
+        datos, errores = _normalizar_fila(fila, rut_normalizado)
+        if errores:
+            resultado.agregar_error(datos, errores)
+        else:
+            validas.append(datos)
+
+    # Unicidad contra la base de datos: una consulta por restricción para todo el lote
+    for datos in validas:
+        datos['rut_partes'] = rut.partes(datos['rut']) if datos['rut'] else None
+    ruts_existentes = set(
+        Usuario.objects.filter(usuario_rut_numero__in=[d['rut_partes'][0] for d in validas if d['rut_partes']])
+        .values_list('usuario_rut_numero', 'usuario_rut_dv')
+    )
+    usernames_existentes = set(
+        Usuario.objects.filter(username__in=[d['username'] for d in validas]).values_list('username', flat=True)
+    )
+    emails_existentes = set(
+        Usuario.objects.alias(email_normalizado=Lower('usuario_email'))
+        .filter(email_normalizado__in=[d['email'].lower() for d in validas if d['email']])
+        .values_list('usuario_email', flat=True)
+    )
+    emails_existentes = {email.lower() for email in emails_existentes}
+    if clase_fija is None and resultado.clases is None and any(d['clase'] for d in validas):
+        # Son pocas clases: se cargan todas una vez y se comparan sin tildes ni mayúsculas
+        resultado.clases = {_normalizar_clase(clase.clase_nombre): clase for clase in Clase.objects.all()}
+
+    nuevos = []
+    for datos in validas:
+        errores = []
+        if datos['rut'] and (datos['rut_partes'] in ruts_existentes or datos['rut'] in resultado.ruts):
+            errores.append(f"El RUT {datos['rut']} ya está registrado.")
+        if datos['username'] in usernames_existentes or datos['username'] in resultado.usernames:
+            errores.append(f"El username {datos['username']} ya está en uso.")
+        email = datos['email'].lower() if datos['email'] else None
+        if email and (email in emails_existentes or email in resultado.emails):
+            errores.append(f"El correo {datos['email']} ya está en uso.")
+
+        clase = clase_fija
+        if clase is None and datos['clase']:
+            clase = resultado.clases.get(_normalizar_clase(datos['clase']))
+            if clase is None:
+                errores.append(f"No existe la clase {datos['clase']}.")
+
+        # Los valores se reservan aunque la fila falle, así un duplicado posterior también se informa
+        if datos['rut']:
+            resultado.ruts.add(datos['rut'])
+        resultado.usernames.add(datos['username'])
+        if email:
+            resultado.emails.add(email)
+
+        if errores:
+            resultado.agregar_error(datos, errores)
+        else:
+            datos['clase_obj'] = clase
+            nuevos.append(datos)
+
+    if not nuevos:
+        return
+    if simular:
+        resultado.creados += len(nuevos)
+        return
+
+    try:
+        with transaction.atomic():
+            _crear(nuevos, hash_password)
+    except IntegrityError:
+        # Otro proceso creó un RUT/username/correo igual entre la validación y la inserción
+        for datos in nuevos:
+            resultado.agregar_error(datos, ["Conflicto al guardar: otro registro usa el mismo RUT, username o correo. Vuelve a importar esta fila."])
+        return
+    resultado.creados += len(nuevos)
+
+
+def _crear(nuevos, hash_password):
+    usuarios = Usuario.objects.bulk_create([
+        Usuario(
+            username=datos['username'],
+            password=hash_password or make_password(None),
+            usuario_rut=datos['rut'],
+            # bulk_create no pasa por Usuario.save()
+            usuario_rut_numero=datos['rut_partes'][0] if datos['rut_partes'] else None,
+            usuario_rut_dv=datos['rut_partes'][1] if datos['rut_partes'] else None,
+            usuario_nombre_completo=datos['nombre'],
+            usuario_email=datos['email'],
+            usuario_fecha_nacimiento=datos['fecha_nacimiento'],
+            usuario_telefono=datos['telefono'],
+            usuario_rol='alumno',
+            usuario_clase_actual=datos['clase_obj'],
+        )
+        for datos in nuevos
+    ])
+
+    codigos = codigos_invitacion.generar(len(usuarios))
+    Alumno.objects.bulk_create([
+        Alumno(
+            alumno_usuario=usuario,
+            alumno_codigo_invitacion=codigo,
+            alumno_nombre_apoderado=datos['apoderado'],
+            alumno_telefono_apoderado=datos['telefono_apoderado'],
+        )
+        for usuario, datos, codigo in zip(usuarios, nuevos, codigos)
+    ])
+    Cesta.objects.bulk_create([Cesta(cesta_usuario=usuario) for usuario in usuarios])
+    MascotaEstado.objects.bulk_create([
+        MascotaEstado(mascota_estado_usuario=usuario, mascota_estado_sobrenombre=usuario.username)
+        for usuario in usuarios
+    ])
+
+    clase_ids = {usuario.usuario_clase_actual_id for usuario in usuarios}
+    total = len(usuarios)
+    transaction.on_commit(lambda: estadisticas.incrementar('total_alumnos', total))
+    transaction.on_commit(lambda: estadisticas.invalidar('asistencia_promedio'))
+    transaction.on_commit(lambda: estadisticas.invalidar_resumen_clase(*clase_ids))
+
+
+def escribir_reporte(resultado, destino):
+    """Escribe los errores por fila como CSV (linea, nombre, rut, errores)."""
+    escritor = csv.writer(destino)
+    escritor.writerow(['linea', 'nombre', 'rut', 'errores'])
+    for error in resultado.errores:
+        escritor.writerow([error['linea'], error['nombre'], error['rut'], ' '.join(error['errores'])])
@@ -0,0 +1,75 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api_unfrutoparacristo import catalogo_frutos
+from api_unfrutoparacristo.models import Cesta, Fruto, FrutoColocado, Usuario
+from api_unfrutoparacristo.views import ArbolCompactoRenderer, CestaDetailView
+
+FORMATOS = [
+    ("JSON (lista)", 'application/json'),
+    ("compacto", ArbolCompactoRenderer.media_type),
+]
+
+
+class Command(BaseCommand):
+    """
+    Compara GET /api/cesta/ en formato JSON normal y compacto con árboles de
+    distintos tamaños: tiempo, consultas y bytes de la respuesta. Los datos de
+    prueba se crean dentro de una transacción que se revierte al terminar.
+    """
+    help = "Mide la respuesta del árbol de frutos en formato JSON y compacto."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', type=int, nargs='+', default=[10, 100, 1000], help="Cantidades de frutos a probar.")
+        parser.add_argument('--repeticiones', type=int, default=20, help="Peticiones por medición.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            frutos = [
+                Fruto.objects.get_or_create(fruto_color=color, defaults={'fruto_nombre': f'benchmark {color}'})[0]
+                for color in Cesta.CAMPOS_POR_COLOR
+            ]
+            catalogo_frutos.invalidar()
+            usuario = Usuario.objects.create(username='benchmark_arbol', usuario_fecha_nacimiento=datetime.date(2014, 1, 1))
+            cesta = Cesta.objects.create(cesta_usuario=usuario)
+
+            self.stdout.write(f"{'frutos':>7}  {'formato':<14} {'ms/petición':>12} {'consultas':>10} {'bytes':>9}")
+            colocados = 0
+            for tamano in sorted(options['tamanos']):
+                FrutoColocado.objects.bulk_create([
+                    FrutoColocado(
+                        frutocolocado_cesta=cesta,
+                        frutocolocado_fruto=frutos[i % len(frutos)],
+                        position_x=i * 0.01, position_y=1.5 + i * 0.001, position_z=-i * 0.02,
+                    )
+                    for i in range(colocados, tamano)
+                ])
+                colocados = max(colocados, tamano)
+                for nombre, accept in FORMATOS:
+                    self._medir(usuario, tamano, nombre, accept, options['repeticiones'])
+
+            transaction.set_rollback(True)
+        catalogo_frutos.invalidar()
+
+    def _medir(self, usuario, tamano, nombre, accept, repeticiones):
+        factory = APIRequestFactory()
+        vista = CestaDetailView.as_view()
+        tiempos = []
+        for _ in range(repeticiones):
+            request = factory.get('/api/cesta/', HTTP_ACCEPT=accept)
+            force_authenticate(request, user=usuario)
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                respuesta = vista(request)
+                respuesta.render()
+                tiempos.append(time.perf_counter() - inicio)
+
+        promedio_ms = sum(tiempos) / len(tiempos) * 1000
+        self.stdout.write(
+            f"{tamano:>7}  {nombre:<14} {promedio_ms:>12.2f} {len(consultas.captured_queries):>10} {len(respuesta.content):>9}"
+        )
@@ -0,0 +1,59 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api_unfrutoparacristo.models import Usuario
+from api_unfrutoparacristo.serializers import CustomTokenObtainPairSerializer
+
+CLAVE = 'clave-benchmark-123'
+
+
+class Command(BaseCommand):
+    """
+    Mide el costo del login (tiempo y consultas) con username, email y RUT,
+    tanto exitoso como fallido. El usuario de prueba se crea dentro de una
+    transacción que se revierte al terminar.
+    """
+    help = "Mide el tiempo y las consultas por intento de login."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=5, help="Intentos por escenario.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            Usuario.objects.create_user(
+                username='benchmark_login',
+                password=CLAVE,
+                usuario_email='Benchmark.Login@example.com',
+                usuario_rut='9.999.999-3',
+                usuario_fecha_nacimiento=datetime.date(2014, 1, 1),
+            )
+            escenarios = [
+                ("username correcto", 'benchmark_login', CLAVE),
+                ("email correcto", 'benchmark.login@EXAMPLE.com', CLAVE),
+                ("RUT correcto", '99999993', CLAVE),
+                ("contraseña incorrecta", 'benchmark_login', 'otra-clave'),
+                ("RUT con contraseña incorrecta", '9.999.999-3', 'otra-clave'),
+                ("usuario inexistente", 'no_existe@example.com', CLAVE),
+            ]
+            for nombre, identificador, clave in escenarios:
+                self._medir(nombre, identificador, clave, options['repeticiones'])
+            transaction.set_rollback(True)
+
+    def _medir(self, nombre, identificador, clave, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            serializer = CustomTokenObtainPairSerializer(data={'username': identificador, 'password': clave})
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                valido = serializer.is_valid()
+                tiempos.append(time.perf_counter() - inicio)
+
+        promedio_ms = sum(tiempos) / len(tiempos) * 1000
+        resultado = "ok" if valido else "rechazado"
+        self.stdout.write(
+            f"{nombre:<32} {resultado:<10} {promedio_ms:8.1f} ms  {len(consultas.captured_queries)} consultas"
+        )
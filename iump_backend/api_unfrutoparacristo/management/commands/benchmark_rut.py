@@ -0,0 +1,103 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api_unfrutoparacristo import rut
+
+
+# Versiones anteriores de utils.py, copiadas aquí solo para comparar
+def _limpiar_rut_anterior(valor):
+    return "".join(c for c in str(valor) if c.isalnum()).upper()
+
+
+def _formatear_rut_anterior(valor):
+    rut_limpio = _limpiar_rut_anterior(valor)
+    if len(rut_limpio) < 2:
+        return rut_limpio
+    cuerpo, dv = rut_limpio[:-1], rut_limpio[-1]
+    cuerpo_formateado = ""
+    for i, c in enumerate(reversed(cuerpo)):
+        if i > 0 and i % 3 == 0:
+            cuerpo_formateado = "." + cuerpo_formateado
+        cuerpo_formateado = c + cuerpo_formateado
+    return f"{cuerpo_formateado}-{dv}"
+
+
+def _calcular_dv_anterior(cuerpo):
+    suma, factor = 0, 2
+    for digito in reversed(str(cuerpo)):
+        suma += int(digito) * factor
+        factor = 2 if factor == 7 else factor + 1
+    resto = 11 - suma % 11
+    return {11: '0', 10: 'K'}.get(resto, str(resto))
+
+
+def _normalizar_anterior(valor):
+    limpio = _limpiar_rut_anterior(valor)
+    if not rut.PATRON.match(limpio) or _calcular_dv_anterior(limpio[:-1]) != limpio[-1]:
+        return None
+    return _formatear_rut_anterior(limpio)
+
+
+def ruts_de_prueba(cantidad, semilla=0):
+    """RUT válidos con formatos variados (con y sin puntos, k minúscula) y algunos repetidos."""
+    azar = random.Random(semilla)
+    ruts = []
+    for _ in range(cantidad):
+        cuerpo = azar.randint(5_000_000, 26_000_000)
+        limpio = f'{cuerpo}{rut.calcular_dv(cuerpo)}'
+        estilo = azar.randrange(3)
+        if estilo == 0:
+            ruts.append(rut.formatear(limpio))
+        elif estilo == 1:
+            ruts.append(f'{limpio[:-1]}-{limpio[-1].lower()}')
+        else:
+            ruts.append(limpio)
+    # Una lista de asistencia real trae el mismo alumno más de una vez
+    return ruts + azar.sample(ruts, cantidad // 10)
+
+
+class Command(BaseCommand):
+    """
+    Compara el módulo rut con los helpers anteriores de utils.py (formatear
+    armando el string carácter por carácter, dígito verificador dígito a
+    dígito) sobre listas de RUT generadas al azar. Verifica además que ambos
+    den el mismo resultado.
+    """
+    help = "Mide formatear/normalizar RUT: helpers anteriores contra el módulo rut (uno a uno y por lote)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cantidad', type=int, default=10000, help="RUT por lista.")
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def handle(self, *args, **options):
+        ruts = ruts_de_prueba(options['cantidad'])
+        repeticiones = options['repeticiones']
+
+        escenarios = [
+            ("formatear (anterior)", lambda: [_formatear_rut_anterior(r) for r in ruts]),
+            ("formatear (rut)", lambda: [rut.formatear(r) for r in ruts]),
+            ("formatear_lote (rut)", lambda: rut.formatear_lote(ruts)),
+            ("normalizar (anterior)", lambda: [_normalizar_anterior(r) for r in ruts]),
+            ("normalizar (rut)", lambda: [rut.normalizar(r) for r in ruts]),
+            ("normalizar_lote (rut)", lambda: rut.normalizar_lote(ruts)),
+        ]
+        resultados = {}
+        self.stdout.write(f"{len(ruts)} RUT por lista, {repeticiones} repeticiones")
+        for nombre, funcion in escenarios:
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                resultados[nombre] = funcion()
+                tiempos.append(time.perf_counter() - inicio)
+            self.stdout.write(f"{nombre:<24} {min(tiempos) * 1000:8.2f} ms")
+
+        iguales = (
+            resultados["formatear (anterior)"] == resultados["formatear_lote (rut)"]
+            and resultados["normalizar (anterior)"] == resultados["normalizar_lote (rut)"]
+        )
+        if iguales:
+            self.stdout.write(self.style.SUCCESS("Los resultados coinciden."))
+        else:
+            self.stdout.write(self.style.ERROR("Los resultados NO coinciden."))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api_unfrutoparacristo.correos import enviar_pendientes
+
+
+class Command(BaseCommand):
+    """
+    Worker de la cola de correos (CorreoSaliente).
+    Sin --continuo procesa la cola hasta vaciarla y termina.
+    """
+    help = "Envía los correos pendientes de la cola de salida."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=50, help="Cantidad de correos por conexión.")
+        parser.add_argument('--continuo', action='store_true', help="Sigue revisando la cola indefinidamente.")
+        parser.add_argument('--intervalo', type=float, default=5.0, help="Segundos de espera cuando la cola está vacía (con --continuo).")
+
+    def handle(self, *args, **options):
+        total_enviados = total_fallidos = 0
+
+        while True:
+            enviados, fallidos = enviar_pendientes(limite=options['lote'])
+            total_enviados += enviados
+            total_fallidos += fallidos
+            if enviados or fallidos:
+                self.stdout.write(f"Lote procesado: {enviados} enviados, {fallidos} con error.")
+                continue
+
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(f"Correos enviados: {total_enviados}. Con error: {total_fallidos}."))
@@ -0,0 +1,70 @@
+import io
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api_unfrutoparacristo.importacion_alumnos import (
+    TAMANO_LOTE, comprobar_codificacion, escribir_reporte, importar_alumnos, leer_archivo,
+)
+from api_unfrutoparacristo.models import Clase
+
+
+class Command(BaseCommand):
+    """
+    Importa alumnos desde una nómina de texto (bloques NOMBRE/RUT/FECHA
+    NACIMIENTO/APODERADO por CLASE) o un CSV. Ver importacion_alumnos.py.
+    """
+    help = "Importa alumnos en lote desde una nómina de texto o un archivo CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo a importar.")
+        parser.add_argument('--formato', choices=['auto', 'nomina', 'csv'], default='auto')
+        parser.add_argument('--codificacion', default='utf-8-sig', help="Codificación del archivo (por defecto utf-8-sig).")
+        parser.add_argument('--clase', type=int, help="Asigna todos los alumnos a esta clase (clase_id) en lugar de la del archivo.")
+        parser.add_argument('--password-inicial', help="Contraseña inicial común. Sin ella las cuentas quedan sin contraseña utilizable.")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Filas por lote.")
+        parser.add_argument('--simular', action='store_true', help="Valida el archivo y muestra el resultado sin guardar nada.")
+        parser.add_argument('--reporte', help="Escribe los errores por fila en este CSV.")
+
+    def handle(self, *args, **options):
+        clase = None
+        if options['clase']:
+            try:
+                clase = Clase.objects.get(pk=options['clase'])
+            except Clase.DoesNotExist:
+                raise CommandError(f"No existe la clase {options['clase']}.")
+
+        try:
+            binario = open(options['archivo'], 'rb')
+        except OSError as e:
+            raise CommandError(f"No se pudo abrir el archivo: {e}")
+
+        with binario:
+            # Todo el archivo se valida antes del primer lote: un error al final no deja la importación a medias
+            try:
+                comprobar_codificacion(binario, options['codificacion'])
+            except LookupError:
+                raise CommandError(f"Codificación desconocida: {options['codificacion']}.")
+            except UnicodeDecodeError as e:
+                raise CommandError(
+                    f"El archivo no está en {options['codificacion']} ({e.reason}). "
+                    "No se importó ningún alumno. Si viene de Excel en Windows, pruebe con --codificacion latin-1."
+                )
+            archivo = io.TextIOWrapper(binario, encoding=options['codificacion'], newline='')
+            resultado = importar_alumnos(
+                leer_archivo(archivo, options['formato']),
+                clase=clase,
+                password=options['password_inicial'],
+                tamano_lote=options['lote'],
+                simular=options['simular'],
+            )
+
+        for error in resultado.errores:
+            self.stdout.write(self.style.WARNING(
+                f"Línea {error['linea']} ({error['nombre'] or 'sin nombre'}): {' '.join(error['errores'])}"
+            ))
+        if options['reporte']:
+            with open(options['reporte'], 'w', encoding='utf-8', newline='') as destino:
+                escribir_reporte(resultado, destino)
+
+        accion = "se crearían" if options['simular'] else "creados"
+        self.stdout.write(self.style.SUCCESS(f"Alumnos {accion}: {resultado.creados}. Filas con errores: {len(resultado.errores)}."))
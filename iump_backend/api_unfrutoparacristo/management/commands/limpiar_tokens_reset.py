@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api_unfrutoparacristo.models import TokenRestablecimiento
+
+
+class Command(BaseCommand):
+    """
+    Elimina los tokens de restablecimiento de contraseña vencidos.
+    Pensado para ejecutarse periódicamente (por ejemplo, desde cron).
+    """
+    help = "Elimina los tokens de restablecimiento de contraseña expirados."
+
+    def handle(self, *args, **options):
+        eliminados = TokenRestablecimiento.limpiar_expirados()
+        self.stdout.write(self.style.SUCCESS(f"Tokens expirados eliminados: {eliminados}"))
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api_unfrutoparacristo import versiones
+from api_unfrutoparacristo.models import MascotaEstado
+
+
+class Command(BaseCommand):
+    """
+    Calcula el hambre y la sed actuales de todas las mascotas para reportes.
+    Con --guardar, además deja los valores calculados en la base de datos.
+    """
+    help = "Recalcula en lote el estado (hambre y sed) de las mascotas y muestra un resumen."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clase', type=int, help="Limita el cálculo a los alumnos de una clase (clase_id).")
+        parser.add_argument('--umbral', type=int, default=30, help="Nivel bajo el cual una mascota se considera hambrienta o sedienta.")
+        parser.add_argument('--guardar', action='store_true', help="Guarda los niveles calculados con bulk_update.")
+        parser.add_argument('--lote', type=int, default=500, help="Tamaño de cada lote al guardar.")
+
+    def handle(self, *args, **options):
+        ahora = timezone.now()
+        umbral = options['umbral']
+
+        estados = MascotaEstado.objects.only(
+            'id', 'mascota_estado_usuario', 'mascota_estado_hambre', 'mascota_estado_sed', 'mascota_estado_last_update'
+        ).order_by('id')
+        if options['clase']:
+            estados = estados.filter(mascota_estado_usuario__usuario_clase_actual_id=options['clase'])
+
+        total = suma_hambre = suma_sed = hambrientas = sedientas = guardadas = 0
+        pendientes = []
+
+        for estado in estados.iterator(chunk_size=options['lote']):
+            hambre, sed = estado.calcular_niveles(ahora)
+            total += 1
+            suma_hambre += hambre
+            suma_sed += sed
+            hambrientas += hambre < umbral
+            sedientas += sed < umbral
+
+            if options['guardar'] and estado.intervalos_transcurridos(ahora):
+                estado.materializar_desgaste(ahora)
+                pendientes.append(estado)
+                if len(pendientes) >= options['lote']:
+                    guardadas += self._guardar(pendientes)
+
+        if pendientes:
+            guardadas += self._guardar(pendientes)
+
+        if not total:
+            self.stdout.write("No hay mascotas para recalcular.")
+            return
+
+        self.stdout.write(f"Mascotas: {total}")
+        self.stdout.write(f"Hambre promedio: {suma_hambre / total:.1f}")
+        self.stdout.write(f"Sed promedio: {suma_sed / total:.1f}")
+        self.stdout.write(f"Con hambre bajo {umbral}: {hambrientas}")
+        self.stdout.write(f"Con sed bajo {umbral}: {sedientas}")
+        if options['guardar']:
+            self.stdout.write(self.style.SUCCESS(f"Estados guardados: {guardadas}"))
+
+    def _guardar(self, pendientes):
+        MascotaEstado.objects.bulk_update(
+            pendientes, ['mascota_estado_hambre', 'mascota_estado_sed', 'mascota_estado_last_update']
+        )
+        # Tampoco dispara post_save: se invalidan aquí los ETag de /user-data/
+        versiones.incrementar(*[versiones.usuario(estado.mascota_estado_usuario_id) for estado in pendientes])
+        cantidad = len(pendientes)
+        pendientes.clear()
+        return cantidad
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api_unfrutoparacristo.base_datos import estadisticas_sqlite
+
+
+class Command(BaseCommand):
+    """
+    Mantenimiento periódico de la base SQLite (por ejemplo, una vez por semana
+    desde cron): ANALYZE y PRAGMA optimize para que el planificador tenga
+    estadísticas al día, checkpoint del WAL y VACUUM cuando hay muchas páginas
+    libres. Muestra las páginas totales y libres antes y después.
+
+    VACUUM reescribe el archivo completo y bloquea las escrituras mientras
+    dura; conviene correrlo fuera del horario de uso.
+    """
+    help = "Ejecuta ANALYZE/optimize (y VACUUM si hace falta) sobre SQLite y muestra las páginas libres."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vacuum', action='store_true', help="Ejecuta VACUUM aunque haya pocas páginas libres.")
+        parser.add_argument(
+            '--umbral-libres', type=float, default=0.2,
+            help="Fracción de páginas libres a partir de la cual se ejecuta VACUUM (por defecto 0.2).",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f"Este comando es solo para SQLite (motor actual: {connection.vendor}).")
+
+        with connection.cursor() as cursor:
+            antes = estadisticas_sqlite(cursor)
+            self._mostrar("Antes", antes)
+
+            libres = antes['freelist_count'] / antes['page_count'] if antes['page_count'] else 0
+            if options['vacuum'] or libres >= options['umbral_libres']:
+                self.stdout.write(f"VACUUM ({libres:.0%} de páginas libres)...")
+                cursor.execute('VACUUM')
+
+            self.stdout.write("ANALYZE y PRAGMA optimize...")
+            cursor.execute('ANALYZE')
+            cursor.execute('PRAGMA optimize')
+
+            if antes['journal_mode'] == 'wal':
+                # Pasa el WAL a la base y lo deja en cero bytes
+                cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                ocupado, paginas_wal, copiadas = cursor.fetchone()
+                self.stdout.write(f"Checkpoint del WAL: {copiadas}/{paginas_wal} páginas copiadas" + (" (ocupado)" if ocupado else ""))
+
+            despues = estadisticas_sqlite(cursor)
+        self._mostrar("Después", despues)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Listo. Tamaño: {antes['bytes'] / 1024:.1f} KiB -> {despues['bytes'] / 1024:.1f} KiB"
+        ))
+
+    def _mostrar(self, titulo, datos):
+        self.stdout.write(
+            f"{titulo}: {datos['page_count']} páginas de {datos['page_size']} bytes "
+            f"({datos['bytes'] / 1024 / 1024:.2f} MiB), {datos['freelist_count']} libres, journal={datos['journal_mode']}"
+        )
@@ -0,0 +1,95 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from api_unfrutoparacristo.models import AsistenciaAlumno, FrutoAsignado, Noticia, Servicio, Usuario
+
+ROLES_PROFESOR = ['profesor', 'profesor_jefe', 'profesor_asistente']
+
+# Id cualquiera: el plan no depende de que la fila exista
+ID = 1
+
+
+def consultas_canonicas():
+    """
+    Las consultas calientes de las vistas, con los mismos filtros y orden.
+    Cada una debe resolverse con un índice.
+    """
+    ahora = timezone.now()
+    return [
+        ("alumnos de una clase",
+         Usuario.objects.filter(usuario_clase_actual_id=ID, usuario_rol='alumno')),
+        ("profesores de una clase",
+         Usuario.objects.filter(usuario_clase_actual_id=ID, usuario_rol__in=ROLES_PROFESOR)),
+        ("servicios de una clase (calendario)",
+         Servicio.objects.filter(servicio_clase_id=ID, servicio_fecha_hora__gte=ahora)
+         .order_by('servicio_fecha_hora', 'servicio_id')[:51]),
+        ("próximo servicio de una clase",
+         Servicio.objects.filter(servicio_clase_id=ID, servicio_fecha_hora__gte=ahora).order_by('servicio_fecha_hora')[:1]),
+        ("noticias de una clase (panel)",
+         Noticia.objects.filter(noticia_clase_id=ID).order_by('-noticia_fecha_publicacion', '-noticia_id')[:51]),
+        ("noticias publicadas (home)",
+         Noticia.objects.filter(Q(noticia_clase__isnull=True) | Q(noticia_clase_id=ID), noticia_publicada=True)
+         .order_by('-noticia_fecha_publicacion')[:8]),
+        ("frutos por día de una clase",
+         FrutoAsignado.objects.filter(frutoasignado_usuario__usuario_clase_actual_id=ID, frutoasignado_fecha__gte=ahora.date())
+         .order_by().values('frutoasignado_fecha').annotate(total=Count('pk'))),
+        ("frutos recibidos por un alumno",
+         FrutoAsignado.objects.filter(frutoasignado_usuario_id=ID).order_by('-frutoasignado_fecha')),
+        ("asistencia de un servicio",
+         AsistenciaAlumno.objects.filter(asistenciaalumno_asistencia__asistencia_servicio_id=ID)
+         .values_list('asistenciaalumno_usuario__usuario_rut', flat=True)),
+        ("login con RUT",
+         Usuario.objects.filter(Q(username='246534284') | Usuario.filtro_rut('246534284'))),
+        ("alumnos presentes por RUT (asistencia)",
+         Usuario.objects.filter(usuario_rut_numero__in=[24653428, 25006117])
+         .values_list('usuario_rut_numero', 'usuario_rut_dv', 'id')),
+    ]
+
+
+# Recorridos completos de una tabla en cada motor
+RECORRIDO_COMPLETO = {
+    'sqlite': re.compile(r'\bSCAN (?!.*\bUSING\b)(?P<tabla>\w+)'),
+    'postgresql': re.compile(r'\bSeq Scan on (?P<tabla>\w+)'),
+}
+
+
+class Command(BaseCommand):
+    """
+    Ejecuta EXPLAIN sobre las consultas canónicas de las vistas y falla si
+    alguna recorre una tabla completa en lugar de usar un índice.
+
+    En PostgreSQL se desactiva enable_seqscan durante la revisión: con tablas
+    pequeñas el planificador prefiere el recorrido secuencial aunque exista
+    el índice, y lo que se quiere saber es si el índice sirve.
+    """
+    help = "Revisa con EXPLAIN que las consultas principales usen índices."
+
+    def handle(self, *args, **options):
+        patron = RECORRIDO_COMPLETO.get(connection.vendor)
+        if patron is None:
+            raise CommandError(f"Motor de base de datos no soportado: {connection.vendor}")
+
+        fallidas = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for nombre, queryset in consultas_canonicas():
+                plan = queryset.explain()
+                tablas = sorted(set(patron.findall(plan)))
+                if tablas:
+                    fallidas.append(nombre)
+                    self.stdout.write(self.style.ERROR(f"RECORRIDO COMPLETO  {nombre}: {', '.join(tablas)}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"ÍNDICE              {nombre}"))
+                if options['verbosity'] >= 2 or tablas:
+                    self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+        if fallidas:
+            raise CommandError(f"{len(fallidas)} consulta(s) recorren tablas completas: {', '.join(fallidas)}")
+
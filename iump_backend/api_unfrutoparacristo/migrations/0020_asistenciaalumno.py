@@ -0,0 +1,104 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Copia congelada de utils.formatear_rut tal como estaba al escribir esta
+# migración: las migraciones no deben depender del código actual de la app.
+def limpiar_rut(rut):
+    return "".join(c for c in str(rut) if c.isalnum()).upper()
+
+
+def formatear_rut(rut):
+    rut_limpio = limpiar_rut(rut)
+    if len(rut_limpio) < 2:
+        return rut_limpio
+    cuerpo = rut_limpio[:-1]
+    dv = rut_limpio[-1]
+    cuerpo_formateado = ""
+    for i, c in enumerate(reversed(cuerpo)):
+        if i > 0 and i % 3 == 0:
+            cuerpo_formateado = "." + cuerpo_formateado
+        cuerpo_formateado = c + cuerpo_formateado
+    return f"{cuerpo_formateado}-{dv}"
+
+
+def migrar_ruts_a_registros(apps, schema_editor):
+    """
+    Convierte la cadena de RUTs separados por coma de cada Asistencia
+    en filas de AsistenciaAlumno. Los RUTs sin usuario se descartan.
+    """
+    Asistencia = apps.get_model('api_unfrutoparacristo', 'Asistencia')
+    AsistenciaAlumno = apps.get_model('api_unfrutoparacristo', 'AsistenciaAlumno')
+    Usuario = apps.get_model('api_unfrutoparacristo', 'Usuario')
+
+    ruts_por_asistencia = {}
+    for asistencia_id, ruts in Asistencia.objects.values_list('asistencia_id', 'asistencia_rutAsistentes'):
+        ruts_por_asistencia[asistencia_id] = {
+            formatear_rut(rut) for rut in (ruts or '').split(',') if rut.strip()
+        }
+
+    todos_los_ruts = set().union(*ruts_por_asistencia.values()) if ruts_por_asistencia else set()
+    id_por_rut = dict(Usuario.objects.filter(usuario_rut__in=todos_los_ruts).values_list('usuario_rut', 'id'))
+
+    registros = [
+        AsistenciaAlumno(asistenciaalumno_asistencia_id=asistencia_id, asistenciaalumno_usuario_id=id_por_rut[rut])
+        for asistencia_id, ruts in ruts_por_asistencia.items()
+        for rut in ruts
+        if rut in id_por_rut
+    ]
+    AsistenciaAlumno.objects.bulk_create(registros, batch_size=500)
+
+
+def restaurar_ruts_desde_registros(apps, schema_editor):
+    Asistencia = apps.get_model('api_unfrutoparacristo', 'Asistencia')
+    AsistenciaAlumno = apps.get_model('api_unfrutoparacristo', 'AsistenciaAlumno')
+
+    ruts_por_asistencia = {}
+    for asistencia_id, rut in AsistenciaAlumno.objects.values_list('asistenciaalumno_asistencia_id', 'asistenciaalumno_usuario__usuario_rut'):
+        if rut:
+            ruts_por_asistencia.setdefault(asistencia_id, []).append(rut)
+
+    for asistencia_id, ruts in ruts_por_asistencia.items():
+        Asistencia.objects.filter(asistencia_id=asistencia_id).update(asistencia_rutAsistentes=','.join(ruts))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_unfrutoparacristo', '0019_noticia_noticia_clase'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AsistenciaAlumno',
+            fields=[
+                ('asistenciaalumno_id', models.AutoField(primary_key=True, serialize=False)),
+                ('asistenciaalumno_asistencia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registros', to='api_unfrutoparacristo.asistencia', verbose_name='Asistencia')),
+                ('asistenciaalumno_usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registros_asistencia', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Registro de Asistencia',
+                'verbose_name_plural': 'Registros de Asistencia',
+                'unique_together': {('asistenciaalumno_asistencia', 'asistenciaalumno_usuario')},
+            },
+        ),
+        migrations.AddField(
+            model_name='asistencia',
+            name='asistencia_alumnos',
+            field=models.ManyToManyField(blank=True, related_name='asistencias', through='api_unfrutoparacristo.AsistenciaAlumno', to=settings.AUTH_USER_MODEL, verbose_name='Asistentes'),
+        ),
+        migrations.RunPython(migrar_ruts_a_registros, restaurar_ruts_desde_registros),
+        # Valor por defecto para que la migración pueda revertirse
+        migrations.AlterField(
+            model_name='asistencia',
+            name='asistencia_rutAsistentes',
+            field=models.TextField(default='', verbose_name='RUTs de Asistentes (separados por coma)'),
+        ),
+        migrations.RemoveField(
+            model_name='asistencia',
+            name='asistencia_rutAsistentes',
+        ),
+    ]
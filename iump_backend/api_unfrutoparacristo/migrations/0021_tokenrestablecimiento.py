@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_unfrutoparacristo', '0020_asistenciaalumno'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenRestablecimiento',
+            fields=[
+                ('token_id', models.AutoField(primary_key=True, serialize=False)),
+                ('token_hash', models.CharField(max_length=64, unique=True, verbose_name='Hash del Token')),
+                ('token_expira', models.DateTimeField(db_index=True, verbose_name='Fecha de Expiración')),
+                ('token_creado', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('token_usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens_restablecimiento', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Token de Restablecimiento',
+                'verbose_name_plural': 'Tokens de Restablecimiento',
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_unfrutoparacristo', '0021_tokenrestablecimiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoSaliente',
+            fields=[
+                ('correo_id', models.AutoField(primary_key=True, serialize=False)),
+                ('correo_asunto', models.CharField(max_length=255, verbose_name='Asunto')),
+                ('correo_cuerpo', models.TextField(verbose_name='Cuerpo')),
+                ('correo_remitente', models.CharField(max_length=255, verbose_name='Remitente')),
+                ('correo_destinatarios', models.JSONField(default=list, verbose_name='Destinatarios')),
+                ('correo_cc', models.JSONField(blank=True, default=list, verbose_name='CC')),
+                ('correo_bcc', models.JSONField(blank=True, default=list, verbose_name='BCC')),
+                ('correo_responder_a', models.JSONField(blank=True, default=list, verbose_name='Responder a')),
+                ('correo_alternativas', models.JSONField(blank=True, default=list, verbose_name='Contenidos alternativos (HTML)')),
+                ('correo_estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviado', 'Enviado'), ('fallido', 'Fallido')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('correo_intentos', models.IntegerField(default=0, verbose_name='Intentos')),
+                ('correo_proximo_intento', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próximo Intento')),
+                ('correo_ultimo_error', models.TextField(blank=True, null=True, verbose_name='Último Error')),
+                ('correo_creado', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('correo_enviado', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Envío')),
+            ],
+            options={
+                'verbose_name': 'Correo Saliente',
+                'verbose_name_plural': 'Correos Salientes',
+                'ordering': ['correo_proximo_intento'],
+                'indexes': [models.Index(fields=['correo_estado', 'correo_proximo_intento'], name='correo_estado_prox_idx')],
+            },
+        ),
+    ]
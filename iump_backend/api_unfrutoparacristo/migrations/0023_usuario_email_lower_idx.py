@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:14
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_unfrutoparacristo', '0022_correosaliente'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(django.db.models.functions.text.Lower('usuario_email'), name='usuario_email_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_unfrutoparacristo', '0023_usuario_email_lower_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fruto',
+            name='fruto_color',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True, verbose_name='Color del Fruto'),
+        ),
+    ]
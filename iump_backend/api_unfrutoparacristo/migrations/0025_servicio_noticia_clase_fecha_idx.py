@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_unfrutoparacristo', '0024_fruto_color_unico'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='noticia',
+            index=models.Index(fields=['noticia_clase', 'noticia_fecha_publicacion'], name='noticia_clase_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicio',
+            index=models.Index(fields=['servicio_clase', 'servicio_fecha_hora'], name='servicio_clase_fecha_idx'),
+        ),
+    ]
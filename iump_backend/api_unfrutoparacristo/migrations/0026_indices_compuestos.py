@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_unfrutoparacristo', '0025_servicio_noticia_clase_fecha_idx'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='frutoasignado',
+            index=models.Index(fields=['frutoasignado_usuario', 'frutoasignado_fecha'], name='frutoasig_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='noticia',
+            index=models.Index(fields=['noticia_clase', 'noticia_publicada', 'noticia_fecha_publicacion'], name='noticia_clase_pub_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['usuario_clase_actual', 'usuario_rol'], name='usuario_clase_rol_idx'),
+        ),
+    ]
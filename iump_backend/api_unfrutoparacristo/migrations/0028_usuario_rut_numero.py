@@ -0,0 +1,48 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:46
+
+from django.db import migrations, models
+
+
+# Copia congelada de rut.partes tal como estaba al escribir esta migración:
+# las migraciones no deben depender del código actual de la app.
+def partes_rut(rut):
+    limpio = "".join(c for c in str(rut) if c.isalnum()).upper()
+    cuerpo, dv = limpio[:-1], limpio[-1:]
+    if cuerpo.isascii() and cuerpo.isdigit() and len(cuerpo) <= 9 and dv in '0K987654321':
+        return int(cuerpo), dv
+    return None
+
+
+def rellenar_rut_numero(apps, schema_editor):
+    """Calcula usuario_rut_numero y usuario_rut_dv de los usuarios que ya tienen RUT."""
+    Usuario = apps.get_model('api_unfrutoparacristo', 'Usuario')
+    usuarios = list(Usuario.objects.filter(usuario_rut__isnull=False).only('id', 'usuario_rut'))
+    for usuario in usuarios:
+        usuario.usuario_rut_numero, usuario.usuario_rut_dv = partes_rut(usuario.usuario_rut) or (None, None)
+    Usuario.objects.bulk_update(usuarios, ['usuario_rut_numero', 'usuario_rut_dv'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_unfrutoparacristo', '0027_secuencia'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='usuario_rut_dv',
+            field=models.CharField(blank=True, editable=False, max_length=1, null=True, verbose_name='RUT (dígito verificador)'),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='usuario_rut_numero',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='RUT (número)'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['usuario_rut_numero', 'usuario_rut_dv'], name='usuario_rut_numero_idx'),
+        ),
+        migrations.RunPython(rellenar_rut_numero, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_unfrutoparacristo', '0028_usuario_rut_numero'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mascotaestado',
+            name='mascota_estado_last_update',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_unfrutoparacristo', '0029_mascota_estado_fecha_base'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionRecurso',
+            fields=[
+                ('version_nombre', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='Recurso')),
+                ('version_valor', models.BigIntegerField(verbose_name='Versión')),
+                ('version_modificado', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Último cambio')),
+            ],
+            options={
+                'verbose_name': 'Versión de recurso',
+                'verbose_name_plural': 'Versiones de recursos',
+            },
+        ),
+    ]
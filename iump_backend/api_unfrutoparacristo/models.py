@@ -1,10 +1,14 @@
 # models.py
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
-from .utils import formatear_rut
-import random
-import string
+from django.utils.crypto import get_random_string
+from . import rut
+from . import versiones
+import datetime
+import hashlib
 import json # Para el campo JSONField en Regla
 
 # --- Constantes para Choices ---
@@ -22,6 +26,12 @@ APLICABLE_A_CHOICES = [
     ('general', 'General'), # Opción para reglas más generales
 ]
 
+ESTADO_CORREO_CHOICES = [
+    ('pendiente', 'Pendiente'),
+    ('enviado', 'Enviado'),
+    ('fallido', 'Fallido'),
+]
+
 TIPO_SERVICIO_CHOICES = [
     ('clase', 'Clase'),
     ('evento', 'Evento'),
@@ -29,6 +39,12 @@ TIPO_SERVICIO_CHOICES = [
     # Agrega más tipos de servicio si es necesario
 ]
 
+# --- Desgaste de la Mascota ---
+# Cada intervalo la mascota pierde puntos de hambre y de sed.
+INTERVALO_DESGASTE_SEGUNDOS = 600  # 10 minutos
+DESGASTE_HAMBRE_POR_INTERVALO = 1
+DESGASTE_SED_POR_INTERVALO = 2
+
 # --- Modelos de Entidades ---
 
 class Mascota(models.Model):
@@ -54,7 +70,9 @@ class MascotaEstado(models.Model):
     mascota_estado_hambre = models.IntegerField(default=100, verbose_name="Nivel de Hambre")
     mascota_estado_sed = models.IntegerField(default=100, verbose_name="Nivel de Sed")
     mascota_estado_sobrenombre = models.CharField(max_length=50, blank=True, null=True, verbose_name="Sobrenombre de la Mascota")
-    mascota_estado_last_update = models.DateTimeField(auto_now=True)
+    # Fecha base del desgaste. No es auto_now: materializar_desgaste la avanza
+    # solo por intervalos completos y save() no debe pisarla con la hora actual.
+    mascota_estado_last_update = models.DateTimeField(default=timezone.now)
 
     def get_mascota(self):
         if self.mascota_estado_usuario.usuario_clase_actual:
@@ -65,16 +83,31 @@ class MascotaEstado(models.Model):
         nombre = self.mascota_estado_sobrenombre if self.mascota_estado_sobrenombre else "Mascota sin sobrenombre"
         return f"{nombre} de {self.mascota_estado_usuario.username}"
 
-    def actualizar_estado_si_corresponde(self):
-        ahora = timezone.now()
-        diferencia = (ahora - self.mascota_estado_last_update).total_seconds()
-
-        if diferencia >= 600:  # 600 segundos = 10 minutos
-            periodos = int(diferencia // 600)
-            self.mascota_estado_hambre = max(0, self.mascota_estado_hambre - periodos * 1)
-            self.mascota_estado_sed = max(0, self.mascota_estado_sed - periodos * 2)
-            self.mascota_estado_last_update = ahora
-            self.save()
+    def intervalos_transcurridos(self, ahora=None):
+        ahora = ahora or timezone.now()
+        segundos = (ahora - self.mascota_estado_last_update).total_seconds()
+        return max(0, int(segundos // INTERVALO_DESGASTE_SEGUNDOS))
+
+    def calcular_niveles(self, ahora=None):
+        """
+        Devuelve (hambre, sed) a partir de los valores guardados y del tiempo transcurrido.
+        No escribe en la base de datos: el desgaste es un valor derivado.
+        """
+        intervalos = self.intervalos_transcurridos(ahora)
+        return (
+            max(0, self.mascota_estado_hambre - intervalos * DESGASTE_HAMBRE_POR_INTERVALO),
+            max(0, self.mascota_estado_sed - intervalos * DESGASTE_SED_POR_INTERVALO),
+        )
+
+    def materializar_desgaste(self, ahora=None):
+        """
+        Copia en los campos guardados los niveles calculados hasta `ahora`.
+        La fecha base avanza solo por intervalos completos para no perder la fracción en curso.
+        Solo cambia la instancia; quien llama decide cuándo guardar.
+        """
+        intervalos = self.intervalos_transcurridos(ahora)
+        self.mascota_estado_hambre, self.mascota_estado_sed = self.calcular_niveles(ahora)
+        self.mascota_estado_last_update += datetime.timedelta(seconds=intervalos * INTERVALO_DESGASTE_SEGUNDOS)
 
 class Clase(models.Model):
     """
@@ -102,6 +135,9 @@ class Usuario(AbstractUser):
     """
     usuario_avatar = models.CharField(max_length=255, blank=True, null=True, verbose_name="Ruta del Avatar", default='default.png')
     usuario_rut = models.CharField(max_length=12, unique=True, blank=True, null=True, verbose_name="RUT")
+    # Derivados de usuario_rut en save(); las búsquedas por RUT usan estos campos
+    usuario_rut_numero = models.PositiveIntegerField(blank=True, null=True, editable=False, verbose_name="RUT (número)")
+    usuario_rut_dv = models.CharField(max_length=1, blank=True, null=True, editable=False, verbose_name="RUT (dígito verificador)")
     usuario_nombre_completo = models.CharField(max_length=255, blank=True, null=True, verbose_name="Nombre Completo")
     usuario_email = models.EmailField(unique=True, blank=True, null=True, verbose_name="Correo Electrónico")
     usuario_rol = models.CharField(max_length=50, choices=ROL_CHOICES, default='alumno', verbose_name="Rol")
@@ -115,12 +151,89 @@ class Usuario(AbstractUser):
     def save(self, *args, **kwargs):
         # Antes de guardar, nos aseguramos de que el RUT tenga el formato correcto
         if self.usuario_rut:
-            self.usuario_rut = formatear_rut(self.usuario_rut)
+            self.usuario_rut = rut.formatear(self.usuario_rut)
+        self.usuario_rut_numero, self.usuario_rut_dv = rut.partes(self.usuario_rut or '') or (None, None)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'usuario_rut' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'usuario_rut_numero', 'usuario_rut_dv'}
         super().save(*args, **kwargs) # Llama al método de guardado original
+        self._recordar_valores(kwargs.get('update_fields'))
+
+    # Campos cuyo cambio invalida estadísticas, panel de la clase y catálogo de
+    # clases (ver signals.py). Se recuerdan al cargar para no releer la fila en
+    # cada save.
+    CAMPOS_SEGUIDOS = ('usuario_rol', 'usuario_clase_actual_id', 'username')
+
+    def _valores_seguidos(self):
+        return {campo: self.__dict__[campo] for campo in self.CAMPOS_SEGUIDOS if campo in self.__dict__}
+
+    def _recordar_valores(self, campos=None):
+        """
+        Toma los valores actuales como los que hay en la base. Con `campos`
+        (update_fields o los campos recargados) solo se actualizan esos: un
+        cambio en otro campo sin guardar se sigue detectando.
+        """
+        valores = self._valores_seguidos()
+        if campos is not None:
+            campos = set(campos)
+            valores = {c: v for c, v in valores.items() if c in campos or c.removesuffix('_id') in campos}
+        self._valores_cargados = {**getattr(self, '_valores_cargados', {}), **valores}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._valores_cargados = instancia._valores_seguidos()
+        return instancia
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._recordar_valores(fields)
+
+    def cambios_seguidos(self, update_fields=None):
+        """
+        {campo: valor anterior} de los CAMPOS_SEGUIDOS que cambiaron respecto
+        de la base. Con update_fields solo se miran los campos que se guardan,
+        así save(update_fields=['last_login']) no cuesta nada. Solo consulta
+        la base si la instancia no se cargó desde ella (o difirió esos campos).
+        """
+        if self._state.adding:
+            return {}
+        campos = [
+            campo for campo in self.CAMPOS_SEGUIDOS
+            if update_fields is None or campo in update_fields or campo.removesuffix('_id') in update_fields
+        ]
+        anteriores = dict(getattr(self, '_valores_cargados', {}))
+        faltan = [campo for campo in campos if campo not in anteriores]
+        if faltan:
+            fila = type(self).objects.filter(pk=self.pk).values(*faltan).first() or {}
+            anteriores.update(fila)
+        return {
+            campo: anteriores[campo] for campo in campos
+            if campo in anteriores and anteriores[campo] != getattr(self, campo)
+        }
+
+    @classmethod
+    def filtro_rut(cls, valor):
+        """
+        Q que encuentra al usuario con ese RUT (en cualquier formato) por el
+        índice de usuario_rut_numero; None si el valor no tiene forma de RUT.
+        """
+        partes = rut.partes(valor)
+        if partes is None:
+            return None
+        return models.Q(usuario_rut_numero=partes[0], usuario_rut_dv=partes[1])
 
     class Meta:
         verbose_name = "Usuario"
         verbose_name_plural = "Usuarios"
+        indexes = [
+            # El login busca el correo sin distinguir mayúsculas
+            models.Index(Lower('usuario_email'), name='usuario_email_lower_idx'),
+            # Alumnos / profesores de una clase (gestión, asistencia, estadísticas)
+            models.Index(fields=['usuario_clase_actual', 'usuario_rol'], name='usuario_clase_rol_idx'),
+            # Login, validar-rut, registro y asistencia buscan por RUT
+            models.Index(fields=['usuario_rut_numero', 'usuario_rut_dv'], name='usuario_rut_numero_idx'),
+        ]
 
     def __str__(self):
         return self.username if self.username else self.usuario_email if self.usuario_email else self.usuario_rut if self.usuario_rut else "Usuario sin nombre"
@@ -148,14 +261,10 @@ class Alumno(models.Model):
         verbose_name_plural = "Alumnos"
 
     def generar_codigo_invitacion(self):
-        """Genera un código de invitación aleatorio de 6 caracteres único"""
+        """Asigna un código de invitación único de 6 caracteres (ver codigos_invitacion.py)."""
         if not self.alumno_codigo_invitacion:
-            while True:
-                codigo = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-                if not Alumno.objects.filter(alumno_codigo_invitacion=codigo).exists():
-                    self.alumno_codigo_invitacion = codigo
-                    self.save()
-                    break
+            from .codigos_invitacion import asignar_codigo
+            asignar_codigo(self)
 
     def __str__(self):
         return f'Alumno: {self.alumno_usuario.username}'
@@ -181,7 +290,8 @@ class Fruto(models.Model):
     """
     fruto_id = models.AutoField(primary_key=True)
     fruto_nombre = models.CharField(max_length=100, unique=True, verbose_name="Nombre del Fruto")
-    fruto_color = models.CharField(max_length=50, blank=True, null=True, verbose_name="Color del Fruto")
+    # Único: el árbol y la cesta identifican el tipo de fruto por su color
+    fruto_color = models.CharField(max_length=50, unique=True, blank=True, null=True, verbose_name="Color del Fruto")
     fruto_modelo_3d_path = models.CharField(max_length=255, blank=True, null=True, verbose_name="Ruta del Modelo 3D (.glb)")
     fruto_descripcion = models.TextField(blank=True, null=True, verbose_name="Descripción del Fruto")
 
@@ -207,6 +317,10 @@ class FrutoAsignado(models.Model):
         verbose_name = "Fruto Asignado"
         verbose_name_plural = "Frutos Asignados"
         ordering = ['-frutoasignado_fecha']
+        indexes = [
+            # Frutos recibidos por alumno y fecha (tendencia de la clase)
+            models.Index(fields=['frutoasignado_usuario', 'frutoasignado_fecha'], name='frutoasig_usuario_fecha_idx'),
+        ]
 
     def clean(self):
         from django.core.exceptions import ValidationError
@@ -266,6 +380,10 @@ class Servicio(models.Model):
         verbose_name = "Servicio"
         verbose_name_plural = "Servicios"
         ordering = ['-servicio_fecha_hora']
+        indexes = [
+            # Calendario y asistencia: servicios de una clase ordenados por fecha
+            models.Index(fields=['servicio_clase', 'servicio_fecha_hora'], name='servicio_clase_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.servicio_tiposervicio} - {self.servicio_clase.clase_nombre} ({self.servicio_fecha_hora.strftime('%d-%m-%Y')})"
@@ -347,6 +465,14 @@ class Noticia(models.Model):
         verbose_name = "Noticia"
         verbose_name_plural = "Noticias"
         ordering = ['-noticia_fecha_publicacion']
+        indexes = [
+            # Panel del profesor: todas las noticias de su clase
+            models.Index(fields=['noticia_clase', 'noticia_fecha_publicacion'], name='noticia_clase_fecha_idx'),
+            # Home: noticias publicadas de la clase (o generales) más recientes
+            models.Index(
+                fields=['noticia_clase', 'noticia_publicada', 'noticia_fecha_publicacion'], name='noticia_clase_pub_fecha_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.noticia_titulo
@@ -423,7 +549,7 @@ class Asistencia(models.Model):
     asistencia_fecha = models.DateField(verbose_name="Fecha de la Asistencia")
     asistencia_tipo_clase = models.ForeignKey(Clase, on_delete=models.CASCADE, related_name='asistencias', verbose_name="Tipo de Clase")
     asistencia_fruto_asociado = models.ForeignKey(Fruto, on_delete=models.SET_NULL, null=True, blank=True, related_name='asistencias_con_fruto', verbose_name="Fruto Asociado (Opcional)")
-    asistencia_rutAsistentes = models.TextField(verbose_name="RUTs de Asistentes (separados por coma)")
+    asistencia_alumnos = models.ManyToManyField(Usuario, through='AsistenciaAlumno', related_name='asistencias', blank=True, verbose_name="Asistentes")
 
     class Meta:
         verbose_name = "Asistencia"
@@ -431,12 +557,31 @@ class Asistencia(models.Model):
         ordering = ['-asistencia_fecha']
 
     def obtener_lista_ruts(self):
-        return [rut.strip() for rut in self.asistencia_rutAsistentes.split(',') if rut.strip()]
+        return [rut for rut in self.asistencia_alumnos.values_list('usuario_rut', flat=True) if rut]
 
     def __str__(self):
         return f"Asistencia para {self.asistencia_tipo_clase.clase_nombre} el {self.asistencia_fecha}"
 
 
+class AsistenciaAlumno(models.Model):
+    """
+    Registra la presencia de un usuario en una Asistencia.
+    Reemplaza la antigua lista de RUTs separados por coma.
+    """
+    asistenciaalumno_id = models.AutoField(primary_key=True)
+    asistenciaalumno_asistencia = models.ForeignKey(Asistencia, on_delete=models.CASCADE, related_name='registros', verbose_name="Asistencia")
+    asistenciaalumno_usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='registros_asistencia', verbose_name="Usuario")
+
+    class Meta:
+        verbose_name = "Registro de Asistencia"
+        verbose_name_plural = "Registros de Asistencia"
+        # Un usuario solo puede quedar presente una vez por asistencia
+        unique_together = ('asistenciaalumno_asistencia', 'asistenciaalumno_usuario')
+
+    def __str__(self):
+        return f"{self.asistenciaalumno_usuario.username} presente en Asistencia {self.asistenciaalumno_asistencia_id}"
+
+
 class Cesta(models.Model):
     """
     Representa una 'cesta' o colección de frutos para un usuario.
@@ -462,6 +607,104 @@ class Cesta(models.Model):
     def __str__(self):
         return f"Cesta de {self.cesta_usuario.username}"
 
+    # Contadores de cada color: (total en la cesta, puestas en el árbol)
+    CAMPOS_POR_COLOR = {
+        'verdes': ('cesta_total_verdes', 'cesta_verdes_puestas'),
+        'rojas': ('cesta_total_rojas', 'cesta_rojas_puestas'),
+        'doradas': ('cesta_total_doradas', 'cesta_doradas_puestas'),
+    }
+
+    # -------------------------------------------------------------------
+    # Contadores atómicos: cada operación es un único UPDATE con F(), así
+    # las peticiones concurrentes no pisan los cambios de las demás.
+    # -------------------------------------------------------------------
+
+    @classmethod
+    def sumar_frutos(cls, usuario_id, color, cantidad=1):
+        """Suma frutos al total de un color. Si el usuario no tiene cesta, se crea."""
+        total, _ = cls.CAMPOS_POR_COLOR[color]
+        cls.marcar_modificadas(usuario_id)
+        if cls.objects.filter(cesta_usuario_id=usuario_id).update(**{total: F(total) + cantidad}):
+            return
+        cesta, creada = cls.objects.get_or_create(cesta_usuario_id=usuario_id, defaults={total: cantidad})
+        if not creada:
+            # Otra petición creó la cesta entre medio
+            cls.objects.filter(pk=cesta.pk).update(**{total: F(total) + cantidad})
+
+    def poner_fruto(self, color):
+        """
+        Pasa un fruto del inventario al árbol.
+        Devuelve False, sin cambiar nada, si no quedan frutos de ese color.
+        """
+        return self.poner_frutos({color: 1})
+
+    def devolver_fruto(self, color):
+        """
+        Devuelve un fruto del árbol al inventario.
+        Devuelve False si el contador de puestas ya está en cero.
+        """
+        return self.devolver_frutos({color: 1})
+
+    def poner_frutos(self, conteos):
+        """
+        Pasa varios frutos al árbol; `conteos` tiene la forma {color: cantidad}.
+        Todo el lote se verifica y se aplica en un solo UPDATE: si falta
+        inventario de algún color no cambia nada y se devuelve False.
+        """
+        return self._mover_frutos(conteos, desde=0, hacia=1)
+
+    def devolver_frutos(self, conteos):
+        """Devuelve varios frutos del árbol al inventario, todo o nada, como poner_frutos."""
+        return self._mover_frutos(conteos, desde=1, hacia=0)
+
+    def _mover_frutos(self, conteos, desde, hacia):
+        condiciones = {}
+        cambios = {}
+        for color, cantidad in conteos.items():
+            if not cantidad:
+                continue
+            campos = self.CAMPOS_POR_COLOR[color]
+            condiciones[f'{campos[desde]}__gte'] = cantidad
+            cambios[campos[desde]] = F(campos[desde]) - cantidad
+            cambios[campos[hacia]] = F(campos[hacia]) + cantidad
+        if not cambios:
+            return True
+        if not type(self).objects.filter(pk=self.pk, **condiciones).update(**cambios):
+            return False
+        self.marcar_modificadas(self.cesta_usuario_id)
+        return True
+
+    @staticmethod
+    def marcar_modificadas(*usuario_ids):
+        """
+        Los UPDATE con F() no disparan post_save: aquí se incrementa la versión
+        de las cestas (ver versiones.py) cuando la transacción se confirma.
+        """
+        transaction.on_commit(lambda: versiones.incrementar(*[versiones.cesta(usuario_id) for usuario_id in usuario_ids]))
+
+    @classmethod
+    def sumar_frutos_en_lote(cls, conteos):
+        """
+        Suma frutos a varias cestas a la vez.
+        `conteos` tiene la forma {usuario_id: {color: cantidad}}.
+        Crea las cestas que falten y ejecuta un único UPDATE con F() por color.
+        """
+        usuario_ids = set(conteos)
+        cls.marcar_modificadas(*usuario_ids)
+        existentes = set(cls.objects.filter(cesta_usuario_id__in=usuario_ids).values_list('cesta_usuario_id', flat=True))
+        cls.objects.bulk_create([cls(cesta_usuario_id=usuario_id) for usuario_id in usuario_ids - existentes])
+
+        for color, (campo, _) in cls.CAMPOS_POR_COLOR.items():
+            cantidades = {usuario_id: por_color[color] for usuario_id, por_color in conteos.items() if por_color.get(color)}
+            if not cantidades:
+                continue
+            incremento = Case(
+                *[When(cesta_usuario_id=usuario_id, then=Value(cantidad)) for usuario_id, cantidad in cantidades.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            cls.objects.filter(cesta_usuario_id__in=cantidades).update(**{campo: F(campo) + incremento})
+
 class CestaDetalle(models.Model):
     """
     Detalle de los frutos dentro de una cesta.
@@ -501,4 +744,135 @@ class FrutoColocado(models.Model):
         verbose_name_plural = "Frutos Colocados"
 
     def __str__(self):
-        return f"Fruto {self.frutocolocado_fruto.fruto_nombre} en Cesta {self.frutocolocado_cesta.cesta_id}"
\ No newline at end of file
+        return f"Fruto {self.frutocolocado_fruto.fruto_nombre} en Cesta {self.frutocolocado_cesta.cesta_id}"
+
+
+class TokenRestablecimiento(models.Model):
+    """
+    Token para restablecer la contraseña.
+    Solo se guarda el hash SHA-256 del token; el valor real viaja únicamente en el correo.
+    Al estar en la base de datos, es válido en cualquier worker y sobrevive a reinicios.
+    """
+    DURACION = datetime.timedelta(hours=1)
+
+    token_id = models.AutoField(primary_key=True)
+    token_hash = models.CharField(max_length=64, unique=True, verbose_name="Hash del Token")
+    token_usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='tokens_restablecimiento', verbose_name="Usuario")
+    token_expira = models.DateTimeField(db_index=True, verbose_name="Fecha de Expiración")
+    token_creado = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+
+    class Meta:
+        verbose_name = "Token de Restablecimiento"
+        verbose_name_plural = "Tokens de Restablecimiento"
+
+    def __str__(self):
+        return f"Token de {self.token_usuario.username} (expira {self.token_expira:%d-%m-%Y %H:%M})"
+
+    @staticmethod
+    def calcular_hash(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @classmethod
+    def emitir(cls, usuario):
+        """Crea un token para el usuario y devuelve su valor en texto plano."""
+        cls.limpiar_expirados()
+        token = get_random_string(32)
+        cls.objects.create(
+            token_hash=cls.calcular_hash(token),
+            token_usuario=usuario,
+            token_expira=timezone.now() + cls.DURACION,
+        )
+        return token
+
+    @classmethod
+    def buscar_vigente(cls, token):
+        """Busca un token no expirado por su hash (consulta por índice único)."""
+        return cls.objects.select_related('token_usuario').filter(
+            token_hash=cls.calcular_hash(token),
+            token_expira__gte=timezone.now(),
+        ).first()
+
+    @classmethod
+    def limpiar_expirados(cls):
+        """Elimina los tokens vencidos usando el índice de expiración."""
+        eliminados, _ = cls.objects.filter(token_expira__lt=timezone.now()).delete()
+        return eliminados
+
+
+class CorreoSaliente(models.Model):
+    """
+    Correo en cola de salida. Las vistas solo insertan filas aquí (ver correos.py)
+    y el comando `enviar_correos` las despacha por lotes.
+    """
+    correo_id = models.AutoField(primary_key=True)
+    correo_asunto = models.CharField(max_length=255, verbose_name="Asunto")
+    correo_cuerpo = models.TextField(verbose_name="Cuerpo")
+    correo_remitente = models.CharField(max_length=255, verbose_name="Remitente")
+    correo_destinatarios = models.JSONField(default=list, verbose_name="Destinatarios")
+    correo_cc = models.JSONField(default=list, blank=True, verbose_name="CC")
+    correo_bcc = models.JSONField(default=list, blank=True, verbose_name="BCC")
+    correo_responder_a = models.JSONField(default=list, blank=True, verbose_name="Responder a")
+    correo_alternativas = models.JSONField(default=list, blank=True, verbose_name="Contenidos alternativos (HTML)")
+    correo_estado = models.CharField(max_length=20, choices=ESTADO_CORREO_CHOICES, default='pendiente', verbose_name="Estado")
+    correo_intentos = models.IntegerField(default=0, verbose_name="Intentos")
+    correo_proximo_intento = models.DateTimeField(default=timezone.now, verbose_name="Próximo Intento")
+    correo_ultimo_error = models.TextField(blank=True, null=True, verbose_name="Último Error")
+    correo_creado = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    correo_enviado = models.DateTimeField(blank=True, null=True, verbose_name="Fecha de Envío")
+
+    class Meta:
+        verbose_name = "Correo Saliente"
+        verbose_name_plural = "Correos Salientes"
+        ordering = ['correo_proximo_intento']
+        indexes = [
+            # El worker busca siempre pendientes cuyo próximo intento ya llegó
+            models.Index(fields=['correo_estado', 'correo_proximo_intento'], name='correo_estado_prox_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.correo_asunto} ({self.correo_estado})"
+
+
+class Secuencia(models.Model):
+    """
+    Contador con nombre que entrega bloques de números sin repetir (ver
+    codigos_invitacion.py). Reservar un bloque es un UPDATE atómico.
+    """
+    secuencia_nombre = models.CharField(max_length=50, primary_key=True, verbose_name="Nombre")
+    secuencia_valor = models.BigIntegerField(default=0, verbose_name="Último valor entregado")
+
+    class Meta:
+        verbose_name = "Secuencia"
+        verbose_name_plural = "Secuencias"
+
+    def __str__(self):
+        return f"{self.secuencia_nombre}: {self.secuencia_valor}"
+
+    @classmethod
+    def reservar(cls, nombre, cantidad):
+        """Reserva `cantidad` valores y devuelve el range correspondiente."""
+        filas = cls.objects.filter(secuencia_nombre=nombre)
+        with transaction.atomic():
+            # El UPDATE bloquea la fila hasta el commit; la lectura siguiente ve el valor propio
+            if not filas.update(secuencia_valor=F('secuencia_valor') + cantidad):
+                cls.objects.get_or_create(secuencia_nombre=nombre)
+                filas.update(secuencia_valor=F('secuencia_valor') + cantidad)
+            fin = filas.values_list('secuencia_valor', flat=True).get()
+        return range(fin - cantidad, fin)
+
+
+class VersionRecurso(models.Model):
+    """
+    Contador de versión de un recurso para los GET condicionales (ver
+    versiones.py). Está en la base para que todos los workers lo vean igual.
+    """
+    version_nombre = models.CharField(max_length=64, primary_key=True, verbose_name="Recurso")
+    version_valor = models.BigIntegerField(verbose_name="Versión")
+    version_modificado = models.DateTimeField(default=timezone.now, verbose_name="Último cambio")
+
+    class Meta:
+        verbose_name = "Versión de recurso"
+        verbose_name_plural = "Versiones de recursos"
+
+    def __str__(self):
+        return f"{self.version_nombre}: {self.version_valor}"
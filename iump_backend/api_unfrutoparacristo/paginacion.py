@@ -0,0 +1,79 @@
+# api_unfrutoparacristo/paginacion.py
+"""
+Paginación por cursor y filtros de ventana de fechas para los listados que
+crecen con el tiempo (servicios y noticias de una clase).
+
+El cursor se ordena por la fecha y luego por la clave primaria, así cada
+página es una consulta acotada sobre el índice (clase, fecha) sin COUNT ni
+OFFSET. La respuesta tiene la forma {"next", "previous", "results"}; el
+cliente sigue `next` hasta que sea null.
+"""
+import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+
+
+class PaginacionPorFecha(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'limite'
+    max_page_size = 200
+
+
+class ServiciosPaginacion(PaginacionPorFecha):
+    """Calendario: del servicio más antiguo al más reciente."""
+    ordering = ('servicio_fecha_hora', 'servicio_id')
+
+
+class ServiciosRecientesPaginacion(PaginacionPorFecha):
+    ordering = ('-servicio_fecha_hora', '-servicio_id')
+
+
+class NoticiasPaginacion(PaginacionPorFecha):
+    ordering = ('-noticia_fecha_publicacion', '-noticia_id')
+
+
+def _leer_fecha(request, parametro):
+    """
+    Lee `parametro` como fecha-hora ISO 8601 o como fecha (AAAA-MM-DD).
+    Devuelve (valor, es_solo_fecha) o (None, False) si no viene.
+    """
+    texto = request.query_params.get(parametro)
+    if not texto:
+        return None, False
+
+    try:
+        # parse_datetime también acepta una fecha sola, por eso se prueba primero parse_date
+        fecha = parse_date(texto)
+        if fecha is not None:
+            return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min)), True
+        valor = parse_datetime(texto)
+    except ValueError:
+        valor = None
+    if valor is None:
+        raise ValidationError({parametro: 'Fecha inválida. Usa AAAA-MM-DD o una fecha-hora ISO 8601.'})
+    if timezone.is_naive(valor):
+        valor = timezone.make_aware(valor)
+    return valor, False
+
+
+def filtrar_ventana(queryset, request, campo):
+    """
+    Filtra `queryset` por los parámetros `desde` y `hasta` (ambos inclusive)
+    sobre el campo de fecha `campo`. Si `hasta` es solo una fecha, incluye
+    el día completo.
+    """
+    desde, _ = _leer_fecha(request, 'desde')
+    hasta, hasta_solo_fecha = _leer_fecha(request, 'hasta')
+
+    if hasta is not None:
+        # Con solo la fecha, el límite es el comienzo del día siguiente (exclusivo)
+        operador, limite = ('lt', hasta + datetime.timedelta(days=1)) if hasta_solo_fecha else ('lte', hasta)
+        if desde is not None and (desde >= limite if operador == 'lt' else desde > limite):
+            raise ValidationError({'hasta': 'Debe ser posterior a "desde".'})
+        queryset = queryset.filter(**{f'{campo}__{operador}': limite})
+    if desde is not None:
+        queryset = queryset.filter(**{f'{campo}__gte': desde})
+    return queryset
@@ -0,0 +1,170 @@
+# api_unfrutoparacristo/rut.py
+"""
+Normalización y validación de RUT chilenos.
+
+- limpiar:     '24.653.428-k' -> '24653428K'
+- formatear:   cualquier RUT -> '24.653.428-K' (sin validar, como siempre)
+- calcular_dv: dígito verificador módulo 11 de un cuerpo
+- es_valido:   formato y dígito verificador correctos
+- normalizar:  formatea solo si es válido; si no, None
+- numero:      clave entera canónica (el cuerpo, 24653428) o None
+- partes:      (cuerpo entero, dígito verificador) sin validar el dígito;
+               es lo que se guarda en Usuario.usuario_rut_numero / _dv
+
+Cada función tiene su versión *_lote que recibe una lista y devuelve otra
+lista alineada, para las listas de asistencia y las importaciones.
+
+El dígito verificador usa dos tablas de 1000 entradas con las sumas
+ponderadas de cada bloque de tres dígitos (pesos 2-3-4 y 5-6-7), así un
+cuerpo de 8 dígitos se resuelve con tres búsquedas en lugar de un ciclo
+por dígito.
+"""
+import re
+
+# Cuerpo de 7 u 8 dígitos más el dígito verificador, una vez limpio
+PATRON = re.compile(r'^\d{7,8}[\dK]$')
+CARACTERES = set('0123456789.-kK')
+
+_QUITAR = str.maketrans('', '', '.- ')
+
+
+def _tabla_pesos(pesos):
+    return [sum(int(d) * p for d, p in zip(reversed(f'{n:03d}'), pesos)) for n in range(1000)]
+
+
+# Los pesos 2..7 se repiten cada seis dígitos contando desde la derecha
+_PESOS_BAJOS = _tabla_pesos((2, 3, 4))
+_PESOS_ALTOS = _tabla_pesos((5, 6, 7))
+_DV = '0K987654321'  # índice: suma % 11
+
+
+def limpiar(rut):
+    """Quita puntos, guiones y todo lo que no sea alfanumérico; devuelve en mayúsculas."""
+    limpio = str(rut).translate(_QUITAR).upper()
+    return limpio if limpio.isalnum() else ''.join(filter(str.isalnum, limpio))
+
+
+def _agrupar(cuerpo):
+    if len(cuerpo) <= 3:
+        return cuerpo
+    inicio = len(cuerpo) % 3 or 3
+    return '.'.join([cuerpo[:inicio]] + [cuerpo[i:i + 3] for i in range(inicio, len(cuerpo), 3)])
+
+
+def formatear(rut):
+    """Toma un RUT (limpio o no) y lo devuelve en el formato XX.XXX.XXX-X."""
+    limpio = limpiar(rut)
+    if len(limpio) < 2:
+        return limpio
+    return f'{_agrupar(limpio[:-1])}-{limpio[-1]}'
+
+
+def calcular_dv(cuerpo):
+    """Calcula el dígito verificador (módulo 11) del cuerpo numérico de un RUT."""
+    numero = int(cuerpo)
+    suma = 0
+    while numero:
+        numero, bloque = divmod(numero, 1000)
+        suma += _PESOS_BAJOS[bloque]
+        numero, bloque = divmod(numero, 1000)
+        suma += _PESOS_ALTOS[bloque]
+    return _DV[suma % 11]
+
+
+def _limpio_valido(limpio):
+    return PATRON.match(limpio) is not None and calcular_dv(limpio[:-1]) == limpio[-1]
+
+
+def es_valido(rut):
+    return _limpio_valido(limpiar(rut))
+
+
+def normalizar(rut):
+    """Devuelve el RUT con formato XX.XXX.XXX-X, o None si no es válido."""
+    limpio = limpiar(rut)
+    return f'{_agrupar(limpio[:-1])}-{limpio[-1]}' if _limpio_valido(limpio) else None
+
+
+def numero(rut):
+    """Cuerpo del RUT como entero (clave canónica), o None si no es válido."""
+    limpio = limpiar(rut)
+    return int(limpio[:-1]) if _limpio_valido(limpio) else None
+
+
+def _partes_limpio(limpio):
+    cuerpo, dv = limpio[:-1], limpio[-1:]
+    if cuerpo.isascii() and cuerpo.isdigit() and len(cuerpo) <= 9 and dv in _DV:
+        return int(cuerpo), dv
+    return None
+
+
+def partes(rut):
+    """
+    (cuerpo entero, dígito verificador) de cualquier RUT con cuerpo numérico,
+    aunque el dígito no cuadre (los RUT antiguos se guardaron sin validarlo);
+    None si no tiene forma de RUT.
+    """
+    return _partes_limpio(limpiar(rut))
+
+
+# ===================================================================
+# VERSIONES POR LOTE
+# ===================================================================
+# La lista se une en un solo texto (un RUT por línea) para limpiar con un
+# translate y formatear con un re.sub sobre todo el lote; solo los RUT que no
+# calzan con el caso común pasan por las funciones de a uno.
+
+_FORMATO = re.compile(r'^(\d{1,3})(\d{3})(\d{3})(\w)$', re.MULTILINE)
+
+
+def limpiar_lote(ruts):
+    ruts = list(ruts)
+    try:
+        unido = '\n'.join(ruts)
+    except TypeError:
+        ruts = [str(r) for r in ruts]
+        unido = '\n'.join(ruts)
+    limpios = unido.translate(_QUITAR).upper().split('\n')
+    if len(limpios) != len(ruts):
+        # Algún RUT traía saltos de línea propios; se limpia de a uno
+        return [limpiar(r) for r in ruts]
+    if not ''.join(limpios).isalnum():
+        limpios = [l if l.isalnum() else ''.join(filter(str.isalnum, l)) for l in limpios]
+    return limpios
+
+
+def _formatear_limpios(limpios):
+    if not limpios:
+        return []
+    texto, cambios = _FORMATO.subn(r'\1.\2.\3-\4', '\n'.join(limpios))
+    formateados = texto.split('\n')
+    if cambios == len(limpios):
+        return formateados
+    return [f if '-' in f else formatear(f) for f in formateados]
+
+
+def formatear_lote(ruts):
+    return _formatear_limpios(limpiar_lote(ruts))
+
+
+def _validos(limpios):
+    patron = PATRON.match
+    return [patron(l) is not None and calcular_dv(l[:-1]) == l[-1] for l in limpios]
+
+
+def validar_lote(ruts):
+    return _validos(limpiar_lote(ruts))
+
+
+def normalizar_lote(ruts):
+    limpios = limpiar_lote(ruts)
+    return [f if valido else None for f, valido in zip(_formatear_limpios(limpios), _validos(limpios))]
+
+
+def numeros_lote(ruts):
+    limpios = limpiar_lote(ruts)
+    return [int(l[:-1]) if valido else None for l, valido in zip(limpios, _validos(limpios))]
+
+
+def partes_lote(ruts):
+    return [_partes_limpio(l) for l in limpiar_lote(ruts)]
@@ -1,4 +1,9 @@
-from rest_framework import serializers
+import base64
+import logging
+import sys
+from array import array
+
+from rest_framework import exceptions, serializers
 from .models import (
     Usuario, Alumno, Profesor, Clase, Mascota,
     Cesta, Fruto, FrutoAsignado, Servicio,
@@ -6,9 +11,14 @@ from .models import (
     FrutoColocado, MascotaEstado, Noticia, TipoServicio
 )
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth import authenticate
+from django.contrib.auth.models import update_last_login
+from .throttling import registrar_login_fallido, limpiar_login_fallidos, segundos_bloqueo_restantes
+from . import catalogo_frutos
 from django.db.models import Q
 
+logger = logging.getLogger(__name__)
 
 
 # --- Serializadores para Modelos Base ---
@@ -100,6 +110,12 @@ class DesafioDetalleSerializer(serializers.ModelSerializer):
 
 
 class MascotaEstadoSerializer(serializers.ModelSerializer):
+    """
+    Muestra el hambre y la sed con el desgaste calculado al momento de serializar.
+    """
+    mascota_estado_hambre = serializers.SerializerMethodField()
+    mascota_estado_sed = serializers.SerializerMethodField()
+
     class Meta:
         model = MascotaEstado
         fields = [
@@ -109,12 +125,33 @@ class MascotaEstadoSerializer(serializers.ModelSerializer):
             'mascota_estado_last_update',
         ]
 
+    def get_mascota_estado_hambre(self, obj):
+        return obj.calcular_niveles()[0]
+
+    def get_mascota_estado_sed(self, obj):
+        return obj.calcular_niveles()[1]
+
 class MascotaEstadoUpdateSerializer(serializers.ModelSerializer):
+    """
+    Único punto donde se guarda el estado de la mascota: cuando el alumno
+    la alimenta, le da agua o cambia su sobrenombre.
+    """
     class Meta:
         model = MascotaEstado
         fields = ['mascota_estado_hambre', 'mascota_estado_sed', 'mascota_estado_sobrenombre']
         read_only_fields = []  # Aquí puedes definir campos que no quieres actualizar si los hay
 
+    def update(self, instance, validated_data):
+        # Se fija el desgaste acumulado antes de aplicar el cambio; así el nivel
+        # que no se envía (p. ej. la sed al alimentar) no vuelve a su valor anterior.
+        instance.materializar_desgaste()
+        return super().update(instance, validated_data)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['mascota_estado_hambre'], data['mascota_estado_sed'] = instance.calcular_niveles()
+        return data
+
     def validate_mascota_estado_hambre(self, value):
         # Validar que el nivel de hambre esté entre 0 y 100, por ejemplo
         if not 0 <= value <= 100:
@@ -307,7 +344,8 @@ class RegistroAlumnoSerializer(serializers.ModelSerializer):
 
     # NUEVA VALIDACIÓN PARA usuario_rut
     def validate_usuario_rut(self, value):
-        if value and Usuario.objects.filter(usuario_rut=value).exists():
+        filtro = Usuario.filtro_rut(value) if value else None
+        if filtro is not None and Usuario.objects.filter(filtro).exists():
             raise serializers.ValidationError("Este RUT ya está en uso. Por favor, ingresa un RUT diferente.")
         return value
 
@@ -381,7 +419,9 @@ class RegistroAlumnoSerializer(serializers.ModelSerializer):
 
                 # Lógica de recompensa: Asignar un fruto al invitador
                 try:
-                    fruto_recompensa = Fruto.objects.get(fruto_id=1) # Asume que el ID 1 es el fruto de recompensa por invitación
+                    fruto_recompensa = catalogo_frutos.por_id(1) # Asume que el ID 1 es el fruto de recompensa por invitación
+                    if fruto_recompensa is None:
+                        raise Fruto.DoesNotExist
                     FrutoAsignado.objects.create(
                         frutoasignado_usuario=inviting_alumno_profile.alumno_usuario,
                         frutoasignado_fruto=fruto_recompensa,
@@ -389,9 +429,9 @@ class RegistroAlumnoSerializer(serializers.ModelSerializer):
                         frutoasignado_origen="Invitación"
                     )
                 except Fruto.DoesNotExist:
-                    print("ADVERTENCIA: No se encontró el fruto de recompensa (ID 1). No se asignó recompensa.")
-                except Exception as e:
-                    print(f"ERROR al asignar fruto de recompensa: {e}")
+                    logger.warning("No se encontró el fruto de recompensa (ID 1). No se asignó recompensa.")
+                except Exception:
+                    logger.exception("Error al asignar fruto de recompensa")
 
         except Exception as e:
             usuario.delete() # Si falla la creación del perfil de alumno, eliminar el usuario para evitar inconsistencias
@@ -432,7 +472,8 @@ class RegistroProfesorSerializer(serializers.ModelSerializer):
 
     # NUEVA VALIDACIÓN PARA usuario_rut
     def validate_usuario_rut(self, value):
-        if value and Usuario.objects.filter(usuario_rut=value).exists():
+        filtro = Usuario.filtro_rut(value) if value else None
+        if filtro is not None and Usuario.objects.filter(filtro).exists():
             raise serializers.ValidationError("Este RUT ya está en uso. Por favor, ingresa un RUT diferente.")
         return value
 
@@ -486,24 +527,20 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         user = None
 
         if identifier and password:
-            # 1. Intentar autenticación directa con username
-            user = authenticate(request=self.context.get('request'), username=identifier, password=password)
-
-            # 2. Si no se encontró, intentar por email
-            if not user:
-                try:
-                    temp_user = Usuario.objects.get(usuario_email__iexact=identifier)
-                    user = authenticate(request=self.context.get('request'), username=temp_user.username, password=password)
-                except Usuario.DoesNotExist:
-                    pass
-
-            # 3. Si no se encontró, intentar por RUT
-            if not user:
-                try:
-                    temp_user = Usuario.objects.get(usuario_rut__iexact=identifier)
-                    user = authenticate(request=self.context.get('request'), username=temp_user.username, password=password)
-                except Usuario.DoesNotExist:
-                    pass
+            # EmailOrUsernameBackend resuelve username, email o RUT con una sola
+            # consulta y verifica la contraseña una sola vez.
+            request = self.context.get('request')
+            user = authenticate(request=request, username=identifier, password=password)
+            # Cuenta a la que corresponde el identificador, aunque la contraseña no coincida
+            cuenta = getattr(request, 'usuario_identificado', None)
+            cuenta_id = cuenta.pk if cuenta is not None else None
+            if user is None:
+                restante = segundos_bloqueo_restantes(identifier, cuenta_id)
+                if restante is not None:
+                    raise exceptions.Throttled(wait=restante)
+                registrar_login_fallido(identifier, cuenta_id)
+            else:
+                limpiar_login_fallidos(identifier, user.pk)
 
         if user is None:
             raise serializers.ValidationError("Credenciales incorrectas (usuario, RUT o correo electrónico inválido, o contraseña incorrecta).")
@@ -511,11 +548,14 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         if not user.is_active:
             raise serializers.ValidationError("La cuenta está inactiva. Por favor, contacta al administrador.")
 
-        # ⚠️ MUY IMPORTANTE: Actualizar el valor de username en attrs
-        attrs['username'] = user.username
+        # No se llama a super().validate(): volvería a ejecutar authenticate()
+        # y con ello el hasher de contraseñas.
         self.user = user
+        refresh = self.get_token(user)
+        data = {'refresh': str(refresh), 'access': str(refresh.access_token)}
 
-        data = super().validate(attrs)
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
 
         data['usuario_rol'] = self.user.usuario_rol
         data['usuario_clase_actual_nombre'] = (
@@ -534,7 +574,7 @@ class FrutoColocadoSerializer(serializers.ModelSerializer):
     # a un campo llamado 'id' en la respuesta JSON para el frontend.
     id = serializers.IntegerField(source='frutocolocado_id', read_only=True)
     
-    tipo = serializers.CharField(source='frutocolocado_fruto.fruto_color', read_only=True)
+    tipo = serializers.SerializerMethodField()
     position = serializers.SerializerMethodField()
     
     class Meta:
@@ -542,6 +582,11 @@ class FrutoColocadoSerializer(serializers.ModelSerializer):
         # Ahora 'id' es un campo válido que hemos definido arriba.
         fields = ['id', 'tipo', 'position']
 
+    def get_tipo(self, obj):
+        # Desde el catálogo en memoria: evita una consulta por fruto
+        fruto = catalogo_frutos.por_id(obj.frutocolocado_fruto_id) or obj.frutocolocado_fruto
+        return fruto.fruto_color
+
     def get_position(self, obj):
         # Combina los campos x, y, z en un array [x, y, z]
         return [obj.position_x, obj.position_y, obj.position_z]
@@ -565,6 +610,70 @@ class CestaSerializer(serializers.ModelSerializer):
             'frutos_colocados' # Este es el campo clave para el frontend
         ]
 
+# Orden de los códigos de tipo en el formato compacto del árbol
+CODIGOS_TIPO_FRUTO = list(Cesta.CAMPOS_POR_COLOR)
+CODIGO_TIPO_DESCONOCIDO = 255
+
+
+def _base64_little_endian(valores):
+    if sys.byteorder == 'big':
+        valores.byteswap()
+    return base64.b64encode(valores.tobytes()).decode('ascii')
+
+
+def empaquetar_frutos_colocados(cesta_id):
+    """
+    Frutos colocados de una cesta en arreglos paralelos empaquetados, con una
+    sola consulta values_list:
+
+    - ids: uint32
+    - posiciones: float32, x, y, z consecutivos por fruto
+    - tipos: uint8, índice en `tipos_codigos` (255 si el color no se reconoce)
+
+    Cada arreglo va en base64 y little-endian; en el navegador se leen con
+    Uint32Array, Float32Array y Uint8Array.
+    """
+    codigo_por_fruto = {
+        fruto.fruto_id: CODIGOS_TIPO_FRUTO.index(fruto.fruto_color)
+        for fruto in catalogo_frutos.todos()
+        if fruto.fruto_color in CODIGOS_TIPO_FRUTO
+    }
+    filas = FrutoColocado.objects.filter(frutocolocado_cesta_id=cesta_id).order_by('frutocolocado_id').values_list(
+        'frutocolocado_id', 'frutocolocado_fruto_id', 'position_x', 'position_y', 'position_z'
+    )
+
+    ids, posiciones, tipos = array('I'), array('f'), array('B')
+    for fruto_colocado_id, fruto_id, x, y, z in filas:
+        ids.append(fruto_colocado_id)
+        posiciones.extend((x, y, z))
+        tipos.append(codigo_por_fruto.get(fruto_id, CODIGO_TIPO_DESCONOCIDO))
+
+    return {
+        'cantidad': len(ids),
+        'tipos_codigos': CODIGOS_TIPO_FRUTO,
+        'ids': _base64_little_endian(ids),
+        'posiciones': _base64_little_endian(posiciones),
+        'tipos': _base64_little_endian(tipos),
+    }
+
+
+class CestaCompactaSerializer(serializers.ModelSerializer):
+    """
+    Igual que CestaSerializer, pero con los frutos colocados empaquetados
+    (ver empaquetar_frutos_colocados). Pensado para árboles con muchos frutos.
+    """
+    frutos_colocados = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Cesta
+        fields = CestaSerializer.Meta.fields
+
+    def get_frutos_colocados(self, cesta):
+        return empaquetar_frutos_colocados(cesta.pk)
+
+# Límite de frutos por petición en los endpoints por lote del árbol
+MAX_FRUTOS_POR_LOTE = 200
+
 class PonerFrutoSerializer(serializers.Serializer):
     """
     Este serializador no se basa en un modelo directamente.
@@ -575,6 +684,20 @@ class PonerFrutoSerializer(serializers.Serializer):
     position = serializers.ListField(child=serializers.FloatField(), min_length=3, max_length=3)
 
 
+class PonerFrutosSerializer(serializers.Serializer):
+    """
+    Valida un lote de frutos para colocar en el árbol de una vez.
+    """
+    frutos = PonerFrutoSerializer(many=True, allow_empty=False, max_length=MAX_FRUTOS_POR_LOTE)
+
+
+class DevolverFrutosSerializer(serializers.Serializer):
+    """
+    IDs de los frutos colocados que se devuelven a la cesta.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=MAX_FRUTOS_POR_LOTE)
+
+
 # SERIALIZERS PARA ADMINISTRACION PROFESORES
 
 class AlumnoSerializerProfeAdmin(serializers.ModelSerializer):
@@ -603,6 +726,9 @@ class AlumnoSerializerProfeAdmin(serializers.ModelSerializer):
 
     def get_manzanas_en_inventario(self, obj):
         user = obj.alumno_usuario
+        # Si la vista ya anotó el total (GestionAlumnosListView), no se consulta la cesta
+        if hasattr(user, 'manzanas_en_inventario'):
+            return user.manzanas_en_inventario
         if hasattr(user, 'cesta'):
             return (
                 user.cesta.cesta_total_verdes +
@@ -669,6 +795,14 @@ class EditarUsuarioAdminSerializer(serializers.ModelSerializer):
             'usuario_fecha_nacimiento': {'required': False},
         }
 
+    def validate_usuario_rut(self, value):
+        # El UniqueValidator compara el texto tal cual; un RUT sin formato
+        # repetido terminaría en IntegrityError al guardarlo formateado
+        filtro = Usuario.filtro_rut(value) if value else None
+        if filtro is not None and Usuario.objects.filter(filtro).exclude(pk=self.instance.pk).exists():
+            raise serializers.ValidationError("Este RUT ya está en uso. Por favor, ingresa un RUT diferente.")
+        return value
+
 
 class ServicioSerializer(serializers.ModelSerializer):
     tipo_servicio = serializers.CharField(source='servicio_tiposervicio.Tipo_ServicioDescripcion', read_only=True)
@@ -824,10 +958,52 @@ class AsignarFrutoSerializer(serializers.Serializer):
         return value
 
     def validate_fruto_id(self, value):
-        if not Fruto.objects.filter(fruto_id=value).exists():
+        if catalogo_frutos.por_id(value) is None:
             raise serializers.ValidationError("El fruto seleccionado no existe.")
         return value
     
+class AsignarFrutoItemSerializer(serializers.Serializer):
+    """
+    Una asignación dentro de un lote. La existencia de los IDs se valida
+    en conjunto desde AsignarFrutoLoteSerializer.
+    """
+    alumno_id = serializers.IntegerField()
+    fruto_id = serializers.IntegerField()
+    motivo = serializers.CharField(max_length=255)
+
+
+class AsignarFrutoLoteSerializer(serializers.Serializer):
+    """
+    Valida una lista de asignaciones de frutos con una consulta IN para los
+    alumnos y el catálogo de frutos en memoria, sin importar el tamaño del lote.
+    """
+    asignaciones = AsignarFrutoItemSerializer(many=True, allow_empty=False)
+
+    def validate(self, data):
+        asignaciones = data['asignaciones']
+        alumno_ids = {a['alumno_id'] for a in asignaciones}
+        fruto_ids = {a['fruto_id'] for a in asignaciones}
+
+        clase_por_alumno = dict(
+            Usuario.objects.filter(id__in=alumno_ids, usuario_rol='alumno').values_list('id', 'usuario_clase_actual_id')
+        )
+        frutos = {fruto_id: catalogo_frutos.por_id(fruto_id) for fruto_id in fruto_ids}
+        color_por_fruto = {fruto_id: fruto.fruto_color for fruto_id, fruto in frutos.items() if fruto is not None}
+
+        errores = {}
+        alumnos_faltantes = sorted(alumno_ids - set(clase_por_alumno))
+        frutos_faltantes = sorted(fruto_ids - set(color_por_fruto))
+        if alumnos_faltantes:
+            errores['alumno_id'] = f"Los alumnos seleccionados no existen: {alumnos_faltantes}"
+        if frutos_faltantes:
+            errores['fruto_id'] = f"Los frutos seleccionados no existen: {frutos_faltantes}"
+        if errores:
+            raise serializers.ValidationError(errores)
+
+        data['clase_por_alumno'] = clase_por_alumno
+        data['color_por_fruto'] = color_por_fruto
+        return data
+
 class TipoServicioSerializer(serializers.ModelSerializer):
     """
     Serializa el modelo TipoServicio para ser usado en dropdowns.
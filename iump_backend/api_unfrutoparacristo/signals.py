@@ -1,11 +1,25 @@
-from django.db.models.signals import post_save
+import logging
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
-from .models import Usuario, Clase, Servicio, Asistencia, FrutoAsignado, Cesta
+from .models import (
+    Usuario, Alumno, Profesor, Clase, Mascota, MascotaEstado, Servicio, TipoServicio,
+    Asistencia, AsistenciaAlumno, Fruto, FrutoAsignado, Cesta,
+)
 from django.utils.timezone import now
+from . import catalogo_frutos, estadisticas, versiones
 
+logger = logging.getLogger(__name__)
 
 @receiver(post_save, sender=Usuario)
-def asignar_profesor_jefe(sender, instance, **kwargs):
+def asignar_profesor_jefe(sender, instance, created, **kwargs):
+    cambios = getattr(instance, '_cambios', {})
+    if not created and 'usuario_rol' not in cambios and 'usuario_clase_actual_id' not in cambios:
+        # Un login o una edición del perfil no cambian la jefatura. Una jefatura
+        # asignada a mano a otro rol se mantiene hasta que cambie su rol o clase.
+        return
+
     if instance.usuario_rol == 'profesor_jefe' and instance.usuario_clase_actual:
         clase = instance.usuario_clase_actual
 
@@ -15,7 +29,7 @@ def asignar_profesor_jefe(sender, instance, **kwargs):
             clase.save()
 
     # Caso inverso: si se le cambia el rol desde profesor_jefe a otro
-    elif instance.usuario_rol != 'profesor_jefe':
+    elif cambios.get('usuario_rol') == 'profesor_jefe':
         # Buscar si era profesor jefe de alguna clase
         clases_jefe = Clase.objects.filter(clase_profesor_jefe=instance)
         for clase in clases_jefe:
@@ -48,19 +62,207 @@ def actualizar_cesta_al_asignar_fruto(sender, instance, created, **kwargs):
     # Solo queremos ejecutar esta lógica cuando se CREA una nueva asignación de fruto.
     if created:
         usuario = instance.frutoasignado_usuario
-        fruto = instance.frutoasignado_fruto
-
-        # Nos aseguramos de que el usuario tenga una cesta. Si no la tiene, se crea.
-        cesta, cesta_created = Cesta.objects.get_or_create(cesta_usuario=usuario)
-
-        # Verificamos el color del fruto y actualizamos el contador correspondiente.
-        if fruto.fruto_color == 'verdes':
-            cesta.cesta_total_verdes += 1
-        elif fruto.fruto_color == 'rojas':
-            cesta.cesta_total_rojas += 1
-        elif fruto.fruto_color == 'doradas':
-            cesta.cesta_total_doradas += 1
-        
-        # Guardamos los cambios en la cesta.
-        cesta.save()
-        print(f"Cesta de {usuario.username} actualizada: +1 {fruto.fruto_color}")
\ No newline at end of file
+        fruto = catalogo_frutos.por_id(instance.frutoasignado_fruto_id) or instance.frutoasignado_fruto
+
+        # Un solo UPDATE con F(): las asignaciones concurrentes no se pierden.
+        # Si el usuario no tiene cesta, se crea.
+        if fruto.fruto_color in Cesta.CAMPOS_POR_COLOR:
+            Cesta.sumar_frutos(usuario.pk, fruto.fruto_color)
+        else:
+            Cesta.objects.get_or_create(cesta_usuario=usuario)
+        logger.debug("Cesta actualizada", extra={'usuario_id': usuario.pk, 'color': fruto.fruto_color})
+
+
+# ===================================================================
+# CATÁLOGO DE FRUTOS EN MEMORIA
+# ===================================================================
+# Se invalida de inmediato (para esta transacción) y otra vez al confirmar,
+# por si otro hilo recargó el catálogo con los datos anteriores entre medio.
+
+@receiver(post_save, sender=Fruto)
+@receiver(post_delete, sender=Fruto)
+def invalidar_catalogo_frutos(sender, **kwargs):
+    catalogo_frutos.invalidar()
+    transaction.on_commit(catalogo_frutos.invalidar)
+
+
+# ===================================================================
+# ESTADÍSTICAS DEL HOME EN CACHÉ
+# ===================================================================
+# Los cambios se aplican a la caché solo cuando la transacción se confirma.
+
+@receiver(pre_save, sender=Usuario)
+def recordar_cambios_usuario(sender, instance, update_fields=None, **kwargs):
+    # Rol, clase y username anteriores de los campos que cambian (ver Usuario.cambios_seguidos).
+    # Un save(update_fields=['last_login']) no los toca y no cuesta ninguna consulta.
+    instance._cambios = instance.cambios_seguidos(update_fields)
+
+@receiver(post_save, sender=Usuario)
+def estadisticas_usuario_guardado(sender, instance, created, **kwargs):
+    if created:
+        if instance.usuario_rol == 'alumno':
+            transaction.on_commit(lambda: estadisticas.incrementar('total_alumnos'))
+            if instance.usuario_clase_actual_id:
+                transaction.on_commit(lambda: estadisticas.invalidar('asistencia_promedio'))
+        return
+
+    cambios = getattr(instance, '_cambios', {})
+    if 'usuario_rol' in cambios:
+        transaction.on_commit(lambda: estadisticas.invalidar('total_alumnos'))
+    if 'usuario_rol' in cambios or 'usuario_clase_actual_id' in cambios:
+        # El promedio depende de cuántos alumnos tiene cada clase
+        transaction.on_commit(lambda: estadisticas.invalidar('asistencia_promedio'))
+
+@receiver(post_delete, sender=Usuario)
+def estadisticas_usuario_eliminado(sender, instance, **kwargs):
+    if instance.usuario_rol == 'alumno':
+        transaction.on_commit(lambda: estadisticas.incrementar('total_alumnos', -1))
+    transaction.on_commit(lambda: estadisticas.invalidar('asistencia_promedio'))
+
+@receiver(post_save, sender=FrutoAsignado)
+def estadisticas_fruto_asignado(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: estadisticas.incrementar('frutos_recolectados'))
+
+@receiver(post_delete, sender=FrutoAsignado)
+def estadisticas_fruto_eliminado(sender, instance, **kwargs):
+    transaction.on_commit(lambda: estadisticas.incrementar('frutos_recolectados', -1))
+
+@receiver(post_save, sender=Clase)
+def estadisticas_clase_guardada(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: estadisticas.incrementar('clases_activas'))
+
+@receiver(post_delete, sender=Clase)
+def estadisticas_clase_eliminada(sender, instance, **kwargs):
+    transaction.on_commit(lambda: estadisticas.incrementar('clases_activas', -1))
+    transaction.on_commit(lambda: estadisticas.invalidar('asistencia_promedio'))
+
+@receiver(post_save, sender=Asistencia)
+@receiver(post_delete, sender=Asistencia)
+@receiver(post_save, sender=AsistenciaAlumno)
+@receiver(post_delete, sender=AsistenciaAlumno)
+def estadisticas_asistencia_modificada(sender, instance, **kwargs):
+    transaction.on_commit(lambda: estadisticas.invalidar('asistencia_promedio'))
+
+
+# ===================================================================
+# RESUMEN DEL PANEL DEL PROFESOR POR CLASE
+# ===================================================================
+
+def _invalidar_panel(*clase_ids):
+    transaction.on_commit(lambda: estadisticas.invalidar_resumen_clase(*clase_ids))
+
+def _clase_del_usuario(instance, campo):
+    """
+    Clase actual del usuario de la FK `campo` de `instance`. Si quien guarda
+    pasó el objeto Usuario (como hacen las vistas) no cuesta ninguna consulta.
+    """
+    fk = instance._meta.get_field(campo)
+    if fk.is_cached(instance):
+        usuario = fk.get_cached_value(instance)
+        return usuario.usuario_clase_actual_id if usuario else None
+    return Usuario.objects.filter(pk=getattr(instance, fk.attname)).values_list('usuario_clase_actual_id', flat=True).first()
+
+@receiver(post_save, sender=Usuario)
+def panel_usuario_guardado(sender, instance, created, **kwargs):
+    # El panel cuenta los alumnos de la clase y sus frutos: solo importan rol y clase
+    if created:
+        if instance.usuario_rol == 'alumno':
+            _invalidar_panel(instance.usuario_clase_actual_id)
+        return
+    cambios = getattr(instance, '_cambios', {})
+    if 'usuario_rol' in cambios or 'usuario_clase_actual_id' in cambios:
+        # También la clase que el alumno deja
+        _invalidar_panel(instance.usuario_clase_actual_id, cambios.get('usuario_clase_actual_id'))
+
+@receiver(post_delete, sender=Usuario)
+def panel_usuario_eliminado(sender, instance, **kwargs):
+    _invalidar_panel(instance.usuario_clase_actual_id)
+
+@receiver(post_save, sender=FrutoAsignado)
+@receiver(post_delete, sender=FrutoAsignado)
+def panel_fruto_asignado(sender, instance, **kwargs):
+    _invalidar_panel(_clase_del_usuario(instance, 'frutoasignado_usuario'))
+
+@receiver(post_save, sender=Servicio)
+@receiver(post_delete, sender=Servicio)
+def panel_servicio_modificado(sender, instance, **kwargs):
+    _invalidar_panel(instance.servicio_clase_id)
+
+@receiver(post_save, sender=Asistencia)
+@receiver(post_delete, sender=Asistencia)
+def panel_asistencia_modificada(sender, instance, **kwargs):
+    _invalidar_panel(instance.asistencia_tipo_clase_id)
+
+@receiver(post_save, sender=AsistenciaAlumno)
+@receiver(post_delete, sender=AsistenciaAlumno)
+def panel_registro_asistencia(sender, instance, **kwargs):
+    fk = AsistenciaAlumno._meta.get_field('asistenciaalumno_asistencia')
+    if fk.is_cached(instance) and fk.get_cached_value(instance) is not None:
+        clase_id = fk.get_cached_value(instance).asistencia_tipo_clase_id
+    else:
+        clase_id = Asistencia.objects.filter(pk=instance.asistenciaalumno_asistencia_id).values_list('asistencia_tipo_clase_id', flat=True).first()
+    _invalidar_panel(clase_id)
+
+
+# ===================================================================
+# VERSIONES PARA GET CONDICIONALES (ETag)
+# ===================================================================
+# Ver versiones.py. Los contadores de Cesta (UPDATE con F()) incrementan
+# su versión en Cesta.marcar_modificadas, ya que no disparan post_save.
+
+def _incrementar_version(*nombres):
+    transaction.on_commit(lambda: versiones.incrementar(*nombres))
+
+@receiver(post_save, sender=Cesta)
+@receiver(post_delete, sender=Cesta)
+def version_cesta(sender, instance, **kwargs):
+    _incrementar_version(versiones.cesta(instance.cesta_usuario_id))
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def version_usuario(sender, instance, **kwargs):
+    nombres = [versiones.usuario(instance.pk)]
+    if 'username' in getattr(instance, '_cambios', {}) and Clase.objects.filter(clase_profesor_jefe=instance).exists():
+        # La lista de clases muestra el username del profesor jefe
+        nombres.append('clases')
+    _incrementar_version(*nombres)
+
+@receiver(pre_delete, sender=Usuario)
+def version_clases_jefe_eliminado(sender, instance, **kwargs):
+    # SET_NULL deja la clase sin jefe con un UPDATE que no dispara post_save de Clase
+    if Clase.objects.filter(clase_profesor_jefe=instance).exists():
+        _incrementar_version('clases')
+
+@receiver(post_save, sender=Alumno)
+@receiver(post_delete, sender=Alumno)
+def version_perfil_alumno(sender, instance, **kwargs):
+    _incrementar_version(versiones.usuario(instance.alumno_usuario_id))
+
+@receiver(post_save, sender=Profesor)
+@receiver(post_delete, sender=Profesor)
+def version_perfil_profesor(sender, instance, **kwargs):
+    _incrementar_version(versiones.usuario(instance.profesor_usuario_id))
+
+@receiver(post_save, sender=MascotaEstado)
+@receiver(post_delete, sender=MascotaEstado)
+def version_mascota_estado(sender, instance, **kwargs):
+    _incrementar_version(versiones.usuario(instance.mascota_estado_usuario_id))
+
+@receiver(post_save, sender=Clase)
+@receiver(post_delete, sender=Clase)
+@receiver(post_save, sender=Mascota)
+@receiver(post_delete, sender=Mascota)
+def version_clases(sender, **kwargs):
+    _incrementar_version('clases')
+
+@receiver(post_save, sender=Fruto)
+@receiver(post_delete, sender=Fruto)
+def version_frutos(sender, **kwargs):
+    _incrementar_version('frutos')
+
+@receiver(post_save, sender=TipoServicio)
+@receiver(post_delete, sender=TipoServicio)
+def version_tipos_servicio(sender, **kwargs):
+    _incrementar_version('tipos_servicio')
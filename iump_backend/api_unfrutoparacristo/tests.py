@@ -1,3 +1,1516 @@
-from django.test import TestCase
+import base64
+import datetime
+import io
+import json
+import logging
+import smtplib
+import threading
+import struct
+import tempfile
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.models import update_last_login
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import (
+    INTERVALO_DESGASTE_SEGUNDOS,
+    Usuario, Alumno, Clase, Mascota, Cesta, Fruto, FrutoAsignado, FrutoColocado, Servicio, Asistencia, AsistenciaAlumno,
+    TokenRestablecimiento, CorreoSaliente, MascotaEstado, TipoServicio, Noticia, Secuencia,
+)
+from . import base_datos, catalogo_frutos, codigos_invitacion, correos, estadisticas, rut, versiones
+from .bitacora import FiltroMuestreo, ManejadorCola
+from .importacion_alumnos import importar_alumnos, leer_archivo
+from .serializers import RegistroAlumnoSerializer
+from .throttling import ValidacionThrottle
+
+
+def crear_usuario(username, **kwargs):
+    kwargs.setdefault('usuario_fecha_nacimiento', datetime.date(2014, 1, 1))
+    return Usuario.objects.create(username=username, **kwargs)
+
+
+class GestionAlumnosListViewTests(TestCase):
+    """
+    La lista de alumnos del profesor debe costar un número fijo de consultas.
+    """
+
+    def setUp(self):
+        mascota = Mascota.objects.create(mascota_nombre='Valentín')
+        self.clase = Clase.objects.create(clase_nombre='Transición', clase_mascota=mascota)
+        self.profesor = crear_usuario('profe', usuario_rol='profesor', usuario_clase_actual=self.clase)
+        self.clase.clase_profesor_jefe = self.profesor
+        self.clase.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.profesor)
+
+    def agregar_alumnos(self, desde, cantidad):
+        for i in range(desde, desde + cantidad):
+            alumno = crear_usuario(f'alumno{i}', usuario_clase_actual=self.clase)
+            Alumno.objects.create(
+                alumno_usuario=alumno,
+                alumno_codigo_invitacion=f'C{i:05d}',
+                alumno_invitado_por=self.profesor,
+                alumno_cambiado_por=self.profesor,
+            )
+            Cesta.objects.create(cesta_usuario=alumno, cesta_total_verdes=i, cesta_total_rojas=1)
+
+    def contar_consultas(self):
+        # Instancia nueva para que las relaciones cacheadas de otra petición no alteren el conteo
+        self.client.force_authenticate(Usuario.objects.get(pk=self.profesor.pk))
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.client.get('/api/alumnos-clase/')
+        self.assertEqual(respuesta.status_code, 200)
+        return len(contexto), respuesta.data
+
+    def test_consultas_constantes_al_crecer_la_clase(self):
+        self.agregar_alumnos(0, 2)
+        consultas_pocos, _ = self.contar_consultas()
+
+        self.agregar_alumnos(2, 10)
+        consultas_muchos, data = self.contar_consultas()
+
+        self.assertEqual(consultas_pocos, consultas_muchos)
+        self.assertEqual(len(data['alumnos']), 12)
+
+    def test_manzanas_en_inventario_anotadas(self):
+        self.agregar_alumnos(0, 3)
+        sin_cesta = crear_usuario('sin_cesta', usuario_clase_actual=self.clase)
+        Alumno.objects.create(alumno_usuario=sin_cesta)
+
+        _, data = self.contar_consultas()
+        por_username = {a['username']: a['perfil'] for a in data['alumnos']}
+
+        self.assertEqual(por_username['alumno2']['manzanas_en_inventario'], 3)
+        self.assertEqual(por_username['alumno0']['alumno_invitado_por_username'], 'profe')
+        self.assertEqual(por_username['sin_cesta']['manzanas_en_inventario'], 0)
+
+
+class EstadisticasHomeTests(TestCase):
+    """
+    Las estadísticas del Home se calculan una vez y las señales las mantienen al día.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.clase = Clase.objects.create(clase_nombre='Transición')
+        self.fruto = Fruto.objects.create(fruto_nombre='Manzana verde', fruto_color='verdes')
+        self.alumno = crear_usuario('alumno', usuario_clase_actual=self.clase)
+
+    def test_segunda_lectura_no_consulta_la_base_de_datos(self):
+        estadisticas.obtener_estadisticas()
+        with CaptureQueriesContext(connection) as contexto:
+            estadisticas.obtener_estadisticas()
+        self.assertEqual(len(contexto), 0)
+
+    def test_senales_mantienen_los_valores(self):
+        self.assertEqual(estadisticas.obtener_estadisticas()['frutos_recolectados'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FrutoAsignado.objects.create(
+                frutoasignado_usuario=self.alumno, frutoasignado_fruto=self.fruto,
+                frutoasignado_motivo='Asistencia', frutoasignado_origen='Manual'
+            )
+            crear_usuario('otro_alumno', usuario_clase_actual=self.clase)
+            servicio = Servicio.objects.create(
+                servicio_clase=self.clase, servicio_descripcion='Domingo',
+                servicio_fecha_hora=datetime.datetime(2025, 8, 3, 11, tzinfo=datetime.timezone.utc)
+            )
+            asistencia = Asistencia.objects.create(
+                asistencia_servicio=servicio, asistencia_fecha=datetime.date(2025, 8, 3),
+                asistencia_tipo_clase=self.clase
+            )
+            AsistenciaAlumno.objects.create(asistenciaalumno_asistencia=asistencia, asistenciaalumno_usuario=self.alumno)
+
+        stats = estadisticas.obtener_estadisticas()
+        self.assertEqual(stats['frutos_recolectados'], 1)
+        self.assertEqual(stats['total_alumnos'], 2)
+        self.assertEqual(stats['clases_activas'], 1)
+        self.assertEqual(stats['asistencia_promedio'], '50%')
+
+    def test_guardar_usuario_sin_cambiar_rol_ni_clase_no_invalida(self):
+        self.alumno.set_password('clave-alumno-1')
+        self.alumno.save()
+        estadisticas.obtener_estadisticas()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # Lo que hace cada login, y una edición del perfil
+            update_last_login(None, self.alumno)
+            self.alumno.usuario_nombre_completo = 'Alumno Uno'
+            self.alumno.save()
+        with CaptureQueriesContext(connection) as contexto:
+            estadisticas.obtener_estadisticas()
+        self.assertEqual(len(contexto), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alumno.usuario_rol = 'profesor'
+            self.alumno.save()
+        self.assertEqual(estadisticas.obtener_estadisticas()['total_alumnos'], 0)
+
+    def test_cambio_de_clase_de_un_usuario_no_cargado(self):
+        otra = Clase.objects.create(clase_nombre='Otra')
+        estadisticas.obtener_estadisticas()
+        with self.captureOnCommitCallbacks(execute=True):
+            # Instancia con campos diferidos: se consulta la clase anterior
+            alumno = Usuario.objects.only('id', 'username', 'usuario_fecha_nacimiento').get(pk=self.alumno.pk)
+            alumno.usuario_clase_actual = otra
+            alumno.save()
+        self.assertIsNone(cache.get(estadisticas._clave('asistencia_promedio')))
+
+    def test_refresh_from_db_actualiza_los_valores_recordados(self):
+        alumno = Usuario.objects.get(pk=self.alumno.pk)
+        Usuario.objects.filter(pk=alumno.pk).update(usuario_rol='profesor')
+        alumno.refresh_from_db()
+        self.assertEqual(alumno.cambios_seguidos(), {})
+
+        # Un cambio local sin guardar se sigue viendo tras recargar otro campo
+        alumno.usuario_rol = 'alumno'
+        alumno.refresh_from_db(fields=['username'])
+        self.assertEqual(alumno.cambios_seguidos(), {'usuario_rol': 'profesor'})
+
+
+class JefaturaClaseTests(TestCase):
+    """
+    La jefatura de una clase solo se revisa al crear el usuario o cambiarle
+    rol o clase: un login o una edición del perfil no la tocan.
+    """
+
+    def setUp(self):
+        self.clase = Clase.objects.create(clase_nombre='Jefatura')
+        self.jefe = crear_usuario('jefe_clase', usuario_rol='profesor_jefe', usuario_clase_actual=self.clase)
+        self.clase.refresh_from_db()
+
+    def test_se_asigna_al_crear_y_se_quita_al_cambiar_el_rol(self):
+        self.assertEqual(self.clase.clase_profesor_jefe, self.jefe)
+
+        self.jefe.usuario_rol = 'profesor'
+        self.jefe.save()
+        self.clase.refresh_from_db()
+        self.assertIsNone(self.clase.clase_profesor_jefe)
+
+    def test_guardar_otro_campo_no_revisa_la_jefatura(self):
+        # Jefatura asignada a mano a alguien que no es profesor_jefe
+        profesor = crear_usuario('profesor_clase', usuario_rol='profesor', usuario_clase_actual=self.clase)
+        Clase.objects.filter(pk=self.clase.pk).update(clase_profesor_jefe=profesor)
+
+        with self.assertNumQueries(1):
+            update_last_login(None, profesor)
+        profesor.usuario_nombre_completo = 'Profesor Uno'
+        profesor.save()
+        self.clase.refresh_from_db()
+        self.assertEqual(self.clase.clase_profesor_jefe, profesor)
+
+
+class RestablecimientoPasswordTests(TestCase):
+    """
+    Los tokens de restablecimiento viven en la base de datos y no en memoria del proceso.
+    """
+
+    def setUp(self):
+        self.usuario = crear_usuario('apoderado', usuario_email='apoderado@example.com')
+        self.usuario.set_password('antigua')
+        self.usuario.save()
+
+    def emitir_token(self, cliente):
+        respuesta = cliente.post('/api/auth/enviar-reset/', {'email': 'apoderado@example.com'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        return mail.outbox[-1].body.rsplit('/', 1)[-1].strip()
+
+    def test_emitir_y_confirmar_en_workers_distintos(self):
+        # Worker 1 emite el token
+        token = self.emitir_token(APIClient())
+        self.assertFalse(TokenRestablecimiento.objects.filter(token_hash=token).exists())
+
+        # Worker 2: sin estado compartido en memoria, solo la base de datos
+        cache.clear()
+        worker_2 = APIClient()
+        respuesta = worker_2.post('/api/auth/confirmar-reset/', {'token': token, 'password': 'nueva-clave'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+
+        self.usuario.refresh_from_db()
+        self.assertTrue(self.usuario.check_password('nueva-clave'))
+
+        # El token no se puede reutilizar
+        respuesta = worker_2.post('/api/auth/confirmar-reset/', {'token': token, 'password': 'otra'}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_tokens_expirados_se_rechazan_y_se_purgan(self):
+        token = self.emitir_token(APIClient())
+        TokenRestablecimiento.objects.update(token_expira=timezone.now() - datetime.timedelta(minutes=1))
+
+        respuesta = APIClient().post('/api/auth/confirmar-reset/', {'token': token, 'password': 'nueva'}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+
+        # Emitir un token nuevo limpia los vencidos
+        self.emitir_token(APIClient())
+        self.assertEqual(TokenRestablecimiento.objects.count(), 1)
+
+
+class BackendQueFalla(BaseEmailBackend):
+    """Simula un servidor SMTP caído."""
+
+    def send_messages(self, email_messages):
+        raise smtplib.SMTPServerDisconnected("Servidor no disponible")
+
+
+class BackendSinConexion(BaseEmailBackend):
+    """Simula un servidor SMTP que rechaza la conexión."""
+
+    def open(self):
+        raise ConnectionRefusedError("Conexión rechazada")
+
+    def send_messages(self, email_messages):
+        raise AssertionError("No debería enviar sin conexión")
+
+
+@override_settings(
+    EMAIL_BACKEND='api_unfrutoparacristo.correos.ColaCorreoBackend',
+    CORREO_BACKEND_ENVIO='django.core.mail.backends.locmem.EmailBackend',
+)
+class ColaCorreosTests(TestCase):
+    """
+    Las vistas solo encolan correos; el worker los envía con reintentos.
+    """
+
+    def setUp(self):
+        crear_usuario('apoderado', usuario_email='apoderado@example.com')
+
+    def test_la_vista_encola_sin_enviar(self):
+        respuesta = APIClient().post('/api/auth/enviar-reset/', {'email': 'apoderado@example.com'}, format='json')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        correo = CorreoSaliente.objects.get()
+        self.assertEqual(correo.correo_destinatarios, ['apoderado@example.com'])
+
+        self.assertEqual(correos.enviar_pendientes(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        correo.refresh_from_db()
+        self.assertEqual(correo.correo_estado, 'enviado')
+
+    def test_reintento_con_espera_y_fallo_definitivo(self):
+        mail.send_mail('Asunto', 'Cuerpo', None, ['apoderado@example.com'])
+
+        with override_settings(CORREO_BACKEND_ENVIO='api_unfrutoparacristo.tests.BackendQueFalla'):
+            self.assertEqual(correos.enviar_pendientes(), (0, 1))
+            correo = CorreoSaliente.objects.get()
+            self.assertEqual(correo.correo_estado, 'pendiente')
+            self.assertGreater(correo.correo_proximo_intento, timezone.now())
+
+            # Mientras no se cumple la espera, el worker no lo vuelve a tomar
+            self.assertEqual(correos.enviar_pendientes(), (0, 0))
+
+            CorreoSaliente.objects.update(correo_intentos=correos.MAX_INTENTOS - 1, correo_proximo_intento=timezone.now())
+            correos.enviar_pendientes()
+            correo.refresh_from_db()
+            self.assertEqual(correo.correo_estado, 'fallido')
+
+    def test_fallo_al_conectar_reprograma_todo_el_lote(self):
+        mail.send_mail('Uno', 'Cuerpo', None, ['a@example.com'])
+        mail.send_mail('Dos', 'Cuerpo', None, ['b@example.com'])
+
+        with override_settings(CORREO_BACKEND_ENVIO='api_unfrutoparacristo.tests.BackendSinConexion'):
+            self.assertEqual(correos.enviar_pendientes(), (0, 2))
+
+        for correo in CorreoSaliente.objects.all():
+            self.assertEqual(correo.correo_estado, 'pendiente')
+            self.assertEqual(correo.correo_ultimo_error, 'Conexión rechazada')
+            # Ya no queda con el plazo de la reserva sino con la espera del reintento
+            self.assertLess(correo.correo_proximo_intento, timezone.now() + correos.RESERVA)
+
+
+class LoginTests(TestCase):
+    """
+    El login acepta username, email o RUT y cuesta una consulta y un solo cálculo de hash.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user(
+            username='maria',
+            password='clave-segura-1',
+            usuario_email='Maria.Perez@example.com',
+            usuario_rut='12.345.678-5',
+            usuario_fecha_nacimiento=datetime.date(2014, 1, 1),
+        )
+
+    def login(self, identificador, password):
+        """Devuelve (respuesta, consultas, hashes calculados)."""
+        with mock.patch.object(
+            PBKDF2PasswordHasher, 'encode', autospec=True, side_effect=PBKDF2PasswordHasher.encode
+        ) as encode, CaptureQueriesContext(connection) as consultas:
+            respuesta = APIClient().post(
+                '/api/auth/login/', {'username': identificador, 'password': password}, format='json'
+            )
+        return respuesta, len(consultas.captured_queries), encode.call_count
+
+    def test_login_exitoso_por_cada_identificador(self):
+        for identificador in ['maria', 'maria.perez@EXAMPLE.com', '12.345.678-5', '123456785', '12345678-5']:
+            with self.subTest(identificador=identificador):
+                respuesta, consultas, hashes = self.login(identificador, 'clave-segura-1')
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertIn('access', respuesta.data)
+                self.assertEqual(consultas, 1)
+                self.assertEqual(hashes, 1)
+
+    def test_login_fallido_calcula_un_solo_hash(self):
+        for identificador in ['maria', '12.345.678-5', 'nadie@example.com', 'nadie']:
+            with self.subTest(identificador=identificador):
+                respuesta, consultas, hashes = self.login(identificador, 'incorrecta')
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertEqual(consultas, 1)
+                self.assertEqual(hashes, 1)
+
+    def test_username_exacto_tiene_prioridad(self):
+        # Otro usuario cuyo username coincide con el email de María
+        Usuario.objects.create_user(
+            username='maria.perez@example.com',
+            password='otra-clave-1',
+            usuario_fecha_nacimiento=datetime.date(2014, 1, 1),
+        )
+        respuesta, _, _ = self.login('maria.perez@example.com', 'otra-clave-1')
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class LimitacionLoginTests(TestCase):
+    """
+    Throttling por IP e identificador, y bloqueo tras varios fallos seguidos.
+    """
+
+    def setUp(self):
+        cache.clear()
+        Usuario.objects.create_user(
+            username='pedro',
+            password='clave-segura-1',
+            usuario_email='pedro@example.com',
+            usuario_rut='12.345.678-5',
+            usuario_fecha_nacimiento=datetime.date(2014, 1, 1),
+        )
+        self.client = APIClient()
+
+    def login(self, identificador, password):
+        return self.client.post('/api/auth/login/', {'username': identificador, 'password': password}, format='json')
+
+    def test_bloqueo_rechaza_sin_calcular_hash(self):
+        for _ in range(5):
+            self.assertEqual(self.login('pedro', 'incorrecta').status_code, 400)
+
+        with mock.patch.object(PBKDF2PasswordHasher, 'encode', autospec=True) as encode, \
+                CaptureQueriesContext(connection) as consultas:
+            respuesta = self.login('PEDRO ', 'clave-segura-1')
+
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertIn('Retry-After', respuesta)
+        self.assertEqual(encode.call_count, 0)
+        self.assertEqual(len(consultas.captured_queries), 0)
+
+    def test_bloqueo_cubre_variantes_del_rut(self):
+        for rut in ['12.345.678-5', '123456785', '12345678-5', '12.345.678-5', '123456785']:
+            self.login(rut, 'incorrecta')
+        self.assertEqual(self.login('12345678-5', 'clave-segura-1').status_code, 429)
+
+    def test_bloqueo_por_cuenta_suma_username_correo_y_rut(self):
+        for identificador in ['pedro', 'pedro', 'pedro@example.com', 'Pedro@Example.com', '12.345.678-5']:
+            self.assertEqual(self.login(identificador, 'incorrecta').status_code, 400)
+
+        with mock.patch.object(PBKDF2PasswordHasher, 'encode', autospec=True) as encode:
+            respuesta = self.login('123456785', 'clave-segura-1')
+
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertIn('Retry-After', respuesta)
+        self.assertEqual(encode.call_count, 0)
+        self.assertEqual(self.login('pedro', 'clave-segura-1').status_code, 429)
+
+    def test_identificadores_desconocidos_no_bloquean_cuentas(self):
+        for _ in range(5):
+            self.login('nadie@example.com', 'incorrecta')
+        self.assertEqual(self.login('nadie@example.com', 'clave-segura-1').status_code, 429)
+        self.assertEqual(self.login('pedro@example.com', 'clave-segura-1').status_code, 200)
+
+    def test_login_exitoso_reinicia_los_fallos(self):
+        for _ in range(4):
+            self.login('pedro', 'incorrecta')
+        self.assertEqual(self.login('pedro', 'clave-segura-1').status_code, 200)
+        for _ in range(4):
+            self.login('pedro', 'incorrecta')
+        self.assertEqual(self.login('pedro', 'clave-segura-1').status_code, 200)
+
+    def test_limite_por_ip_en_validaciones(self):
+        with mock.patch.dict(ValidacionThrottle.THROTTLE_RATES, {'validacion': '2/min'}):
+            codigos = [
+                self.client.get('/api/usuarios/validar-username/', {'value': 'pedro'}).status_code
+                for _ in range(3)
+            ]
+        self.assertEqual(codigos, [200, 200, 429])
+
+
+class ContadoresCestaConcurrentesTests(TransactionTestCase):
+    """
+    Muchos hilos modifican la misma cesta a la vez y ningún cambio se pierde.
+    """
+    HILOS = 8
+    OPERACIONES = 25
+
+    def setUp(self):
+        self.usuario = crear_usuario('concurrente')
+        self.cesta = Cesta.objects.create(cesta_usuario=self.usuario)
+
+    def martillar(self, operacion):
+        """Ejecuta `operacion` desde varios hilos a la vez y devuelve cuántas tuvieron efecto."""
+        barrera = threading.Barrier(self.HILOS)
+        resultados = []
+
+        def trabajador():
+            barrera.wait()
+            try:
+                for _ in range(self.OPERACIONES):
+                    while True:
+                        try:
+                            resultados.append(operacion())
+                            break
+                        except OperationalError:
+                            # SQLite en memoria rechaza escrituras simultáneas en lugar de
+                            # esperar; en PostgreSQL la fila bloqueada espera y no llega aquí
+                            continue
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=trabajador) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return sum(1 for resultado in resultados if resultado is not False)
+
+    def test_sumar_frutos_no_pierde_incrementos(self):
+        self.martillar(lambda: Cesta.sumar_frutos(self.usuario.pk, 'verdes'))
+        self.cesta.refresh_from_db()
+        self.assertEqual(self.cesta.cesta_total_verdes, self.HILOS * self.OPERACIONES)
+
+    def test_poner_y_devolver_respetan_el_inventario(self):
+        Cesta.objects.filter(pk=self.cesta.pk).update(cesta_total_rojas=50)
+
+        puestos = self.martillar(lambda: self.cesta.poner_fruto('rojas'))
+        self.cesta.refresh_from_db()
+        self.assertEqual(puestos, 50)
+        self.assertEqual((self.cesta.cesta_total_rojas, self.cesta.cesta_rojas_puestas), (0, 50))
+
+        devueltos = self.martillar(lambda: self.cesta.devolver_fruto('rojas'))
+        self.cesta.refresh_from_db()
+        self.assertEqual(devueltos, 50)
+        self.assertEqual((self.cesta.cesta_total_rojas, self.cesta.cesta_rojas_puestas), (50, 0))
+
+
+class CatalogoFrutosTests(TestCase):
+    """
+    El catálogo de frutos se carga una vez por proceso y se invalida al cambiar un Fruto.
+    """
+
+    def setUp(self):
+        # El rollback de cada test no dispara señales: se parte de un catálogo vacío
+        catalogo_frutos.invalidar()
+        self.verde = Fruto.objects.create(fruto_nombre='Manzana verde', fruto_color='verdes')
+        self.usuario = crear_usuario('ana')
+        Cesta.objects.create(cesta_usuario=self.usuario, cesta_total_verdes=3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def poner_fruto(self, tipo):
+        return self.client.post('/api/cesta/poner_fruto/', {'tipo': tipo, 'position': [0, 1, 2]}, format='json')
+
+    def test_poner_fruto_no_consulta_el_catalogo(self):
+        self.assertEqual(self.poner_fruto('verdes').status_code, 201)
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.poner_fruto('verdes').status_code, 201)
+        tablas = ' '.join(consulta['sql'] for consulta in consultas.captured_queries)
+        self.assertNotIn('api_unfrutoparacristo_fruto"', tablas)
+
+    def test_cambios_en_fruto_invalidan_el_catalogo(self):
+        with self.assertLogs('api_unfrutoparacristo.views', 'WARNING'):
+            self.assertEqual(self.poner_fruto('rojas').status_code, 400)
+
+        roja = Fruto.objects.create(fruto_nombre='Manzana roja', fruto_color='rojas')
+        self.assertEqual(catalogo_frutos.por_color('rojas'), roja)
+
+        roja.delete()
+        self.assertIsNone(catalogo_frutos.por_color('rojas'))
+
+
+class BitacoraTests(TestCase):
+    """
+    Registro estructurado con cola y muestreo.
+    """
+
+    def setUp(self):
+        self.salida = io.StringIO()
+        self.manejador = ManejadorCola(stream=self.salida)
+        self.logger = logging.getLogger('api_unfrutoparacristo.pruebas_bitacora')
+        self.logger.addHandler(self.manejador)
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+
+    def tearDown(self):
+        self.logger.removeHandler(self.manejador)
+        self.manejador.close()
+
+    def lineas(self):
+        self.manejador.close()  # Vacía la cola antes de leer
+        return [json.loads(linea) for linea in self.salida.getvalue().splitlines()]
+
+    def test_registro_en_json_con_campos_extra(self):
+        try:
+            raise ValueError("falló")
+        except ValueError:
+            self.logger.exception("Error al %s", 'guardar', extra={'usuario_id': 7})
+
+        [registro] = self.lineas()
+        self.assertEqual(registro['nivel'], 'ERROR')
+        self.assertEqual(registro['mensaje'], 'Error al guardar')
+        self.assertEqual(registro['usuario_id'], 7)
+        self.assertIn('ValueError: falló', registro['excepcion'])
+
+    def test_muestreo_no_descarta_advertencias(self):
+        self.manejador.addFilter(FiltroMuestreo(tasa=0))
+        self.logger.debug("descartado")
+        self.logger.info("también descartado")
+        self.logger.info("forzado", extra={'tasa_muestreo': 1})
+        self.logger.warning("advertencia")
+
+        self.assertEqual([r['mensaje'] for r in self.lineas()], ['forzado', 'advertencia'])
+
+    def test_poner_fruto_no_escribe_en_stdout(self):
+        catalogo_frutos.invalidar()
+        Fruto.objects.create(fruto_nombre='Manzana dorada', fruto_color='doradas')
+        usuario = crear_usuario('luis')
+        Cesta.objects.create(cesta_usuario=usuario, cesta_total_doradas=1)
+        cliente = APIClient()
+        cliente.force_authenticate(usuario)
+
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            respuesta = cliente.post('/api/cesta/poner_fruto/', {'tipo': 'doradas', 'position': [1, 2, 3]}, format='json')
+
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(stdout.getvalue(), '')
+
+
+class FrutosEnLoteArbolTests(TestCase):
+    """
+    Poner y devolver varios frutos del árbol cuesta un número fijo de consultas.
+    """
+
+    def setUp(self):
+        catalogo_frutos.invalidar()
+        Fruto.objects.create(fruto_nombre='Manzana verde', fruto_color='verdes')
+        Fruto.objects.create(fruto_nombre='Manzana roja', fruto_color='rojas')
+        self.usuario = crear_usuario('sofia')
+        self.cesta = Cesta.objects.create(cesta_usuario=self.usuario, cesta_total_verdes=30, cesta_total_rojas=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def poner(self, frutos):
+        return self.client.post('/api/cesta/poner_frutos/', frutos, format='json')
+
+    def lote(self, verdes, rojas=0):
+        return [{'tipo': 'verdes', 'position': [i, 0, 0]} for i in range(verdes)] + \
+               [{'tipo': 'rojas', 'position': [0, i, 0]} for i in range(rojas)]
+
+    def test_consultas_constantes_segun_tamano_del_lote(self):
+        catalogo_frutos.todos()  # La carga del catálogo ocurre una vez por proceso
+        with CaptureQueriesContext(connection) as pocos:
+            self.assertEqual(self.poner(self.lote(2)).status_code, 201)
+        with CaptureQueriesContext(connection) as muchos:
+            respuesta = self.poner(self.lote(20, rojas=2))
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(len(respuesta.data), 22)
+        self.assertEqual(len(pocos.captured_queries), len(muchos.captured_queries))
+
+        self.cesta.refresh_from_db()
+        self.assertEqual((self.cesta.cesta_total_verdes, self.cesta.cesta_verdes_puestas), (8, 22))
+        self.assertEqual((self.cesta.cesta_total_rojas, self.cesta.cesta_rojas_puestas), (0, 2))
+
+    def test_inventario_insuficiente_no_coloca_nada(self):
+        respuesta = self.poner({'frutos': self.lote(5, rojas=3)})
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.data['faltantes'], {'rojas': 1})
+        self.assertFalse(FrutoColocado.objects.exists())
+        self.cesta.refresh_from_db()
+        self.assertEqual((self.cesta.cesta_total_verdes, self.cesta.cesta_total_rojas), (30, 2))
+
+    def test_devolver_frutos_en_lote(self):
+        ids = [fruto['id'] for fruto in self.poner(self.lote(4, rojas=1)).data]
+
+        respuesta = self.client.post('/api/cesta/devolver_frutos/', {'ids': ids[1:]}, format='json')
+        self.assertEqual(respuesta.status_code, 204)
+        self.assertEqual(list(FrutoColocado.objects.values_list('pk', flat=True)), ids[:1])
+        self.cesta.refresh_from_db()
+        self.assertEqual((self.cesta.cesta_total_verdes, self.cesta.cesta_verdes_puestas), (29, 1))
+        self.assertEqual((self.cesta.cesta_total_rojas, self.cesta.cesta_rojas_puestas), (2, 0))
+
+        # Los mismos ids otra vez: ya no existen y no se suman de nuevo
+        respuesta = self.client.post('/api/cesta/devolver_frutos/', {'ids': ids}, format='json')
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertEqual(respuesta.data['ids'], ids[1:])
+        self.assertEqual(FrutoColocado.objects.count(), 1)
+
+    def test_devolver_un_fruto_con_contadores_inconsistentes_no_lo_borra(self):
+        fruto_id = self.poner(self.lote(1)).data[0]['id']
+        # El contador de puestas ya está en cero aunque el fruto siga en el árbol
+        Cesta.objects.filter(pk=self.cesta.pk).update(cesta_verdes_puestas=0)
+
+        respuesta = self.client.delete(f'/api/cesta/devolver_fruto/{fruto_id}/')
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertTrue(FrutoColocado.objects.filter(pk=fruto_id).exists())
+        self.cesta.refresh_from_db()
+        self.assertEqual(self.cesta.cesta_total_verdes, 29)
+
+        Cesta.objects.filter(pk=self.cesta.pk).update(cesta_verdes_puestas=1)
+        self.assertEqual(self.client.delete(f'/api/cesta/devolver_fruto/{fruto_id}/').status_code, 204)
+        self.cesta.refresh_from_db()
+        self.assertEqual((self.cesta.cesta_total_verdes, self.cesta.cesta_verdes_puestas), (30, 0))
+
+    def test_devolver_un_fruto_de_color_sin_contador(self):
+        morada = Fruto.objects.create(fruto_nombre='Uva', fruto_color='moradas')
+        colocado = FrutoColocado.objects.create(frutocolocado_cesta=self.cesta, frutocolocado_fruto=morada)
+
+        respuesta = self.client.delete(f'/api/cesta/devolver_fruto/{colocado.pk}/')
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertTrue(FrutoColocado.objects.filter(pk=colocado.pk).exists())
+        respuesta = self.client.post('/api/cesta/devolver_frutos/', {'ids': [colocado.pk]}, format='json')
+        self.assertEqual(respuesta.status_code, 409)
+
+
+class ArbolCompactoTests(TestCase):
+    """
+    GET /api/cesta/ en formato JSON y compacto, con consultas fijas.
+    """
+
+    def setUp(self):
+        catalogo_frutos.invalidar()
+        verde = Fruto.objects.create(fruto_nombre='Manzana verde', fruto_color='verdes')
+        dorada = Fruto.objects.create(fruto_nombre='Manzana dorada', fruto_color='doradas')
+        self.usuario = crear_usuario('tomas')
+        cesta = Cesta.objects.create(cesta_usuario=self.usuario)
+        self.colocados = FrutoColocado.objects.bulk_create([
+            FrutoColocado(frutocolocado_cesta=cesta, frutocolocado_fruto=verde, position_x=0.5, position_y=1.25, position_z=-2),
+            FrutoColocado(frutocolocado_cesta=cesta, frutocolocado_fruto=dorada, position_x=3, position_y=0, position_z=0.75),
+        ])
+        catalogo_frutos.todos()
+        # El contador de versión se crea en el primer GET; aquí se compara el costo estable
+        versiones.obtener(versiones.cesta(self.usuario.pk))
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def test_formato_compacto(self):
+        for parametros, accept in [({'format': 'compacto'}, None), ({}, 'application/vnd.unfrutoparacristo.arbol-compacto+json')]:
+            with self.subTest(parametros=parametros, accept=accept):
+                extra = {'HTTP_ACCEPT': accept} if accept else {}
+                respuesta = self.client.get('/api/cesta/', parametros, **extra)
+                self.assertEqual(respuesta.status_code, 200)
+
+                frutos = respuesta.json()['frutos_colocados']
+                self.assertEqual(frutos['cantidad'], 2)
+                self.assertEqual(frutos['tipos_codigos'], ['verdes', 'rojas', 'doradas'])
+                self.assertEqual(struct.unpack('<2I', base64.b64decode(frutos['ids'])), tuple(f.pk for f in self.colocados))
+                self.assertEqual(struct.unpack('<6f', base64.b64decode(frutos['posiciones'])), (0.5, 1.25, -2, 3, 0, 0.75))
+                self.assertEqual(list(base64.b64decode(frutos['tipos'])), [0, 2])
+
+    def test_consultas_fijas_en_ambos_formatos(self):
+        for parametros in [{}, {'format': 'compacto'}]:
+            with self.subTest(parametros=parametros):
+                with CaptureQueriesContext(connection) as antes:
+                    self.client.get('/api/cesta/', parametros)
+                FrutoColocado.objects.bulk_create([
+                    FrutoColocado(frutocolocado_cesta=self.colocados[0].frutocolocado_cesta, frutocolocado_fruto_id=self.colocados[0].frutocolocado_fruto_id)
+                    for _ in range(10)
+                ])
+                with CaptureQueriesContext(connection) as despues:
+                    respuesta = self.client.get('/api/cesta/', parametros)
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(len(antes.captured_queries), len(despues.captured_queries))
+
+        self.assertEqual(respuesta.json()['frutos_colocados']['cantidad'], 22)
+
+
+class GetCondicionalTests(TestCase):
+    """
+    ETag / Last-Modified: un 304 no ejecuta serializers; con un token JWT real
+    solo cuesta cargar al usuario y leer las versiones (y la fecha base de la
+    mascota en /user-data/).
+    """
+
+    def setUp(self):
+        cache.clear()
+        catalogo_frutos.invalidar()
+        Fruto.objects.create(fruto_nombre='Manzana verde', fruto_color='verdes')
+        TipoServicio.objects.create(Tipo_ServicioDescripcion='Escuela dominical')
+        self.usuario = crear_usuario('camila')
+        Alumno.objects.create(alumno_usuario=self.usuario)
+        MascotaEstado.objects.create(mascota_estado_usuario=self.usuario)
+        Cesta.objects.create(cesta_usuario=self.usuario, cesta_total_verdes=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def get_condicional(self, url, respuesta_anterior, **extra):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=respuesta_anterior['ETag'], **extra)
+        return respuesta, len(consultas.captured_queries)
+
+    def test_304_con_token_real(self):
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.usuario).access_token}')
+        # Usuario (JWTAuthentication) y versiones; /user-data/ lee además la fecha base de la mascota
+        urls = {'/api/cesta/': 2, '/api/user-data/': 3, '/api/clases/': 2, '/api/frutos/': 2, '/api/tipos-servicio/': 2}
+        for url, esperadas in urls.items():
+            with self.subTest(url=url):
+                primera = cliente.get(url)
+                self.assertEqual(primera.status_code, 200)
+                self.assertIn('Last-Modified', primera)
+
+                with CaptureQueriesContext(connection) as consultas:
+                    respuesta = cliente.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+                self.assertEqual(respuesta.status_code, 304)
+                self.assertEqual(len(consultas.captured_queries), esperadas)
+
+    def test_contadores_nuevos_parten_de_una_semilla_aleatoria(self):
+        with mock.patch('secrets.randbits', return_value=7):
+            self.assertEqual(versiones.obtener('otro')[0], {'otro': 7})
+        versiones.incrementar('otro')
+        self.assertEqual(versiones.obtener('otro')[0], {'otro': 8})
+
+    def test_if_modified_since_solo_no_da_304(self):
+        primera = self.client.get('/api/frutos/')
+        respuesta = self.client.get('/api/frutos/', HTTP_IF_MODIFIED_SINCE=primera['Last-Modified'])
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_workers_con_caches_separadas_no_responden_304_viejos(self):
+        def trabajador(nombre):
+            # Cada LOCATION de LocMemCache es un almacén aparte, como la memoria de otro worker
+            return override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'trabajador-{nombre}',
+            }})
+
+        with trabajador('a'):
+            cesta = self.client.get('/api/cesta/')
+            self.assertEqual(self.get_condicional('/api/cesta/', cesta)[0].status_code, 304)
+        with trabajador('b'), self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post('/api/cesta/poner_fruto/', {'tipo': 'verdes', 'position': [0, 0, 0]}, format='json')
+            self.assertEqual(respuesta.status_code, 201)
+        with trabajador('a'):
+            self.assertEqual(self.get_condicional('/api/cesta/', cesta)[0].status_code, 200)
+
+    def test_cambios_invalidan_el_etag(self):
+        cesta = self.client.get('/api/cesta/')
+        user_data = self.client.get('/api/user-data/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(
+                self.client.post('/api/cesta/poner_fruto/', {'tipo': 'verdes', 'position': [0, 0, 0]}, format='json').status_code,
+                201,
+            )
+        # La cesta y las manzanas en inventario de /user-data/ cambiaron
+        self.assertEqual(self.get_condicional('/api/cesta/', cesta)[0].status_code, 200)
+        self.assertEqual(self.get_condicional('/api/user-data/', user_data)[0].status_code, 200)
+
+        frutos = self.client.get('/api/frutos/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Fruto.objects.create(fruto_nombre='Manzana roja', fruto_color='rojas')
+        self.assertEqual(self.get_condicional('/api/frutos/', frutos)[0].status_code, 200)
+
+    def test_formato_compacto_tiene_otro_etag(self):
+        normal = self.client.get('/api/cesta/')
+        compacto = self.client.get('/api/cesta/', {'format': 'compacto'})
+        self.assertNotEqual(normal['ETag'], compacto['ETag'])
+        self.assertEqual(self.get_condicional('/api/cesta/?format=compacto', normal)[0].status_code, 200)
+
+    def test_desgaste_de_la_mascota_cambia_el_etag(self):
+        user_data = self.client.get('/api/user-data/')
+        self.assertEqual(self.get_condicional('/api/user-data/', user_data)[0].status_code, 304)
+
+        # Pasa un intervalo de desgaste sin que se guarde nada
+        mas_tarde = timezone.now() + datetime.timedelta(minutes=11)
+        with mock.patch('django.utils.timezone.now', return_value=mas_tarde):
+            respuesta, _ = self.get_condicional('/api/user-data/', user_data)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['perfil']['mascota_estado']['mascota_estado_hambre'], 99)
+
+
+class ListadosPaginadosTests(TestCase):
+    """
+    Servicios y noticias se paginan por cursor, aceptan `desde`/`hasta` y
+    cuestan un número fijo de consultas sin importar cuántas filas haya.
+    """
+
+    def setUp(self):
+        self.clase = Clase.objects.create(clase_nombre='Jóvenes')
+        otra_clase = Clase.objects.create(clase_nombre='Adultos')
+        self.profesor = crear_usuario('profe', usuario_clase_actual=self.clase)
+        tipo = TipoServicio.objects.create(Tipo_ServicioDescripcion='Culto')
+        self.inicio = timezone.make_aware(datetime.datetime(2025, 3, 1, 10, 0))
+        # Dos servicios por día con la misma hora para probar el desempate por id
+        Servicio.objects.bulk_create([
+            Servicio(
+                servicio_clase=self.clase,
+                servicio_tiposervicio=tipo,
+                servicio_profesor_encargado=self.profesor,
+                servicio_descripcion=f'Servicio {dia}-{repeticion}',
+                servicio_fecha_hora=self.inicio + datetime.timedelta(days=dia),
+            )
+            for dia in range(30) for repeticion in range(2)
+        ])
+        Servicio.objects.create(
+            servicio_clase=otra_clase, servicio_descripcion='Otra clase', servicio_fecha_hora=self.inicio,
+        )
+        Noticia.objects.bulk_create([
+            Noticia(
+                noticia_clase=self.clase, noticia_titulo=f'Noticia {dia}', noticia_contenido='...',
+                noticia_fecha_publicacion=self.inicio + datetime.timedelta(days=dia),
+            )
+            for dia in range(10)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.profesor)
+
+    def recorrer(self, url, params=None):
+        """Sigue los enlaces `next` y devuelve todas las filas y el número de páginas."""
+        filas, paginas = [], 0
+        respuesta = self.client.get(url, params)
+        while True:
+            self.assertEqual(respuesta.status_code, 200)
+            filas += respuesta.data['results']
+            paginas += 1
+            if not respuesta.data['next']:
+                return filas, paginas
+            respuesta = self.client.get(respuesta.data['next'])
+
+    def test_cursor_recorre_todo_sin_repetir(self):
+        filas, paginas = self.recorrer('/api/servicios/', {'limite': 7})
+        self.assertEqual(len(filas), 60)
+        self.assertEqual(paginas, 9)
+        self.assertEqual(len({fila['servicio_id'] for fila in filas}), 60)
+        fechas = [fila['servicio_fecha_hora'] for fila in filas]
+        self.assertEqual(fechas, sorted(fechas))
+
+        recientes, _ = self.recorrer('/api/servicios-disponibles/', {'limite': 25})
+        self.assertEqual([fila['servicio_id'] for fila in recientes], [fila['servicio_id'] for fila in reversed(filas)])
+
+    def test_ventana_de_fechas(self):
+        filas, _ = self.recorrer('/api/servicios/', {'desde': '2025-03-05', 'hasta': '2025-03-07'})
+        self.assertEqual(len(filas), 6)
+        self.assertEqual({fila['servicio_descripcion'][:-2] for fila in filas}, {'Servicio 4', 'Servicio 5', 'Servicio 6'})
+
+        noticias = self.client.get('/api/gestionar-noticias/', {'desde': '2025-03-09T10:00:00'})
+        self.assertEqual([n['noticia_titulo'] for n in noticias.data['results']], ['Noticia 9', 'Noticia 8'])
+
+        self.assertEqual(self.client.get('/api/servicios/', {'desde': 'ayer'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/servicios/', {'desde': '2025-03-07', 'hasta': '2025-03-05'}).status_code, 400)
+
+    def test_consultas_constantes(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/api/servicios/')
+        self.assertEqual(len(respuesta.data['results']), 50)
+        self.assertEqual(respuesta.data['results'][0]['tipo_servicio'], 'Culto')
+        self.assertEqual(respuesta.data['results'][0]['profesor_encargado'], 'profe')
+        # Usuario autenticado, clase actual y la página con sus relaciones
+        self.assertLessEqual(len(consultas.captured_queries), 3)
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get('/api/servicios-disponibles/')
+        self.assertLessEqual(len(consultas.captured_queries), 3)
+
+    def test_sin_clase_devuelve_pagina_vacia(self):
+        self.client.force_authenticate(crear_usuario('sin_clase'))
+        respuesta = self.client.get('/api/servicios/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['results'], [])
+        self.assertIsNone(respuesta.data['next'])
+
+
+class VerificarIndicesTests(TestCase):
+
+    def test_consultas_canonicas_usan_indices(self):
+        salida = io.StringIO()
+        call_command('verificar_indices', stdout=salida)
+        self.assertNotIn('RECORRIDO COMPLETO', salida.getvalue())
+
+    def test_falla_con_un_recorrido_completo(self):
+        sin_indice = [("por nombre", Usuario.objects.filter(usuario_nombre_completo='Ana'))]
+        with mock.patch('api_unfrutoparacristo.management.commands.verificar_indices.consultas_canonicas', return_value=sin_indice):
+            with self.assertRaises(CommandError):
+                call_command('verificar_indices', stdout=io.StringIO())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Solo SQLite')
+class SqliteTests(TestCase):
+
+    def test_pragmas_en_cada_conexion(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_pragma_con_valor_invalido(self):
+        with self.assertRaises(ValueError):
+            base_datos._sentencia('cache_size', '1; DROP TABLE x')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Solo SQLite')
+class SqliteMantenimientoTests(TransactionTestCase):
+    # VACUUM no puede correr dentro de la transacción de un TestCase
+
+    def test_mantenimiento(self):
+        salida = io.StringIO()
+        call_command('sqlite_maintenance', '--vacuum', stdout=salida)
+        self.assertIn('VACUUM', salida.getvalue())
+        self.assertIn('libres', salida.getvalue())
+
+
+NOMINA = """================ CLASE TRANSICIÓN NIÑOS(AS) ================
+
+NOMBRE: Max Orellana
+RUT: 24.653.428-4
+EDAD: 11
+FECHA NACIMIENTO: 14/06/14
+APODERADO: Felipe Orellana
+TALLA 14
+
+NOMBRE: Máximo Estay
+RUT: 25.006.117-k
+FECHA NACIMIENTO: 05/06/15
+APODERADO: Joselyn López
+
+NOMBRE: RUT malo
+RUT: 25.006.117-1
+FECHA NACIMIENTO: 05/06/15
+
+NOMBRE: Repetido
+RUT: 11.111.111-1
+FECHA NACIMIENTO: 01/01/15
+"""
+
+
+def csv_alumnos(cantidad, inicio=10000000):
+    lineas = ['Nombre;RUT;Fecha de nacimiento;Apoderado']
+    for cuerpo in range(inicio, inicio + cantidad):
+        lineas.append(f'Alumno {cuerpo};{cuerpo}-{rut.calcular_dv(cuerpo)};2015-03-0{cuerpo % 9 + 1};Apoderado {cuerpo}')
+    return '\n'.join(lineas) + '\n'
+
+
+class ImportacionAlumnosTests(TestCase):
+
+    def setUp(self):
+        self.clase = Clase.objects.create(clase_nombre='Transición Niños')
+        crear_usuario('existente', usuario_rut='11.111.111-1')
+
+    def test_nomina_con_reporte_por_fila(self):
+        resultado = importar_alumnos(leer_archivo(io.StringIO(NOMINA)))
+
+        self.assertEqual(resultado.creados, 2)
+        self.assertEqual([(e['linea'], e['nombre']) for e in resultado.errores], [(15, 'RUT malo'), (19, 'Repetido')])
+        self.assertIn('RUT inválido', resultado.errores[0]['errores'][0])
+        self.assertIn('ya está registrado', resultado.errores[1]['errores'][0])
+
+        max_ = Usuario.objects.get(usuario_rut='24.653.428-4')
+        self.assertEqual(max_.username, '246534284')
+        self.assertEqual(max_.usuario_fecha_nacimiento, datetime.date(2014, 6, 14))
+        self.assertEqual(max_.usuario_clase_actual, self.clase)
+        self.assertFalse(max_.has_usable_password())
+        self.assertEqual(max_.perfil_alumno.alumno_nombre_apoderado, 'Felipe Orellana')
+        self.assertEqual(len(max_.perfil_alumno.alumno_codigo_invitacion), 6)
+        self.assertTrue(Cesta.objects.filter(cesta_usuario=max_).exists())
+        self.assertTrue(MascotaEstado.objects.filter(mascota_estado_usuario=max_).exists())
+        self.assertTrue(Usuario.objects.filter(usuario_rut='25.006.117-K').exists())
+
+    def test_consultas_por_lote_y_no_por_alumno(self):
+        def consultas(cantidad, inicio):
+            with CaptureQueriesContext(connection) as capturadas:
+                resultado = importar_alumnos(leer_archivo(io.StringIO(csv_alumnos(cantidad, inicio))), clase=self.clase)
+            self.assertEqual((resultado.creados, resultado.errores), (cantidad, []))
+            return len(capturadas.captured_queries)
+
+        # La primera importación crea además la secuencia de códigos de invitación
+        self.assertLessEqual(consultas(5, 10000000), 20)
+        # bulk_create parte los INSERT según el límite de parámetros de SQLite; sigue siendo lejos de uno por alumno
+        self.assertLessEqual(consultas(150, 20000000), 20)
+        self.assertEqual(Alumno.objects.filter(alumno_usuario__usuario_clase_actual=self.clase).count(), 155)
+
+    def test_lotes_y_duplicados_dentro_del_archivo(self):
+        contenido = csv_alumnos(6) + csv_alumnos(1).splitlines()[1] + '\n'
+        resultado = importar_alumnos(leer_archivo(io.StringIO(contenido)), clase=self.clase, tamano_lote=4)
+        self.assertEqual(resultado.creados, 6)
+        self.assertEqual([e['linea'] for e in resultado.errores], [8])
+
+    def test_subida_desde_el_admin(self):
+        admin = crear_usuario('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        self.assertContains(self.client.get('/admin/api_unfrutoparacristo/usuario/'), 'Importar alumnos')
+
+        archivo = SimpleUploadedFile('nomina.txt', NOMINA.encode('utf-8'))
+        respuesta = self.client.post('/admin/api_unfrutoparacristo/usuario/importar-alumnos/', {'archivo': archivo, 'formato': 'auto'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['resultado'].creados, 2)
+        self.assertContains(respuesta, 'RUT malo')
+
+    def test_byte_invalido_al_final_no_deja_lotes_guardados(self):
+        # Primer lote válido; la última fila trae una tilde en latin-1
+        contenido = csv_alumnos(4).encode('utf-8') + 'Ñandú;12345678-5;2015-01-01;José\n'.encode('latin-1')
+        with tempfile.NamedTemporaryFile(suffix='.csv') as archivo:
+            archivo.write(contenido)
+            archivo.flush()
+            with self.assertRaisesMessage(CommandError, '--codificacion latin-1'):
+                call_command('importar_alumnos', archivo.name, '--clase', self.clase.pk, '--lote', '2', stdout=io.StringIO())
+            self.assertFalse(Usuario.objects.filter(usuario_clase_actual=self.clase).exists())
+
+            salida = io.StringIO()
+            call_command('importar_alumnos', archivo.name, '--clase', self.clase.pk, '--codificacion', 'latin-1', stdout=salida)
+            self.assertIn('Alumnos creados: 5', salida.getvalue())
+
+        admin = crear_usuario('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        respuesta = self.client.post(
+            '/admin/api_unfrutoparacristo/usuario/importar-alumnos/',
+            {'archivo': SimpleUploadedFile('alumnos.csv', csv_alumnos(3, 30000000).encode('utf-8') + contenido[-40:]), 'formato': 'auto'},
+        )
+        self.assertContains(respuesta, 'No se importó ningún alumno')
+        self.assertIsNone(respuesta.context['resultado'])
+        self.assertEqual(Usuario.objects.filter(usuario_clase_actual=self.clase).count(), 5)
+
+
+class CodigosInvitacionTests(TestCase):
+
+    def test_permutacion_sin_colisiones(self):
+        codigos = [codigos_invitacion.codificar(codigos_invitacion.permutar(n)) for n in range(20000)]
+        self.assertEqual(len(set(codigos)), 20000)
+        self.assertTrue(all(len(c) == 6 and set(c) <= set(codigos_invitacion.ALFABETO) for c in codigos))
+        # Consecutivos no dan códigos parecidos
+        self.assertNotEqual(codigos[0][:3], codigos[1][:3])
+
+    def test_lote_en_una_pasada_y_salta_codigos_antiguos(self):
+        antiguo = codigos_invitacion.codificar(codigos_invitacion.permutar(0))
+        Alumno.objects.create(alumno_usuario=crear_usuario('antiguo'), alumno_codigo_invitacion=antiguo)
+
+        with CaptureQueriesContext(connection) as consultas:
+            codigos = codigos_invitacion.generar(100)
+        self.assertEqual(len(set(codigos)), 100)
+        self.assertNotIn(antiguo, codigos)
+        # Dos rondas: la segunda reemplaza el código que ya existía
+        self.assertEqual(Secuencia.objects.get(pk='codigo_invitacion').secuencia_valor, 101)
+        self.assertLessEqual(len(consultas.captured_queries), 16)
+
+    def test_asignar_codigo_a_un_alumno(self):
+        alumno = Alumno.objects.create(alumno_usuario=crear_usuario('nuevo'))
+        alumno.generar_codigo_invitacion()
+        alumno.refresh_from_db()
+        self.assertEqual(len(alumno.alumno_codigo_invitacion), 6)
+
+
+class RutTests(TestCase):
+
+    def test_digito_verificador(self):
+        for valido in ('24.653.428-4', '25.006.117-K', '11.111.111-1', '9.999.999-3', '1.000.005-K', '12.345.678-5'):
+            self.assertTrue(rut.es_valido(valido), valido)
+        self.assertFalse(rut.es_valido('25.006.117-1'))
+        self.assertEqual(rut.normalizar('25006117k'), '25.006.117-K')
+        self.assertEqual(rut.numero('24.653.428-4'), 24653428)
+        self.assertIsNone(rut.numero('24.653.428-5'))
+
+    def test_lote_alineado_y_igual_a_uno_a_uno(self):
+        ruts = ['24.653.428-4', '250061 17-k', '25.006.117-1', '', 'abc', '12', 7654321, '1.234.567.890-1', 'ñ1-2\n3']
+        self.assertEqual(rut.formatear_lote(ruts), [rut.formatear(r) for r in ruts])
+        self.assertEqual(rut.normalizar_lote(ruts), [rut.normalizar(r) for r in ruts])
+        self.assertEqual(rut.validar_lote(ruts), [rut.es_valido(r) for r in ruts])
+        self.assertEqual(rut.numeros_lote(ruts), [rut.numero(r) for r in ruts])
+        self.assertEqual(rut.formatear_lote([]), [])
+        # Mismo formato que el helper anterior, aunque el dígito no cuadre
+        self.assertEqual(rut.formatear_lote(['250061171', '1234567890']), ['25.006.117-1', '123.456.789-0'])
+
+    def test_guardar_asistencia_con_formatos_mezclados(self):
+        clase = Clase.objects.create(clase_nombre='Clase RUT')
+        profesor = crear_usuario('profe_rut', usuario_rol='profesor', usuario_clase_actual=clase)
+        alumno = crear_usuario('alumno_rut', usuario_rut='24653428-4', usuario_clase_actual=clase)
+        servicio = Servicio.objects.create(
+            servicio_clase=clase, servicio_descripcion='Culto', servicio_fecha_hora=timezone.now(),
+        )
+        cliente = APIClient()
+        cliente.force_authenticate(profesor)
+
+        respuesta = cliente.post('/api/guardar-asistencia/', {
+            'servicio_id': servicio.pk, 'ruts_presentes': ['246534284', '24.653.428-4', '9.999.999-3'],
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['ruts_no_encontrados'], ['9.999.999-3'])
+        self.assertEqual(
+            list(AsistenciaAlumno.objects.values_list('asistenciaalumno_usuario_id', flat=True)), [alumno.pk]
+        )
+
+
+class RutNumeroTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = crear_usuario('alumno_k', usuario_rut='25006117k')
+
+    def test_save_completa_numero_y_dv(self):
+        self.assertEqual(
+            (self.usuario.usuario_rut, self.usuario.usuario_rut_numero, self.usuario.usuario_rut_dv),
+            ('25.006.117-K', 25006117, 'K'),
+        )
+        self.usuario.usuario_rut = '24.653.428-4'
+        self.usuario.save(update_fields=['usuario_rut'])
+        self.usuario.refresh_from_db()
+        self.assertEqual((self.usuario.usuario_rut_numero, self.usuario.usuario_rut_dv), (24653428, '4'))
+
+    def test_validar_rut_en_cualquier_formato(self):
+        for valor, existe in [('25.006.117-K', True), ('25006117k', True), ('25006117-1', False), ('no-es-rut', False)]:
+            with self.subTest(valor=valor):
+                respuesta = self.client.get('/api/usuarios/validar-rut/', {'rut': valor})
+                self.assertEqual(respuesta.json(), {'existe': existe})
+
+    def test_registro_rechaza_rut_repetido_sin_formato(self):
+        serializer = RegistroAlumnoSerializer()
+        with self.assertRaises(serializers.ValidationError):
+            serializer.validate_usuario_rut('25006117-k')
+        self.assertEqual(serializer.validate_usuario_rut('24.653.428-4'), '24.653.428-4')
+
+    def test_editar_alumno_rechaza_rut_repetido_sin_formato(self):
+        otro = crear_usuario('alumno_editado', usuario_rut='24.653.428-4')
+        cliente = APIClient()
+        cliente.force_authenticate(crear_usuario('jefa_rut', usuario_rol='profesor_jefe'))
+
+        respuesta = cliente.patch(f'/api/editar-alumno/{otro.pk}/', {'usuario_rut': '25006117k'}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('usuario_rut', respuesta.data)
+
+        # Su propio RUT, escrito de otra forma, no choca consigo mismo
+        respuesta = cliente.patch(f'/api/editar-alumno/{otro.pk}/', {'usuario_rut': '246534284'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        otro.refresh_from_db()
+        self.assertEqual(otro.usuario_rut, '24.653.428-4')
+
+
+class CatalogoClasesTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.mascota = Mascota.objects.create(mascota_nombre='Oveja')
+        self.jefe = crear_usuario('jefe', usuario_rol='profesor_jefe')
+        self.jefe.set_password('clave-jefe-123')
+        self.jefe.save()
+        for numero in range(3):
+            Clase.objects.create(clase_nombre=f'Clase {numero}', clase_mascota=self.mascota, clase_profesor_jefe=self.jefe)
+
+    def get(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/api/clases/')
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta, len(consultas.captured_queries)
+
+    def test_una_consulta_al_reconstruir_y_solo_la_version_despues(self):
+        versiones.obtener('clases')
+        primera, consultas = self.get()
+        self.assertEqual(consultas, 2)
+        self.assertEqual([c['clase_profesor_jefe_username'] for c in primera.json()], ['jefe'] * 3)
+        self.assertEqual(primera.json()[0]['clase_mascota']['mascota_nombre'], 'Oveja')
+        self.assertIn('public', primera['Cache-Control'])
+        self.assertIn('max-age=', primera['Cache-Control'])
+
+        segunda, consultas = self.get()
+        self.assertEqual(consultas, 1)
+        self.assertEqual(segunda.content, primera.content)
+
+        revalidada = self.client.get('/api/clases/', HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(revalidada.status_code, 304)
+        self.assertIn('public', revalidada['Cache-Control'])
+
+    def test_se_reconstruye_solo_con_cambios_del_catalogo(self):
+        self.get()
+        # Iniciar sesión guarda last_login del profesor: no cambia el catálogo
+        with self.captureOnCommitCallbacks(execute=True):
+            login = self.client.post('/api/auth/login/', {'username': 'jefe', 'password': 'clave-jefe-123'})
+        self.assertEqual(login.status_code, 200)
+        # Solo la lectura de la versión
+        self.assertEqual(self.get()[1], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mascota.mascota_nombre = 'Cordero'
+            self.mascota.save()
+        self.assertEqual(self.get()[0].json()[0]['clase_mascota']['mascota_nombre'], 'Cordero')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jefe.username = 'jefa'
+            self.jefe.save()
+        self.assertEqual(self.get()[0].json()[0]['clase_profesor_jefe_username'], 'jefa')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jefe.delete()
+        self.assertIsNone(self.get()[0].json()[0]['clase_profesor_jefe_username'])
+
+
+class AsistenciaTests(TestCase):
+    """
+    Guardar asistencia inserta solo los alumnos nuevos y borra solo los que ya no están.
+    """
+
+    def setUp(self):
+        self.clase = Clase.objects.create(clase_nombre='Clase asistencia')
+        self.profesor = crear_usuario('profe_asistencia', usuario_rol='profesor', usuario_clase_actual=self.clase)
+        self.alumnos = [
+            crear_usuario(f'alumno_asistencia_{n}', usuario_rut=f'{cuerpo}-{rut.calcular_dv(cuerpo)}', usuario_clase_actual=self.clase)
+            for n, cuerpo in enumerate([10000001, 10000002, 10000003])
+        ]
+        self.servicio = Servicio.objects.create(
+            servicio_clase=self.clase, servicio_descripcion='Culto', servicio_fecha_hora=timezone.now(),
+            servicio_profesor_encargado=self.profesor,
+        )
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.profesor)
+
+    def guardar(self, alumnos):
+        respuesta = self.cliente.post('/api/guardar-asistencia/', {
+            'servicio_id': self.servicio.pk, 'ruts_presentes': [a.usuario_rut for a in alumnos],
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        return dict(AsistenciaAlumno.objects.values_list('asistenciaalumno_usuario_id', 'asistenciaalumno_id'))
+
+    def test_solo_cambian_las_filas_de_la_diferencia(self):
+        a, b, c = self.alumnos
+        primera = self.guardar([a, b])
+        self.assertEqual(set(primera), {a.pk, b.pk})
+
+        segunda = self.guardar([b, c])
+        self.assertEqual(set(segunda), {b.pk, c.pk})
+        # La fila de b no se borró y volvió a crear
+        self.assertEqual(segunda[b.pk], primera[b.pk])
+        self.assertEqual(Asistencia.objects.get(asistencia_servicio=self.servicio).obtener_lista_ruts(), [b.usuario_rut, c.usuario_rut])
+
+        respuesta = self.cliente.get(f'/api/asistencia-existente/{self.servicio.pk}/')
+        self.assertEqual(sorted(respuesta.data['ruts_presentes']), [b.usuario_rut, c.usuario_rut])
+
+        self.assertEqual(self.guardar([]), {})
+
+    def test_sin_cambios_no_escribe(self):
+        self.guardar(self.alumnos)
+        with CaptureQueriesContext(connection) as consultas:
+            self.guardar(self.alumnos)
+        escrituras = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith(('INSERT', 'DELETE', 'UPDATE'))]
+        self.assertEqual(escrituras, [])
+
+
+class AsignarFrutoLoteTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        catalogo_frutos.invalidar()
+        self.verde = Fruto.objects.create(fruto_nombre='Manzana verde', fruto_color='verdes')
+        self.roja = Fruto.objects.create(fruto_nombre='Manzana roja', fruto_color='rojas')
+        self.clase = Clase.objects.create(clase_nombre='Clase lote')
+        self.profesor = crear_usuario('profe_lote', usuario_rol='profesor', usuario_clase_actual=self.clase)
+        self.alumnos = [crear_usuario(f'alumno_lote_{n}', usuario_clase_actual=self.clase) for n in range(30)]
+        # La mitad ya tiene cesta; las demás se crean en el lote
+        for alumno in self.alumnos[:15]:
+            Cesta.objects.create(cesta_usuario=alumno, cesta_total_rojas=1)
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.profesor).access_token}')
+
+    def asignar(self, asignaciones):
+        return self.cliente.post('/api/asignar-fruto/lote/', asignaciones, format='json')
+
+    def test_treinta_alumnos_en_consultas_constantes(self):
+        asignaciones = [
+            {'alumno_id': alumno.pk, 'fruto_id': (self.verde if n % 2 else self.roja).pk, 'motivo': 'Asistencia'}
+            for n, alumno in enumerate(self.alumnos)
+        ]
+        catalogo_frutos.por_id(self.verde.pk)
+        # Usuario del JWT, alumnos, SAVEPOINT, INSERT de frutos, cestas existentes,
+        # INSERT de las cestas que faltan, un UPDATE por color y RELEASE
+        with self.assertNumQueries(9):
+            respuesta = self.asignar(asignaciones)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(FrutoAsignado.objects.count(), 30)
+        self.assertEqual(Cesta.objects.get(cesta_usuario=self.alumnos[0]).cesta_total_rojas, 2)
+        self.assertEqual(Cesta.objects.get(cesta_usuario=self.alumnos[1]).cesta_total_rojas, 1)
+        self.assertEqual(Cesta.objects.get(cesta_usuario=self.alumnos[29]).cesta_total_verdes, 1)
+
+    def test_un_alumno_puede_recibir_varios_frutos_en_el_lote(self):
+        alumno = self.alumnos[0]
+        respuesta = self.asignar([
+            {'alumno_id': alumno.pk, 'fruto_id': self.verde.pk, 'motivo': 'a'},
+            {'alumno_id': alumno.pk, 'fruto_id': self.roja.pk, 'motivo': 'b'},
+            {'alumno_id': alumno.pk, 'fruto_id': self.roja.pk, 'motivo': 'c'},
+        ])
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(FrutoAsignado.objects.filter(frutoasignado_usuario=alumno).count(), 3)
+        cesta = Cesta.objects.get(cesta_usuario=alumno)
+        self.assertEqual((cesta.cesta_total_verdes, cesta.cesta_total_rojas), (1, 3))
+
+    def test_rechaza_alumnos_de_otra_clase_o_inexistentes(self):
+        otra = Clase.objects.create(clase_nombre='Otra clase')
+        ajeno = crear_usuario('alumno_ajeno', usuario_clase_actual=otra)
+        alumno = self.alumnos[0]
+
+        respuesta = self.asignar([
+            {'alumno_id': alumno.pk, 'fruto_id': self.verde.pk, 'motivo': 'a'},
+            {'alumno_id': ajeno.pk, 'fruto_id': self.verde.pk, 'motivo': 'a'},
+        ])
+        self.assertEqual(respuesta.status_code, 403)
+        self.assertEqual(respuesta.data['alumnos'], [ajeno.pk])
+
+        inexistente = self.asignar([{'alumno_id': 999999, 'fruto_id': self.verde.pk, 'motivo': 'a'}])
+        self.assertEqual(inexistente.status_code, 400)
+        # Nada se guardó en ninguno de los intentos
+        self.assertFalse(FrutoAsignado.objects.exists())
+
+
+class PanelProfesorTests(TestCase):
+    """
+    El resumen de TeacherDashboardView sale de la caché y se invalida con los
+    cambios de la clase, sin consultas extra en cada guardado de un usuario.
+    """
+
+    def setUp(self):
+        cache.clear()
+        catalogo_frutos.invalidar()
+        self.fruto = Fruto.objects.create(fruto_nombre='Manzana verde', fruto_color='verdes')
+        self.clase = Clase.objects.create(clase_nombre='Clase panel')
+        self.otra = Clase.objects.create(clase_nombre='Otra panel')
+        self.profesor = crear_usuario('profe_panel', usuario_rol='profesor', usuario_clase_actual=self.clase)
+        self.alumnos = [crear_usuario(f'alumno_panel_{n}', usuario_clase_actual=self.clase) for n in range(2)]
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.profesor)
+
+    def panel(self):
+        respuesta = self.cliente.get('/api/teacher-dashboard/')
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data
+
+    def test_resumen_en_cache(self):
+        self.assertEqual(self.panel()['total_alumnos'], 2)
+        with CaptureQueriesContext(connection) as consultas:
+            self.panel()
+        # El resumen no se recalcula (la clase ya viene cargada en el usuario autenticado)
+        self.assertEqual(len(consultas), 0)
+
+    def test_cambio_de_clase_invalida_ambas_clases(self):
+        self.assertEqual(self.panel()['total_alumnos'], 2)
+        otro_profesor = crear_usuario('profe_otra', usuario_rol='profesor', usuario_clase_actual=self.otra)
+        self.assertEqual(estadisticas.obtener_resumen_clase(self.otra.pk)['total_alumnos'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            alumno = Usuario.objects.get(pk=self.alumnos[0].pk)
+            alumno.usuario_clase_actual = self.otra
+            alumno.save()
+        self.assertEqual(self.panel()['total_alumnos'], 1)
+        self.assertEqual(estadisticas.obtener_resumen_clase(otro_profesor.usuario_clase_actual_id)['total_alumnos'], 1)
+
+    def test_fruto_asignado_invalida_el_resumen(self):
+        self.assertEqual(self.panel()['frutos_recolectados_hoy'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            FrutoAsignado.objects.create(
+                frutoasignado_usuario=self.alumnos[0], frutoasignado_fruto=self.fruto,
+                frutoasignado_motivo='Asistencia', frutoasignado_origen='Manual',
+            )
+        self.assertEqual(self.panel()['frutos_recolectados_hoy'], 1)
+
+    def test_guardados_sin_consultas_extra(self):
+        alumno = Usuario.objects.get(pk=self.alumnos[0].pk)
+        # El login solo escribe last_login
+        with self.assertNumQueries(1):
+            update_last_login(None, alumno)
+        # Editar el perfil: el UPDATE y nada para averiguar la clase anterior
+        alumno.usuario_nombre_completo = 'Alumno Panel'
+        with self.assertNumQueries(1):
+            alumno.save()
+        # Con el alumno ya cargado, el panel no vuelve a leerlo: INSERT y UPDATE de la cesta
+        with CaptureQueriesContext(connection) as consultas:
+            FrutoAsignado.objects.create(
+                frutoasignado_usuario=alumno, frutoasignado_fruto=self.fruto,
+                frutoasignado_motivo='Asistencia', frutoasignado_origen='Manual',
+            )
+        self.assertFalse([q['sql'] for q in consultas.captured_queries if 'FROM "api_unfrutoparacristo_usuario"' in q['sql']])
+
+
+class DesgasteMascotaTests(TestCase):
+    """
+    Hambre y sed bajan por intervalos completos desde la fecha base; al guardar
+    solo se avanza esa fecha por los intervalos ya aplicados.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = crear_usuario('dueno_mascota')
+        self.ahora = timezone.now()
+        self.estado = MascotaEstado.objects.create(
+            mascota_estado_usuario=self.usuario, mascota_estado_hambre=50, mascota_estado_sed=50,
+            mascota_estado_last_update=self.ahora - 2.5 * self.intervalo(),
+        )
+
+    @staticmethod
+    def intervalo(cantidad=1):
+        return datetime.timedelta(seconds=cantidad * INTERVALO_DESGASTE_SEGUNDOS)
+
+    def test_intervalos_y_niveles_calculados(self):
+        self.assertEqual(self.estado.intervalos_transcurridos(self.ahora), 2)
+        # Un reloj atrasado no suma desgaste negativo
+        self.assertEqual(self.estado.intervalos_transcurridos(self.ahora - self.intervalo(5)), 0)
+        self.assertEqual(self.estado.calcular_niveles(self.ahora), (48, 46))
+        # Los niveles no bajan de cero
+        self.assertEqual(self.estado.calcular_niveles(self.ahora + self.intervalo(100)), (0, 0))
+
+    def test_materializar_conserva_la_fraccion_en_curso(self):
+        base = self.estado.mascota_estado_last_update
+        self.estado.materializar_desgaste(self.ahora)
+        self.assertEqual((self.estado.mascota_estado_hambre, self.estado.mascota_estado_sed), (48, 46))
+        self.assertEqual(self.estado.mascota_estado_last_update, base + self.intervalo(2))
+
+        self.estado.save()
+        self.estado.refresh_from_db()
+        self.assertEqual(self.estado.mascota_estado_last_update, base + self.intervalo(2))
+
+    def test_alimentar_seguido_no_detiene_el_desgaste(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        base = self.estado.mascota_estado_last_update
+
+        with mock.patch('django.utils.timezone.now', return_value=self.ahora):
+            respuesta = cliente.patch('/api/mascota-estado/', {'mascota_estado_hambre': 100}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.estado.refresh_from_db()
+        self.assertEqual(self.estado.mascota_estado_last_update, base + self.intervalo(2))
+        self.assertEqual((self.estado.mascota_estado_hambre, self.estado.mascota_estado_sed), (100, 46))
+
+        # Alimentarla cada 5 minutos: a los 10 minutos la sed bajó igual
+        for minutos in (5, 10):
+            momento = self.ahora + datetime.timedelta(minutes=minutos)
+            with mock.patch('django.utils.timezone.now', return_value=momento):
+                cliente.patch('/api/mascota-estado/', {'mascota_estado_hambre': 100}, format='json')
+        self.estado.refresh_from_db()
+        self.assertEqual(self.estado.calcular_niveles(self.ahora + datetime.timedelta(minutes=10)), (100, 44))
+
+    def test_recalcular_mascotas_guarda_la_fecha_base(self):
+        quieta = MascotaEstado.objects.create(mascota_estado_usuario=crear_usuario('otra_mascota'))
+        base = self.estado.mascota_estado_last_update
+        salida = io.StringIO()
+        call_command('recalcular_mascotas', '--guardar', '--umbral', '47', stdout=salida)
+
+        self.estado.refresh_from_db()
+        self.assertEqual((self.estado.mascota_estado_hambre, self.estado.mascota_estado_sed), (48, 46))
+        self.assertEqual(self.estado.mascota_estado_last_update, base + self.intervalo(2))
+        self.assertIn('Mascotas: 2', salida.getvalue())
+        self.assertIn('Con sed bajo 47: 1', salida.getvalue())
+        # Solo se guarda la que tenía desgaste pendiente
+        self.assertIn('Estados guardados: 1', salida.getvalue())
+        self.assertEqual(MascotaEstado.objects.get(pk=quieta.pk).mascota_estado_hambre, 100)
@@ -0,0 +1,175 @@
+# api_unfrutoparacristo/throttling.py
+"""
+Limitación de peticiones para los endpoints públicos de autenticación.
+
+- VentanaDeslizanteThrottle: contador de ventana deslizante en la caché
+  (la ventana actual más una fracción de la anterior), con dos claves por
+  cliente en lugar de la lista de tiempos que guarda DRF.
+- Throttles por IP y por identificador para el login y las validaciones.
+- Bloqueo por intentos fallidos: tras LOGIN_MAX_FALLOS fallos seguidos el
+  identificador queda bloqueado y LoginBloqueoThrottle rechaza la petición
+  antes de calcular ningún hash de contraseña. Si el identificador
+  corresponde a una cuenta, los fallos se cuentan también por cuenta: probar
+  con username, correo y RUT suma a un mismo contador, y el backend de login
+  rechaza la cuenta bloqueada sin verificar la contraseña.
+
+En la caché los identificadores se guardan como hash, nunca en texto plano.
+Las tasas se configuran en REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'].
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+from . import rut
+
+LOGIN_MAX_FALLOS = getattr(settings, 'LOGIN_MAX_FALLOS', 5)
+LOGIN_VENTANA_FALLOS = getattr(settings, 'LOGIN_VENTANA_FALLOS_SEGUNDOS', 15 * 60)
+LOGIN_BLOQUEO_SEGUNDOS = getattr(settings, 'LOGIN_BLOQUEO_SEGUNDOS', 15 * 60)
+
+
+def hash_identificador(identificador):
+    """
+    Normaliza el identificador del login (el RUT sin puntos ni guion, el resto
+    en minúsculas) y devuelve su SHA-256.
+    """
+    identificador = str(identificador or '').strip()
+    if set(identificador) <= rut.CARACTERES:
+        limpio = rut.limpiar(identificador)
+        if rut.PATRON.match(limpio):
+            identificador = limpio
+    return hashlib.sha256(identificador.lower().encode()).hexdigest()
+
+
+def _identificador_login(request):
+    identificador = request.data.get('username') if hasattr(request.data, 'get') else None
+    return identificador if isinstance(identificador, str) and identificador.strip() else None
+
+
+class VentanaDeslizanteThrottle(SimpleRateThrottle):
+    """
+    Estima las peticiones del último periodo como
+    actual + anterior * (fracción de la ventana anterior que sigue dentro del periodo).
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        ahora = self.timer()
+        ventana = int(ahora // self.duration)
+        self.transcurrido = (ahora % self.duration) / self.duration
+        clave_actual = f'{self.key}:{ventana}'
+        clave_anterior = f'{self.key}:{ventana - 1}'
+
+        conteos = self.cache.get_many([clave_actual, clave_anterior])
+        self.actual = conteos.get(clave_actual, 0)
+        self.anterior = conteos.get(clave_anterior, 0)
+        if self.actual + self.anterior * (1 - self.transcurrido) >= self.num_requests:
+            return False
+
+        # Cada contador vive dos ventanas: la suya y la siguiente, donde es la "anterior"
+        if not self.cache.add(clave_actual, 1, self.duration * 2):
+            try:
+                self.cache.incr(clave_actual)
+            except ValueError:
+                self.cache.set(clave_actual, 1, self.duration * 2)
+        return True
+
+    def wait(self):
+        restante = 1 - self.transcurrido
+        if self.actual >= self.num_requests or not self.anterior:
+            return restante * self.duration
+        # Momento en que el peso de la ventana anterior deja espacio para una petición más
+        necesario = 1 - (self.num_requests - self.actual) / self.anterior
+        return max(0.0, necesario - self.transcurrido) * self.duration
+
+
+class LoginIPThrottle(VentanaDeslizanteThrottle):
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginIdentificadorThrottle(VentanaDeslizanteThrottle):
+    """Limita los intentos contra una misma cuenta aunque vengan de muchas IPs."""
+    scope = 'login_identificador'
+
+    def get_cache_key(self, request, view):
+        identificador = _identificador_login(request)
+        if identificador is None:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': hash_identificador(identificador)}
+
+
+class ValidacionThrottle(LoginIPThrottle):
+    """Para validar-rut, validar-username y validar-email (consultas de existencia)."""
+    scope = 'validacion'
+
+
+# ===================================================================
+# BLOQUEO POR INTENTOS FALLIDOS
+# ===================================================================
+
+def _sufijos(identificador, usuario_id=None):
+    """El identificador (como hash) y, si corresponde a una cuenta, también la cuenta."""
+    sufijos = [hash_identificador(identificador)]
+    if usuario_id is not None:
+        sufijos.append(f'usuario:{usuario_id}')
+    return sufijos
+
+
+def registrar_login_fallido(identificador, usuario_id=None):
+    """
+    Cuenta un fallo para el identificador y para la cuenta `usuario_id`, si la
+    hay. Cada contador que llega a LOGIN_MAX_FALLOS bloquea lo suyo.
+    """
+    for sufijo in _sufijos(identificador, usuario_id):
+        clave = f'login_fallos:{sufijo}'
+        if cache.add(clave, 1, LOGIN_VENTANA_FALLOS):
+            fallos = 1
+        else:
+            try:
+                fallos = cache.incr(clave)
+            except ValueError:
+                cache.set(clave, 1, LOGIN_VENTANA_FALLOS)
+                fallos = 1
+
+        if fallos >= LOGIN_MAX_FALLOS:
+            cache.set(f'login_bloqueo:{sufijo}', time.time() + LOGIN_BLOQUEO_SEGUNDOS, LOGIN_BLOQUEO_SEGUNDOS)
+            cache.delete(clave)
+
+
+def limpiar_login_fallidos(identificador, usuario_id=None):
+    cache.delete_many([f'login_fallos:{sufijo}' for sufijo in _sufijos(identificador, usuario_id)])
+
+
+def segundos_bloqueo_restantes(identificador, usuario_id=None):
+    """
+    Segundos que le quedan al bloqueo del identificador o de la cuenta
+    `usuario_id`, o None si ninguno está bloqueado.
+    """
+    claves = [f'login_bloqueo:{sufijo}' for sufijo in _sufijos(identificador, usuario_id)]
+    hasta = cache.get_many(claves).values()
+    if not hasta:
+        return None
+    return max(0.0, max(hasta) - time.time())
+
+
+class LoginBloqueoThrottle(BaseThrottle):
+    """Rechaza de inmediato los identificadores bloqueados, sin tocar la base de datos."""
+
+    def allow_request(self, request, view):
+        identificador = _identificador_login(request)
+        self.restante = segundos_bloqueo_restantes(identificador) if identificador else None
+        return self.restante is None
+
+    def wait(self):
+        return self.restante
@@ -13,6 +13,8 @@ from .views import (
     CestaDetailView, 
     PonerFrutoView,
     DevolverFrutoView,
+    PonerFrutosView,
+    DevolverFrutosView,
     MascotaEstadoUpdateView,
     ValidarRutView,
     ValidarUsernameView,
@@ -31,6 +33,7 @@ from .views import (
     CrearServicioView,
     CrearDesafioView,
     AsignarFrutoView,
+    AsignarFrutoLoteView,
     TipoServicioListView,
     FrutoListView,
     CrearNoticiaView,
@@ -77,6 +80,7 @@ urlpatterns = [
     path('crear-servicio/', CrearServicioView.as_view(), name='crear-servicio'),
     path('gestionar-desafio-clase/', CrearDesafioView.as_view(), name='gestionar-desafio-clase'),
     path('asignar-fruto/', AsignarFrutoView.as_view(), name='asignar-fruto'),
+    path('asignar-fruto/lote/', AsignarFrutoLoteView.as_view(), name='asignar-fruto-lote'),
     path('tipos-servicio/', TipoServicioListView.as_view(), name='tipos-servicio-list'),
     path('frutos/', FrutoListView.as_view(), name='frutos-list'),
 
@@ -84,6 +88,8 @@ urlpatterns = [
     path('cesta/', CestaDetailView.as_view(), name='cesta-detail'),
     path('cesta/poner_fruto/', PonerFrutoView.as_view(), name='poner-fruto'),
     path('cesta/devolver_fruto/<int:pk>/', DevolverFrutoView.as_view(), name='devolver-fruto'),
+    path('cesta/poner_frutos/', PonerFrutosView.as_view(), name='poner-frutos'),
+    path('cesta/devolver_frutos/', DevolverFrutosView.as_view(), name='devolver-frutos'),
 
     # --- URLs para el Cuidado de la Mascota ---
     path('mascota-estado/', MascotaEstadoUpdateView.as_view(), name='mascota-estado-update'),
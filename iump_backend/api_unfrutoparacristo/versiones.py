@@ -0,0 +1,125 @@
+# api_unfrutoparacristo/versiones.py
+"""
+Contadores de versión para GET condicionales (ETag / Last-Modified).
+
+Cada recurso tiene un contador ('cesta:<usuario_id>', 'frutos', 'clases',
+...) en la tabla VersionRecurso. Las señales de signals.py y los contadores
+de Cesta lo incrementan al confirmar cada cambio. El decorador
+`respuesta_condicional` arma el ETag con las versiones que usa una vista y
+responde 304 antes de ejecutar la vista si el cliente ya tiene esa versión.
+
+Los contadores van en la base y no en la caché: con LocMemCache cada worker
+tendría los suyos, y uno que no vio el cambio respondería 304 con datos que
+otro worker ya modificó. Leerlos cuesta una consulta por clave primaria.
+
+Un contador nuevo parte de un valor aleatorio, así una base restaurada no
+repite los ETag que los clientes ya tienen. La hora del último cambio se
+envía como Last-Modified solo a modo informativo; la validación usa el ETag.
+"""
+import functools
+import hashlib
+import secrets
+
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+def _semilla():
+    # 2**62 deja espacio de sobra para incrementar sin salir de un bigint
+    return secrets.randbits(62)
+
+
+def _leer(VersionRecurso, nombres):
+    return {
+        nombre: (valor, modificado)
+        for nombre, valor, modificado in VersionRecurso.objects.filter(version_nombre__in=nombres)
+        .values_list('version_nombre', 'version_valor', 'version_modificado')
+    }
+
+
+def obtener(*nombres):
+    """
+    Devuelve ({nombre: versión}, hora del último cambio en segundos de época).
+    Los contadores que no existen se crean con una semilla aleatoria.
+    """
+    from .models import VersionRecurso  # models importa este módulo
+
+    filas = _leer(VersionRecurso, nombres)
+    faltan = [nombre for nombre in nombres if nombre not in filas]
+    if faltan:
+        # ignore_conflicts: si otro proceso lo creó entre medio se conserva el suyo
+        VersionRecurso.objects.bulk_create(
+            [VersionRecurso(version_nombre=nombre, version_valor=_semilla()) for nombre in faltan],
+            ignore_conflicts=True,
+        )
+        filas.update(_leer(VersionRecurso, faltan))
+
+    versiones = {nombre: filas[nombre][0] for nombre in nombres}
+    ultima_modificacion = max(int(modificado.timestamp()) for _, modificado in filas.values()) if filas else 0
+    return versiones, ultima_modificacion
+
+
+def incrementar(*nombres):
+    """
+    Marca los recursos como modificados. Un contador que aún no existe no se
+    crea: nadie tiene un ETag suyo que invalidar.
+    """
+    from .models import VersionRecurso  # models importa este módulo
+
+    if nombres:
+        VersionRecurso.objects.filter(version_nombre__in=nombres).update(
+            version_valor=F('version_valor') + 1,
+            version_modificado=timezone.now(),
+        )
+
+
+def cesta(usuario_id):
+    return f'cesta:{usuario_id}'
+
+
+def usuario(usuario_id):
+    return f'usuario:{usuario_id}'
+
+
+def respuesta_condicional(nombres_version, variacion=None):
+    """
+    Decorador para el método get de una vista de DRF.
+
+    `nombres_version` es una lista de contadores o una función
+    (vista, request) -> lista. `variacion`, opcional, es una función
+    (vista, request) -> segundos de época para datos que cambian con el
+    tiempo sin un evento de guardado (por ejemplo, el desgaste de la mascota).
+
+    Si el If-None-Match del cliente coincide, responde 304 sin ejecutar la
+    vista ni ningún serializer.
+    """
+    def decorador(get):
+        @functools.wraps(get)
+        def envoltura(self, request, *args, **kwargs):
+            nombres = nombres_version(self, request) if callable(nombres_version) else nombres_version
+            versiones, ultima_modificacion = obtener(*nombres)
+            # La vista puede usarlas sin volver a consultarlas (ver catalogo_clases)
+            request.versiones = versiones
+            partes = [type(self).__name__, request.accepted_renderer.format]
+            partes += [f'{nombre}={version}' for nombre, version in sorted(versiones.items())]
+            if variacion is not None:
+                momento = int(variacion(self, request))
+                partes.append(f'variacion={momento}')
+                ultima_modificacion = max(ultima_modificacion, momento)
+
+            etag = '"%s"' % hashlib.sha1('|'.join(partes).encode()).hexdigest()[:24]
+
+            # Solo el ETag decide el 304: Last-Modified tiene resolución de un
+            # segundo y dos cambios en el mismo segundo lo dejarían igual.
+            respuesta = get_conditional_response(request, etag=etag)
+            if respuesta is None:
+                respuesta = get(self, request, *args, **kwargs)
+                if respuesta.status_code == 200:
+                    respuesta['ETag'] = etag
+                    respuesta['Last-Modified'] = http_date(ultima_modificacion)
+            patch_vary_headers(respuesta, ('Accept', 'Authorization'))
+            return respuesta
+        return envoltura
+    return decorador
@@ -1,25 +1,35 @@
 # api_unfrutoparacristo/views.py
 
+import datetime
+import logging
+
 from django.db import transaction
 from rest_framework import generics, status, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.permissions import AllowAny, IsAuthenticated 
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView 
 from django.utils import timezone
-from .utils import formatear_rut
-from django.db.models import Q
+from . import rut
+from . import catalogo_clases, catalogo_frutos, estadisticas, versiones
+from .paginacion import NoticiasPaginacion, ServiciosPaginacion, ServiciosRecientesPaginacion, filtrar_ventana
+from .versiones import respuesta_condicional
+from .throttling import LoginBloqueoThrottle, LoginIPThrottle, LoginIdentificadorThrottle, ValidacionThrottle
+from django.db.models import F, Q, Value, prefetch_related_objects
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
 from django.core.mail import send_mail
 from rest_framework.decorators import api_view
-from django.utils.crypto import get_random_string
 from django.conf import settings
 from django.urls import reverse
 from rest_framework.decorators import permission_classes
-import datetime
 from .models import (
-    Usuario, Clase, Cesta, Fruto, FrutoColocado, Asistencia, Servicio, 
-    FrutoAsignado, DesafioClase, Noticia, TipoServicio
+    Usuario, Clase, Cesta, Fruto, FrutoColocado, Asistencia, AsistenciaAlumno, Servicio, 
+    FrutoAsignado, DesafioClase, Noticia, TipoServicio, TokenRestablecimiento, MascotaEstado,
+    INTERVALO_DESGASTE_SEGUNDOS,
 )
 from .serializers import (
     RegistroAlumnoSerializer,
@@ -29,7 +39,10 @@ from .serializers import (
     CustomTokenObtainPairSerializer,
     UsuarioProfileUpdateSerializer,
     CestaSerializer,
+    CestaCompactaSerializer,
     PonerFrutoSerializer, 
+    PonerFrutosSerializer,
+    DevolverFrutosSerializer,
     FrutoColocadoSerializer,
     MascotaEstadoUpdateSerializer,
     GuardarAsistenciaSerializer,
@@ -44,6 +57,7 @@ from .serializers import (
     CrearServicioSerializer,
     CrearDesafioSerializer,
     AsignarFrutoSerializer,
+    AsignarFrutoLoteSerializer,
     TipoServicioSerializer,
     DesafioClaseSerializer,
     FrutoSerializer,
@@ -51,13 +65,12 @@ from .serializers import (
     CrearNoticiaSerializer
 )
 
+logger = logging.getLogger(__name__)
+
 # ===================================================================
 # VISTAS DE RESETEO DE PASSWORD
 # ===================================================================
 
-# Aquí guardamos tokens en memoria temporal por simplicidad (idealmente usar modelo o cache)
-TOKENS = {}
-
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def enviar_reset(request):
@@ -70,11 +83,12 @@ def enviar_reset(request):
     except Usuario.DoesNotExist:
         return Response({'error': 'No se encontró un usuario con ese email'}, status=status.HTTP_404_NOT_FOUND)
 
-    token = get_random_string(32)
-    TOKENS[token] = {'user_id': user.id, 'expires': datetime.datetime.now() + datetime.timedelta(hours=1)}
+    # El token se guarda hasheado en la base de datos (ver TokenRestablecimiento)
+    token = TokenRestablecimiento.emitir(user)
 
     reset_link = f"{settings.FRONTEND_URL}/reset-password/{token}"
 
+    # Con ColaCorreoBackend esto solo encola el correo; el envío real lo hace `enviar_correos`
     send_mail(
         'Restablecer contraseña',
         f'Hola {user.username}, haz clic aquí para restablecer tu contraseña:\n{reset_link}',
@@ -95,19 +109,17 @@ def confirmar_reset(request):
     if not token or not nueva_password:
         return Response({'error': 'Token y nueva contraseña son requeridos.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    info = TOKENS.get(token)
-    if not info or info['expires'] < datetime.datetime.now():
-        return Response({'error': 'Token inválido o expirado'}, status=status.HTTP_400_BAD_REQUEST)
+    with transaction.atomic():
+        token_obj = TokenRestablecimiento.buscar_vigente(token)
+        if not token_obj:
+            return Response({'error': 'Token inválido o expirado'}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        user = Usuario.objects.get(id=info['user_id'])
-    except Usuario.DoesNotExist:
-        return Response({'error': 'Usuario no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        user = token_obj.token_usuario
+        user.set_password(nueva_password)
+        user.save()
 
-    user.set_password(nueva_password)
-    user.save()
-
-    del TOKENS[token]
+        # Un token usado invalida también cualquier otro pendiente del mismo usuario
+        TokenRestablecimiento.objects.filter(token_usuario=user).delete()
 
     return Response({'message': 'Contraseña actualizada exitosamente'})
 
@@ -120,17 +132,16 @@ class ValidarRutView(APIView):
     Vista pública para validar si un RUT ya existe en el sistema.
     """
     permission_classes = [AllowAny]
+    throttle_classes = [ValidacionThrottle]
 
     def get(self, request):
         rut_param = request.query_params.get('rut', None)
         if not rut_param:
             return Response({'error': 'No se proporcionó un RUT.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 1. Estandarizamos el RUT que llega a nuestro formato oficial
-        rut_formateado = formatear_rut(rut_param)
-
-        # 2. Buscamos en la base de datos usando ese formato estándar
-        existe = Usuario.objects.filter(usuario_rut=rut_formateado).exists()
+        # Se busca por el número del RUT (indexado), así da igual el formato que llegue
+        filtro = Usuario.filtro_rut(rut_param)
+        existe = filtro is not None and Usuario.objects.filter(filtro).exists()
         
         return Response({'existe': existe})
     
@@ -139,6 +150,7 @@ class ValidarUsernameView(APIView):
     Vista pública para validar si un nombre de usuario ya existe.
     """
     permission_classes = [AllowAny]
+    throttle_classes = [ValidacionThrottle]
 
     def get(self, request):
         username = request.query_params.get('value', None)
@@ -153,6 +165,7 @@ class ValidarEmailView(APIView):
     Vista pública para validar si un email ya existe.
     """
     permission_classes = [AllowAny]
+    throttle_classes = [ValidacionThrottle]
 
     def get(self, request):
         email = request.query_params.get('value', None)
@@ -167,8 +180,10 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     """
     Vista personalizada para la obtención de tokens JWT.
     Utiliza un serializador personalizado para la autenticación.
+    Los identificadores bloqueados por intentos fallidos se rechazan antes de verificar la contraseña.
     """
     serializer_class = CustomTokenObtainPairSerializer 
+    throttle_classes = [LoginBloqueoThrottle, LoginIPThrottle, LoginIdentificadorThrottle]
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -222,28 +237,31 @@ class RegistroProfesorView(APIView):
 # VISTAS DE DATOS DE USUARIO Y PERFILES
 # ===================================================================
 
-class UserDataView(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def aplicar_desgaste_mascota(self, mascota_estado):
-        ahora = timezone.now()
-        ultima_actualizacion = mascota_estado.mascota_estado_last_update
+def _variacion_mascota(vista, request):
+    """
+    Inicio del intervalo de desgaste actual de la mascota: el hambre y la sed
+    mostradas cambian en ese momento sin que se guarde nada.
+    """
+    ultima = MascotaEstado.objects.filter(mascota_estado_usuario_id=request.user.pk).values_list(
+        'mascota_estado_last_update', flat=True
+    ).first()
+    if ultima is None:
+        return 0
+    intervalos = MascotaEstado(mascota_estado_last_update=ultima).intervalos_transcurridos()
+    return (ultima + datetime.timedelta(seconds=intervalos * INTERVALO_DESGASTE_SEGUNDOS)).timestamp()
 
-        tiempo_pasado = ahora - ultima_actualizacion
-        bloques = int(tiempo_pasado.total_seconds() // (10 * 60))
 
-        if bloques >= 1:
-            mascota_estado.mascota_estado_hambre = max(0, mascota_estado.mascota_estado_hambre - bloques)
-            mascota_estado.mascota_estado_sed = max(0, mascota_estado.mascota_estado_sed - (bloques * 2))
-            mascota_estado.mascota_estado_last_update = ahora
-            mascota_estado.save()
+class UserDataView(APIView):
+    permission_classes = [IsAuthenticated]
 
+    @respuesta_condicional(
+        lambda vista, request: [versiones.usuario(request.user.pk), versiones.cesta(request.user.pk), 'clases'],
+        variacion=_variacion_mascota,
+    )
     def get(self, request):
+        # El desgaste de la mascota se calcula en MascotaEstadoSerializer; esta lectura no escribe.
         user = Usuario.objects.select_related('perfil_alumno', 'perfil_profesor', 'mascota_estado').get(id=request.user.id)
 
-        if hasattr(user, 'mascota_estado'):
-            self.aplicar_desgaste_mascota(user.mascota_estado)
-
         serializer = UsuarioSerializer(user)  # Usa UsuarioSerializer con 'perfil' anidado
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -281,13 +299,8 @@ class HomePageDataView(APIView):
         usuario = request.user
         
         # 1. Estadísticas Generales
-        # Estos cálculos son ejemplos. Puedes hacerlos tan complejos como necesites.
-        stats_data = {
-            "total_alumnos": Usuario.objects.filter(usuario_rol='alumno').count(),
-            "frutos_recolectados": FrutoAsignado.objects.count(),
-            "clases_activas": Clase.objects.count(), # Asumiendo un campo 'is_active' en Clase
-            "asistencia_promedio": "75%" # Esto requeriría un cálculo más complejo
-        }
+        # Se leen desde la caché; las señales las mantienen actualizadas (ver estadisticas.py).
+        stats_data = estadisticas.obtener_estadisticas()
 
         # 2. Últimas Noticias
         # --- 2. LÓGICA DE FILTRADO DE NOTICIAS CORREGIDA ---
@@ -343,22 +356,9 @@ class TeacherDashboardView(APIView):
             return Response({"detail": "Acceso no autorizado."}, status=status.HTTP_403_FORBIDDEN)
 
         clase_asignada = user.usuario_clase_actual
-        total_alumnos = 0
-        if clase_asignada:
-            total_alumnos = Usuario.objects.filter(usuario_clase_actual=clase_asignada, usuario_rol='alumno').count()
-
-        hoy = timezone.now().date()
-        frutos_recolectados = FrutoAsignado.objects.filter(
-            frutoasignado_usuario__usuario_clase_actual=clase_asignada,
-            frutoasignado_fecha=hoy
-        ).count() if clase_asignada else 0
 
-        servicio_actual = None
-        if clase_asignada:
-            servicio_actual = Servicio.objects.filter(
-                servicio_clase=clase_asignada,
-                servicio_fecha_hora__gte=timezone.now()
-            ).order_by('servicio_fecha_hora').first()
+        # El resumen de la clase se lee desde la caché (ver estadisticas.py)
+        resumen = estadisticas.obtener_resumen_clase(clase_asignada.clase_id) if clase_asignada else None
         
         # Lógica de anuncios (puedes reemplazarla con tu modelo Noticia)
         anuncios_recientes = [] 
@@ -373,11 +373,12 @@ class TeacherDashboardView(APIView):
 
         return Response({
             "current_profesor_id": user.id,
-            "total_alumnos": total_alumnos,
-            "frutos_recolectados_hoy": frutos_recolectados,
-            "servicio_actual": ServicioSerializer(servicio_actual).data if servicio_actual else None,
+            "total_alumnos": resumen['total_alumnos'] if resumen else 0,
+            "frutos_recolectados_hoy": resumen['frutos_recolectados_hoy'] if resumen else 0,
+            "servicio_actual": resumen['servicio_actual'] if resumen else None,
             "anuncios_recientes": anuncios_recientes,
-            "clase_info": clase_info
+            "clase_info": clase_info,
+            "tendencia": resumen['tendencia'] if resumen else None
         })
     
 class CrearServicioView(APIView):
@@ -466,6 +467,7 @@ class CrearNoticiaView(APIView):
 class GestionNoticiasView(APIView):
     """
     Permite a un profesor obtener y actualizar las noticias de su clase.
+    El GET se pagina por cursor (más recientes primero) y acepta `desde`/`hasta`.
     """
     permission_classes = [IsAuthenticated]
 
@@ -476,9 +478,13 @@ class GestionNoticiasView(APIView):
         if not clase_profesor:
             return Response({"error": "Este usuario no tiene una clase asignada."}, status=status.HTTP_400_BAD_REQUEST)
 
-        noticias = Noticia.objects.filter(noticia_clase=clase_profesor).order_by('-noticia_fecha_publicacion')
-        serializer = GestionNoticiaSerializer(noticias, many=True)
-        return Response(serializer.data)
+        noticias = filtrar_ventana(
+            Noticia.objects.filter(noticia_clase=clase_profesor), request, 'noticia_fecha_publicacion'
+        )
+        paginador = NoticiasPaginacion()
+        pagina = paginador.paginate_queryset(noticias, request, view=self)
+        serializer = GestionNoticiaSerializer(pagina, many=True)
+        return paginador.get_paginated_response(serializer.data)
 
     def patch(self, request):
         noticias_data = request.data
@@ -534,7 +540,7 @@ class AsignarFrutoView(APIView):
             
             # --- FIN DE LA LÓGICA DE VALIDACIÓN ---
 
-            fruto = Fruto.objects.get(fruto_id=data['fruto_id'])
+            fruto = catalogo_frutos.por_id(data['fruto_id'])
             
             # Si todas las validaciones pasan, se crea la asignación.
             FrutoAsignado.objects.create(
@@ -547,6 +553,68 @@ class AsignarFrutoView(APIView):
             
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+class AsignarFrutoLoteView(APIView):
+    """
+    Asigna frutos a varios alumnos de la clase en una sola transacción.
+    POST /api/asignar-fruto/lote/
+    Acepta una lista de {alumno_id, fruto_id, motivo} o {"asignaciones": [...]}.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        profesor = request.user
+        if not profesor.usuario_clase_actual_id:
+            return Response(
+                {"detail": "No tienes una clase asignada para realizar esta acción."}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        datos = {'asignaciones': request.data} if isinstance(request.data, list) else request.data
+        serializer = AsignarFrutoLoteSerializer(data=datos)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        asignaciones = serializer.validated_data['asignaciones']
+        clase_por_alumno = serializer.validated_data['clase_por_alumno']
+        color_por_fruto = serializer.validated_data['color_por_fruto']
+
+        alumnos_ajenos = sorted({
+            a['alumno_id'] for a in asignaciones
+            if clase_por_alumno[a['alumno_id']] != profesor.usuario_clase_actual_id
+        })
+        if alumnos_ajenos:
+            return Response(
+                {"detail": "No puedes asignar frutos a alumnos que no pertenecen a tu clase.", "alumnos": alumnos_ajenos}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        # Conteo por alumno y color para actualizar las cestas de una vez
+        conteos = {}
+        for a in asignaciones:
+            por_color = conteos.setdefault(a['alumno_id'], {})
+            color = color_por_fruto[a['fruto_id']]
+            por_color[color] = por_color.get(color, 0) + 1
+
+        # bulk_create no dispara post_save, así que las cestas se actualizan aquí y no en la señal
+        with transaction.atomic():
+            FrutoAsignado.objects.bulk_create([
+                FrutoAsignado(
+                    frutoasignado_usuario_id=a['alumno_id'],
+                    frutoasignado_fruto_id=a['fruto_id'],
+                    frutoasignado_motivo=a['motivo'],
+                    frutoasignado_origen='Manual'
+                )
+                for a in asignaciones
+            ])
+            Cesta.sumar_frutos_en_lote(conteos)
+            transaction.on_commit(lambda: estadisticas.incrementar('frutos_recolectados', len(asignaciones)))
+            transaction.on_commit(lambda: estadisticas.invalidar_resumen_clase(profesor.usuario_clase_actual_id))
+
+        return Response(
+            {"detail": "Frutos asignados correctamente.", "asignados": len(asignaciones)}, 
+            status=status.HTTP_200_OK
+        )
+    
 # ===================================================================
 # VISTAS PARA LA GESTIÓN DE ALUMNOS (CRUD)
 # ===================================================================
@@ -576,9 +644,21 @@ class GestionAlumnosListView(APIView):
             })
 
         # Filtra los alumnos que pertenecen a la clase del usuario logueado.
+        # Todas las relaciones que usa UsuarioSerializerProfeAdmin se cargan en la misma
+        # consulta, así el número de consultas no crece con el tamaño de la clase.
         alumnos = Usuario.objects.filter(
             usuario_rol='alumno', 
             usuario_clase_actual=clase_del_profesor
+        ).select_related(
+            'usuario_clase_actual__clase_mascota',
+            'usuario_clase_actual__clase_profesor_jefe',
+            'perfil_alumno__alumno_invitado_por',
+            'perfil_alumno__alumno_cambiado_por',
+        ).annotate(
+            manzanas_en_inventario=Coalesce(
+                F('cesta__cesta_total_verdes') + F('cesta__cesta_total_rojas') + F('cesta__cesta_total_doradas'),
+                Value(0)
+            )
         )
 
         # La lógica para determinar si es "jefe" se mantiene.
@@ -731,19 +811,20 @@ class AsistenciaExistenteView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, servicio_id):
-        try:
-            asistencia = Asistencia.objects.get(asistencia_servicio_id=servicio_id)
-            data = {"ruts_presentes": asistencia.obtener_lista_ruts()}
-            serializer = AsistenciaExistenteSerializer(data)
-            return Response(serializer.data)
-        except Asistencia.DoesNotExist:
-            # Si no existe, devuelve una lista vacía, lo cual es correcto
-            return Response({"ruts_presentes": []})
+        # Una sola consulta sobre la tabla de registros; si no hay asistencia la lista queda vacía
+        ruts = AsistenciaAlumno.objects.filter(
+            asistenciaalumno_asistencia__asistencia_servicio_id=servicio_id,
+            asistenciaalumno_usuario__usuario_rut__isnull=False
+        ).values_list('asistenciaalumno_usuario__usuario_rut', flat=True)
+
+        serializer = AsistenciaExistenteSerializer({"ruts_presentes": list(ruts)})
+        return Response(serializer.data)
 
 
 class GuardarAsistenciaView(APIView):
     """
     Guarda o actualiza la lista de asistencia para un servicio.
+    Solo se insertan los alumnos nuevos y se eliminan los que ya no están presentes.
     """
     permission_classes = [IsAuthenticated]
 
@@ -756,7 +837,10 @@ class GuardarAsistenciaView(APIView):
         # 2. Obtener los datos validados
         validated_data = serializer.validated_data
         servicio_id = validated_data.get("servicio_id")
-        ruts_presentes = validated_data.get("ruts_presentes", [])
+        ruts = [r for r in validated_data.get("ruts_presentes", []) if r.strip()]
+        # RUT formateado -> (número, dígito verificador), o None si no tiene forma de RUT
+        partes_por_rut = dict(zip(rut.formatear_lote(ruts), rut.partes_lote(ruts)))
+        ruts_presentes = set(partes_por_rut)
 
         # 3. Ejecutar la lógica de negocio
         try:
@@ -764,22 +848,55 @@ class GuardarAsistenciaView(APIView):
             clase = request.user.usuario_clase_actual
             fecha = servicio.servicio_fecha_hora.date()
 
-            # get_or_create es una excelente forma de manejar esto
-            asistencia, created = Asistencia.objects.get_or_create(
-                asistencia_servicio=servicio,
-                defaults={
-                    'asistencia_fecha': fecha,
-                    'asistencia_tipo_clase': clase,
-                    'asistencia_rutAsistentes': ','.join(ruts_presentes)
+            with transaction.atomic():
+                asistencia, created = Asistencia.objects.get_or_create(
+                    asistencia_servicio=servicio,
+                    defaults={
+                        'asistencia_fecha': fecha,
+                        'asistencia_tipo_clase': clase,
+                    }
+                )
+
+                id_por_partes = {
+                    (numero, dv): usuario_id
+                    for numero, dv, usuario_id in Usuario.objects.filter(
+                        usuario_rut_numero__in={partes[0] for partes in partes_por_rut.values() if partes}
+                    ).values_list('usuario_rut_numero', 'usuario_rut_dv', 'id')
                 }
-            )
+                id_por_rut = {
+                    rut_formateado: id_por_partes[partes]
+                    for rut_formateado, partes in partes_por_rut.items() if partes in id_por_partes
+                }
+                ids_presentes = set(id_por_rut.values())
+                ids_actuales = set(
+                    AsistenciaAlumno.objects.filter(asistenciaalumno_asistencia=asistencia)
+                    .values_list('asistenciaalumno_usuario_id', flat=True)
+                )
 
-            # Si el registro de asistencia ya existía, se actualiza
-            if not created:
-                asistencia.asistencia_rutAsistentes = ','.join(ruts_presentes)
-                asistencia.save()
+                # Diferencia de conjuntos: solo se tocan las filas que cambian
+                nuevos = ids_presentes - ids_actuales
+                retirados = ids_actuales - ids_presentes
+
+                if nuevos:
+                    AsistenciaAlumno.objects.bulk_create([
+                        AsistenciaAlumno(asistenciaalumno_asistencia=asistencia, asistenciaalumno_usuario_id=usuario_id)
+                        for usuario_id in nuevos
+                    ])
+                if retirados:
+                    AsistenciaAlumno.objects.filter(
+                        asistenciaalumno_asistencia=asistencia,
+                        asistenciaalumno_usuario_id__in=retirados
+                    ).delete()
+                if nuevos or retirados:
+                    # bulk_create no dispara señales, así que se invalida aquí
+                    transaction.on_commit(lambda: estadisticas.invalidar('asistencia_promedio'))
+                    transaction.on_commit(lambda: estadisticas.invalidar_resumen_clase(asistencia.asistencia_tipo_clase_id))
 
-            return Response({"status": "ok", "detail": "Asistencia guardada correctamente."}, status=status.HTTP_200_OK)
+            return Response({
+                "status": "ok",
+                "detail": "Asistencia guardada correctamente.",
+                "ruts_no_encontrados": sorted(ruts_presentes - set(id_por_rut))
+            }, status=status.HTTP_200_OK)
         
         except Servicio.DoesNotExist:
             return Response({"error": "El servicio especificado no existe."}, status=status.HTTP_404_NOT_FOUND)
@@ -790,17 +907,42 @@ class GuardarAsistenciaView(APIView):
 # VISTAS PARA EL ÁRBOL DE FRUTOS
 # ===================================================================
 
+class ArbolCompactoRenderer(JSONRenderer):
+    """
+    JSON con los frutos del árbol empaquetados. Se elige con este Accept o con ?format=compacto.
+    """
+    media_type = 'application/vnd.unfrutoparacristo.arbol-compacto+json'
+    format = 'compacto'
+
+
 class CestaDetailView(generics.RetrieveAPIView):
     """
     Vista para obtener la cesta del usuario actual.
     GET /api/cesta/
+    Con ?format=compacto (o el Accept de ArbolCompactoRenderer) los frutos
+    colocados se devuelven empaquetados (ver CestaCompactaSerializer).
     """
     serializer_class = CestaSerializer
     permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, BrowsableAPIRenderer, ArbolCompactoRenderer]
+
+    def es_compacto(self):
+        return getattr(self.request, 'accepted_renderer', None) is not None and \
+            self.request.accepted_renderer.format == ArbolCompactoRenderer.format
+
+    def get_serializer_class(self):
+        return CestaCompactaSerializer if self.es_compacto() else CestaSerializer
+
+    @respuesta_condicional(lambda vista, request: [versiones.cesta(request.user.pk)])
+    def get(self, request, *args, **kwargs):
+        return self.retrieve(request, *args, **kwargs)
 
     def get_object(self):
         # Busca (o crea si no existe) la cesta para el usuario autenticado.
         cesta, created = Cesta.objects.get_or_create(cesta_usuario=self.request.user)
+        if not self.es_compacto():
+            # El tipo de cada fruto sale del catálogo en memoria del serializer; aquí solo se precargan las filas
+            prefetch_related_objects([cesta], 'frutos_colocados')
         return cesta
 
 class FrutoListView(APIView):
@@ -808,12 +950,20 @@ class FrutoListView(APIView):
     Devuelve una lista de todos los frutos disponibles.
     """
     permission_classes = [IsAuthenticated]
+
+    @respuesta_condicional(['frutos'])
     def get(self, request):
-        frutos = Fruto.objects.all()
+        frutos = catalogo_frutos.todos()
         # Asume que ya tienes un 'FrutoSerializer'
         serializer = FrutoSerializer(frutos, many=True)
         return Response(serializer.data)
 
+SIN_FRUTOS_DISPONIBLES = {
+    'verdes': "No tienes frutos verdes disponibles.",
+    'rojas': "No tienes frutos rojos disponibles.",
+    'doradas': "No tienes frutos dorados disponibles.",
+}
+
 class PonerFrutoView(APIView):
     """
     Vista para añadir un fruto al árbol.
@@ -823,54 +973,32 @@ class PonerFrutoView(APIView):
 
     @transaction.atomic
     def post(self, request, *args, **kwargs):
-        # --- DEBUG: Imprimimos los datos crudos que llegan desde React ---
-        print("======================================================")
-        print("DATOS RECIBIDOS DESDE EL FRONTEND:")
-        print(request.data)
-        print("======================================================")
-
         serializer = PonerFrutoSerializer(data=request.data)
         if not serializer.is_valid():
-            # --- DEBUG: Si la validación falla, imprimimos los errores ---
-            print("!!! ERROR DE VALIDACIÓN DEL SERIALIZER:")
-            print(serializer.errors)
-            print("======================================================")
+            logger.info("Datos inválidos al poner fruto", extra={'usuario_id': request.user.pk, 'errores': serializer.errors})
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
         data = serializer.validated_data
-        
-        # --- DEBUG: Imprimimos el tipo de fruto validado ---
         tipo = data['tipo']
-        print(f"TIPO DE FRUTO RECIBIDO (validado): '{tipo}'")
         
         # ==================================================================
         # ¡CORRECCIÓN! Usamos get_or_create para evitar errores si la cesta no existe.
         # Esto busca la cesta y, si no la encuentra, la crea.
         # ==================================================================
-        cesta, created = Cesta.objects.select_for_update().get_or_create(cesta_usuario=request.user)
+        cesta, created = Cesta.objects.get_or_create(cesta_usuario=request.user)
         if created:
-            print(f"Se ha creado una nueva cesta para el usuario: {request.user.username}")
-        
-        # Verificación de inventario
-        if tipo == 'verdes' and cesta.cesta_total_verdes <= 0:
-            return Response({"error": "No tienes frutos verdes disponibles."}, status=status.HTTP_400_BAD_REQUEST)
-        if tipo == 'rojas' and cesta.cesta_total_rojas <= 0:
-            return Response({"error": "No tienes frutos rojos disponibles."}, status=status.HTTP_400_BAD_REQUEST)
-        if tipo == 'doradas' and cesta.cesta_total_doradas <= 0:
-            return Response({"error": "No tienes frutos dorados disponibles."}, status=status.HTTP_400_BAD_REQUEST)
+            logger.info("Cesta creada al poner fruto", extra={'usuario_id': request.user.pk})
 
-        try:
-            # --- DEBUG: Intentamos buscar el fruto en la base de datos ---
-            print(f"Buscando en la DB un Fruto con fruto_color='{tipo}'")
-            fruto_obj = Fruto.objects.get(fruto_color=tipo)
-            print(f"Fruto encontrado: {fruto_obj}")
-
-        except Fruto.DoesNotExist:
-            # --- DEBUG: Si no se encuentra, lo informamos ---
-            print(f"!!! ERROR: No se encontró ningún Fruto con fruto_color='{tipo}'")
-            print("======================================================")
+        # El catálogo de frutos está en memoria: no se consulta la base de datos
+        fruto_obj = catalogo_frutos.por_color(tipo)
+        if fruto_obj is None or tipo not in Cesta.CAMPOS_POR_COLOR:
+            logger.warning("No existe un Fruto para el color solicitado", extra={'tipo': tipo})
             return Response({"error": "Tipo de fruto no válido"}, status=status.HTTP_400_BAD_REQUEST)
 
+        # La verificación de inventario va en el mismo UPDATE que mueve el fruto al árbol
+        if not cesta.poner_fruto(tipo):
+            return Response({"error": SIN_FRUTOS_DISPONIBLES[tipo]}, status=status.HTTP_400_BAD_REQUEST)
+
         # Creamos el nuevo FrutoColocado
         nuevo_fruto = FrutoColocado.objects.create(
             frutocolocado_cesta=cesta,
@@ -879,22 +1007,12 @@ class PonerFrutoView(APIView):
             position_y=data['position'][1],
             position_z=data['position'][2],
         )
-        
-        # Actualizamos los contadores en el modelo Cesta
-        if tipo == 'verdes':
-            cesta.cesta_total_verdes -= 1
-            cesta.cesta_verdes_puestas += 1
-        elif tipo == 'rojas':
-            cesta.cesta_total_rojas -= 1
-            cesta.cesta_rojas_puestas += 1
-        elif tipo == 'doradas':
-            cesta.cesta_total_doradas -= 1
-            cesta.cesta_doradas_puestas += 1
-        cesta.save()
 
         response_serializer = FrutoColocadoSerializer(nuevo_fruto)
-        print("Respuesta enviada al frontend:", response_serializer.data)
-        print("======================================================")
+        logger.debug(
+            "Fruto colocado",
+            extra={'usuario_id': request.user.pk, 'tipo': tipo, 'frutocolocado_id': nuevo_fruto.pk},
+        )
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
     
 class DevolverFrutoView(APIView):
@@ -906,40 +1024,146 @@ class DevolverFrutoView(APIView):
 
     @transaction.atomic
     def delete(self, request, pk, *args, **kwargs):
-        # Usamos select_for_update para bloquear la fila de la cesta y evitar condiciones de carrera
-        cesta = Cesta.objects.select_for_update().get(cesta_usuario=request.user)
-        
         try:
             # Buscamos el fruto colocado por su ID y nos aseguramos de que pertenezca a la cesta del usuario.
-            fruto_a_devolver = FrutoColocado.objects.get(pk=pk, frutocolocado_cesta=cesta)
+            fruto_a_devolver = FrutoColocado.objects.select_related('frutocolocado_cesta', 'frutocolocado_fruto').get(
+                pk=pk, frutocolocado_cesta__cesta_usuario=request.user
+            )
         except FrutoColocado.DoesNotExist:
             return Response(
                 {"error": "Fruto no encontrado o no te pertenece."}, 
                 status=status.HTTP_404_NOT_FOUND
             )
-        
-        # Guardamos el tipo de fruto antes de borrarlo para saber qué contador actualizar
-        tipo_fruto = fruto_a_devolver.frutocolocado_fruto.fruto_color
-        
-        # Actualizamos los contadores en el modelo Cesta
-        if tipo_fruto == 'verdes':
-            cesta.cesta_total_verdes += 1
-            cesta.cesta_verdes_puestas -= 1
-        elif tipo_fruto == 'rojas':
-            cesta.cesta_total_rojas += 1
-            cesta.cesta_rojas_puestas -= 1
-        elif tipo_fruto == 'doradas':
-            cesta.cesta_total_doradas += 1
-            cesta.cesta_doradas_puestas -= 1
-        
-        cesta.save()
-        
-        # Eliminamos el registro del fruto colocado
-        fruto_a_devolver.delete()
-        
+
+        color = fruto_a_devolver.frutocolocado_fruto.fruto_color
+        if color not in Cesta.CAMPOS_POR_COLOR:
+            # La cesta no tiene contador para ese color: no hay dónde devolverlo
+            logger.error("Fruto colocado con un color sin contador en la cesta", extra={'fruto_colocado_id': pk, 'color': color})
+            return Response({"error": "No se pudo devolver el fruto."}, status=status.HTTP_409_CONFLICT)
+
+        # Si otra petición ya lo eliminó, no se devuelve dos veces
+        eliminados, _ = FrutoColocado.objects.filter(pk=fruto_a_devolver.pk).delete()
+        if not eliminados:
+            return Response(
+                {"error": "Fruto no encontrado o no te pertenece."}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        # Actualizamos los contadores con un solo UPDATE
+        cesta = fruto_a_devolver.frutocolocado_cesta
+        if not cesta.devolver_fruto(color):
+            # Los contadores no cuadran con los frutos del árbol: no se borra el fruto
+            transaction.set_rollback(True)
+            logger.error("Contadores de la cesta inconsistentes al devolver un fruto", extra={'cesta_id': cesta.pk, 'color': color})
+            return Response({"error": "No se pudo devolver el fruto."}, status=status.HTTP_409_CONFLICT)
+
         # Devolvemos una respuesta exitosa sin contenido, estándar para DELETE
         return Response(status=status.HTTP_204_NO_CONTENT)
     
+class PonerFrutosView(APIView):
+    """
+    Coloca varios frutos en el árbol en una sola transacción.
+    POST /api/cesta/poner_frutos/
+    Acepta una lista de {tipo, position} o {"frutos": [...]}.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @transaction.atomic
+    def post(self, request, *args, **kwargs):
+        datos = {'frutos': request.data} if isinstance(request.data, list) else request.data
+        serializer = PonerFrutosSerializer(data=datos)
+        if not serializer.is_valid():
+            logger.info("Datos inválidos al poner frutos", extra={'usuario_id': request.user.pk, 'errores': serializer.errors})
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        frutos = serializer.validated_data['frutos']
+        conteos = {}
+        for item in frutos:
+            conteos[item['tipo']] = conteos.get(item['tipo'], 0) + 1
+
+        fruto_por_color = {tipo: catalogo_frutos.por_color(tipo) for tipo in conteos}
+        if None in fruto_por_color.values():
+            logger.warning("No existe un Fruto para el color solicitado", extra={'tipos': sorted(conteos)})
+            return Response({"error": "Tipo de fruto no válido"}, status=status.HTTP_400_BAD_REQUEST)
+
+        cesta, created = Cesta.objects.get_or_create(cesta_usuario=request.user)
+        if created:
+            logger.info("Cesta creada al poner frutos", extra={'usuario_id': request.user.pk})
+
+        # Inventario de todo el lote verificado y descontado en un solo UPDATE
+        if not cesta.poner_frutos(conteos):
+            cesta.refresh_from_db()
+            faltantes = {
+                tipo: cantidad - getattr(cesta, Cesta.CAMPOS_POR_COLOR[tipo][0])
+                for tipo, cantidad in conteos.items()
+                if cantidad > getattr(cesta, Cesta.CAMPOS_POR_COLOR[tipo][0])
+            }
+            return Response(
+                {"error": "No tienes suficientes frutos disponibles.", "faltantes": faltantes},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        nuevos = FrutoColocado.objects.bulk_create([
+            FrutoColocado(
+                frutocolocado_cesta=cesta,
+                frutocolocado_fruto=fruto_por_color[item['tipo']],
+                position_x=item['position'][0],
+                position_y=item['position'][1],
+                position_z=item['position'][2],
+            )
+            for item in frutos
+        ])
+        logger.debug("Frutos colocados", extra={'usuario_id': request.user.pk, 'cantidad': len(nuevos)})
+        return Response(FrutoColocadoSerializer(nuevos, many=True).data, status=status.HTTP_201_CREATED)
+
+
+class DevolverFrutosView(APIView):
+    """
+    Devuelve varios frutos del árbol al inventario en una sola transacción.
+    POST /api/cesta/devolver_frutos/ con {"ids": [...]}
+    """
+    permission_classes = [IsAuthenticated]
+
+    @transaction.atomic
+    def post(self, request, *args, **kwargs):
+        serializer = DevolverFrutosSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        ids = set(serializer.validated_data['ids'])
+
+        # Se bloquean las filas: si otra petición devuelve los mismos frutos, espera
+        # y luego ya no los encuentra, así ninguno se devuelve dos veces.
+        colocados = list(
+            FrutoColocado.objects.select_for_update()
+            .filter(pk__in=ids, frutocolocado_cesta__cesta_usuario=request.user)
+            .values_list('frutocolocado_id', 'frutocolocado_cesta_id', 'frutocolocado_fruto_id')
+        )
+        no_encontrados = sorted(ids - {fruto_id for fruto_id, _, _ in colocados})
+        if no_encontrados:
+            return Response(
+                {"error": "Fruto no encontrado o no te pertenece.", "ids": no_encontrados}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        conteos = {}
+        for _, _, fruto_id in colocados:
+            color = catalogo_frutos.por_id(fruto_id).fruto_color
+            conteos[color] = conteos.get(color, 0) + 1
+        sin_contador = sorted(set(conteos) - set(Cesta.CAMPOS_POR_COLOR))
+        if sin_contador:
+            logger.error("Frutos colocados con colores sin contador en la cesta", extra={'colores': sin_contador})
+            return Response({"error": "No se pudieron devolver los frutos."}, status=status.HTTP_409_CONFLICT)
+
+        FrutoColocado.objects.filter(pk__in=ids).delete()
+        cesta = Cesta(pk=colocados[0][1], cesta_usuario_id=request.user.pk)
+        if not cesta.devolver_frutos(conteos):
+            # Los contadores no cuadran con los frutos del árbol: no se borra nada
+            transaction.set_rollback(True)
+            logger.error("Contadores de la cesta inconsistentes al devolver frutos", extra={'cesta_id': cesta.pk, 'conteos': conteos})
+            return Response({"error": "No se pudieron devolver los frutos."}, status=status.HTTP_409_CONFLICT)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
 # ===================================================================
 # VISTAS AUXILIARES PARA LISTAS (Dropdowns, etc.)
 # ===================================================================
@@ -950,6 +1174,8 @@ class TipoServicioListView(APIView):
     Devuelve una lista de todos los tipos de servicio disponibles.
     """
     permission_classes = [IsAuthenticated]
+
+    @respuesta_condicional(['tipos_servicio'])
     def get(self, request):
         tipos = TipoServicio.objects.all()
         # Asume que ya tienes un 'TipoServicioSerializer'
@@ -959,13 +1185,33 @@ class TipoServicioListView(APIView):
 class ClaseListView(generics.ListAPIView):
     """
     Vista de API para listar todas las clases disponibles.
+    Pública (la usa el registro): el JSON sale ya renderizado de
+    catalogo_clases y los navegadores/proxies pueden guardarlo CLASES_MAX_AGE
+    segundos; después revalidan con el ETag.
     """
-    queryset = Clase.objects.all()
+    queryset = Clase.objects.select_related('clase_mascota', 'clase_profesor_jefe')
     serializer_class = ClaseSerializer
     permission_classes = [AllowAny]
 
+    @respuesta_condicional(['clases'])
+    def get(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return self.list(request, *args, **kwargs)
+        return HttpResponse(catalogo_clases.contenido(request.versiones['clases']), content_type='application/json')
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if response.status_code in (200, 304):
+            patch_cache_control(response, public=True, max_age=getattr(settings, 'CLASES_MAX_AGE', 60))
+        return response
+
     
 class ServicioListAPIView(APIView):
+    """
+    Servicios de la clase del usuario para el calendario, del más antiguo al
+    más reciente. Paginado por cursor; el calendario pide solo el rango
+    visible con `desde`/`hasta`.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -973,14 +1219,16 @@ class ServicioListAPIView(APIView):
         clase = usuario.usuario_clase_actual
 
         if not clase:
-            return Response([], status=status.HTTP_200_OK)
+            servicios = Servicio.objects.none()
+        else:
+            servicios = filtrar_ventana(
+                Servicio.objects.filter(servicio_clase=clase), request, 'servicio_fecha_hora'
+            ).select_related('servicio_tiposervicio', 'servicio_profesor_encargado')
 
-        servicios = Servicio.objects.filter(
-            servicio_clase=clase
-        ).order_by('servicio_fecha_hora')
-
-        serializer = ServicioSerializer(servicios, many=True)
-        return Response(serializer.data)
+        paginador = ServiciosPaginacion()
+        pagina = paginador.paginate_queryset(servicios, request, view=self)
+        serializer = ServicioSerializer(pagina, many=True)
+        return paginador.get_paginated_response(serializer.data)
 
 
 
@@ -993,19 +1241,17 @@ class ServiciosDisponiblesListView(APIView):
         # Primero, verificamos que el profesor tenga una clase asignada
         if not hasattr(usuario, 'usuario_clase_actual') or not usuario.usuario_clase_actual:
             # Si no tiene clase, no puede ver ningún servicio
-            return Response([], status=status.HTTP_200_OK)
-
-        clase_del_profesor = usuario.usuario_clase_actual
-
-        # 👇 --- LÓGICA DE FILTRADO CORREGIDA --- 👇
-        # Filtramos los servicios que pertenecen a la clase del profesor
-        servicios = Servicio.objects.filter(
-            servicio_clase=clase_del_profesor
-        ).order_by('-servicio_fecha_hora') # Ordenamos por fecha descendente
-
-        # Necesitarás un serializer simple para Servicio
-        serializer = ServicioAsistenciaSerializer(servicios, many=True) 
-        return Response(serializer.data)
+            servicios = Servicio.objects.none()
+        else:
+            # Servicios de la clase del profesor, del más reciente al más antiguo (lo ordena el paginador)
+            servicios = filtrar_ventana(
+                Servicio.objects.filter(servicio_clase=usuario.usuario_clase_actual), request, 'servicio_fecha_hora'
+            ).select_related('servicio_tiposervicio')
+
+        paginador = ServiciosRecientesPaginacion()
+        pagina = paginador.paginate_queryset(servicios, request, view=self)
+        serializer = ServicioAsistenciaSerializer(pagina, many=True)
+        return paginador.get_paginated_response(serializer.data)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
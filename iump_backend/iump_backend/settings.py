@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -103,13 +106,133 @@ WSGI_APPLICATION = 'iump_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+#
+# Se elige con variables de entorno:
+# - UNFRUTO_DB_MOTOR=sqlite (por defecto): desarrollo e instalaciones pequeñas.
+#   Cada conexión aplica SQLITE_PRAGMAS (ver api_unfrutoparacristo/base_datos.py).
+# - UNFRUTO_DB_MOTOR=postgresql: producción con varios workers. Conexiones
+#   persistentes (CONN_MAX_AGE) con chequeo de salud, o el pool de psycopg 3
+#   con UNFRUTO_DB_POOL=1 (en ese caso CONN_MAX_AGE debe ser 0).
+
+DB_MOTOR = os.environ.get('UNFRUTO_DB_MOTOR', 'sqlite')
+
+if DB_MOTOR == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('UNFRUTO_DB_NOMBRE', 'unfrutoparacristo'),
+            'USER': os.environ.get('UNFRUTO_DB_USUARIO', 'unfrutoparacristo'),
+            'PASSWORD': os.environ.get('UNFRUTO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('UNFRUTO_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('UNFRUTO_DB_PUERTO', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('UNFRUTO_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('UNFRUTO_DB_POOL') == '1':
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('UNFRUTO_DB_POOL_MIN', '2')),
+            'max_size': int(os.environ.get('UNFRUTO_DB_POOL_MAX', '10')),
+            'timeout': 10,
+        }
+elif DB_MOTOR == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('UNFRUTO_DB_NOMBRE', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Toma el bloqueo de escritura al abrir cada atomic(). Con el modo
+                # por defecto, una transacción que lee y luego escribe falla con
+                # "database is locked" sin respetar busy_timeout si otra escribe
+                # entre medio. Todos los atomic() de la app escriben; las lecturas
+                # en autocommit no toman el bloqueo y con WAL no esperan a nadie.
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
     }
+else:
+    raise ImproperlyConfigured(f"UNFRUTO_DB_MOTOR debe ser 'sqlite' o 'postgresql', no {DB_MOTOR!r}")
+
+# PRAGMA aplicados a cada conexión SQLite. `python manage.py sqlite_maintenance`
+# ejecuta ANALYZE/optimize (y VACUUM si hace falta) y muestra las páginas libres.
+SQLITE_PRAGMAS = {
+    # WAL por defecto, también en BASE_DIR/db.sqlite3. Queda guardado en el
+    # archivo; UNFRUTO_SQLITE_WAL=0 deja el modo que tenga la base (para una
+    # copia de pruebas que no se quiera modificar).
+    'journal_mode': 'WAL' if os.environ.get('UNFRUTO_SQLITE_WAL', '1') == '1' else None,
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('UNFRUTO_SQLITE_BUSY_TIMEOUT_MS', '20000')),
+    'mmap_size': int(os.environ.get('UNFRUTO_SQLITE_MMAP_MB', '64')) * 1024 * 1024,
+    'cache_size': -int(os.environ.get('UNFRUTO_SQLITE_CACHE_MB', '20')) * 1024,
+    'temp_store': 'MEMORY',
 }
 
+# Caché
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# En memoria por defecto. Con UNFRUTO_CACHE_REDIS (p. ej. 'redis://127.0.0.1:6379')
+# se comparte entre workers. Los contadores de los GET condicionales no usan
+# la caché (ver api_unfrutoparacristo/versiones.py).
+
+if os.environ.get('UNFRUTO_CACHE_REDIS'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['UNFRUTO_CACHE_REDIS'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unfrutoparacristo',
+        }
+    }
+
+# Segundos que las estadísticas del Home permanecen en caché (ver estadisticas.py)
+ESTADISTICAS_CACHE_TIMEOUT = 60 * 60
+
+# Resumen por clase del panel del profesor: duración en caché y semanas de tendencia
+PANEL_CACHE_TIMEOUT = 60 * 60
+PANEL_SEMANAS_TENDENCIA = 4
+
+# Registro estructurado (ver api_unfrutoparacristo/bitacora.py). Los registros
+# se escriben en stderr desde un hilo aparte; bajo WARNING se guarda solo la
+# fracción LOG_TASA_MUESTREO.
+LOG_NIVEL = os.environ.get('UNFRUTO_LOG_NIVEL', 'INFO')
+LOG_TASA_MUESTREO = float(os.environ.get('UNFRUTO_LOG_TASA_MUESTREO', '1.0'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'muestreo': {
+            '()': 'api_unfrutoparacristo.bitacora.FiltroMuestreo',
+            'tasa': LOG_TASA_MUESTREO,
+        },
+    },
+    'handlers': {
+        'cola': {
+            '()': 'api_unfrutoparacristo.bitacora.ManejadorCola',
+            'filters': ['muestreo'],
+        },
+    },
+    'loggers': {
+        'api_unfrutoparacristo': {
+            'handlers': ['cola'],
+            'level': LOG_NIVEL,
+            'propagate': False,
+        },
+    },
+}
+
+# Segundos antes de que cada worker recargue el catálogo de frutos (ver catalogo_frutos.py)
+CATALOGO_FRUTOS_TTL = 5 * 60
+
+# max-age (segundos) del Cache-Control de /clases/, público (ver catalogo_clases.py)
+CLASES_MAX_AGE = 60
+
 AUTHENTICATION_BACKENDS = [
     'api_unfrutoparacristo.backends.EmailOrUsernameBackend',  # O el path correcto según tu app
 ]
@@ -167,10 +290,26 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Tasas de api_unfrutoparacristo/throttling.py (ventana deslizante en CACHES)
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '20/min',
+        'login_identificador': '10/min',
+        'validacion': '60/min',
+    },
 }
 
+# Bloqueo de un identificador tras varios logins fallidos seguidos
+LOGIN_MAX_FALLOS = 5
+LOGIN_VENTANA_FALLOS_SEGUNDOS = 15 * 60
+LOGIN_BLOQUEO_SEGUNDOS = 15 * 60
+
 # Configuración de email con Gmail
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Los correos se encolan en la base de datos (CorreoSaliente) y el comando
+# `python manage.py enviar_correos --continuo` los envía con CORREO_BACKEND_ENVIO.
+EMAIL_BACKEND = 'api_unfrutoparacristo.correos.ColaCorreoBackend'
+CORREO_BACKEND_ENVIO = 'django.core.mail.backends.smtp.EmailBackend'
+CORREO_MAX_INTENTOS = 5
+CORREO_ESPERA_BASE_SEGUNDOS = 60
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
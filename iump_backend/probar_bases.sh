@@ -0,0 +1,35 @@
+#!/usr/bin/env bash
+# Ejecuta la suite de pruebas contra SQLite y contra PostgreSQL.
+#
+# Para PostgreSQL usa el servidor indicado en UNFRUTO_DB_HOST/UNFRUTO_DB_PUERTO
+# (el usuario debe poder crear bases de datos). Si UNFRUTO_DB_HOST no está
+# definido, levanta un servidor temporal con initdb y pg_ctl, sin Docker, y lo
+# detiene al terminar.
+#
+# Pruebas que solo corren en SQLite (se saltan con @skipUnless en PostgreSQL):
+# - SqliteTests: PRAGMA aplicados a cada conexión.
+# - SqliteMantenimientoTests: comando sqlite_maintenance (VACUUM, checkpoint del WAL).
+# El resto debe pasar igual en ambos motores, incluidos los conteos de
+# consultas y verificar_indices (que revisa el plan de cada motor).
+#
+# Requiere psycopg (requirements.txt) y, sin UNFRUTO_DB_HOST, initdb y pg_ctl en el PATH.
+#
+# Uso: ./probar_bases.sh [argumentos de manage.py test]
+set -euo pipefail
+cd "$(dirname "$0")"
+
+echo "== SQLite =="
+UNFRUTO_DB_MOTOR=sqlite python manage.py test "$@"
+
+echo "== PostgreSQL =="
+python -c 'import psycopg' 2>/dev/null || { echo "Falta psycopg: pip install -r requirements.txt" >&2; exit 1; }
+if [ -z "${UNFRUTO_DB_HOST:-}" ]; then
+    TEMPORAL=$(mktemp -d)
+    export UNFRUTO_DB_HOST="$TEMPORAL" UNFRUTO_DB_PUERTO="${UNFRUTO_DB_PUERTO:-54329}"
+    initdb -D "$TEMPORAL/datos" -U "${UNFRUTO_DB_USUARIO:-unfrutoparacristo}" --auth=trust > /dev/null
+    # Solo socket Unix en el directorio temporal, sin escuchar en TCP
+    pg_ctl -D "$TEMPORAL/datos" -l "$TEMPORAL/postgres.log" -w \
+        -o "-p $UNFRUTO_DB_PUERTO -k $TEMPORAL -c listen_addresses=''" start > /dev/null
+    trap 'pg_ctl -D "$TEMPORAL/datos" -m fast -w stop > /dev/null; rm -rf "$TEMPORAL"' EXIT
+fi
+UNFRUTO_DB_MOTOR=postgresql python manage.py test "$@"
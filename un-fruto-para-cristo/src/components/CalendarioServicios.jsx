@@ -1,35 +1,39 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useCallback } from 'react';
 import FullCalendar from '@fullcalendar/react';
 import dayGridPlugin from '@fullcalendar/daygrid';
 import ModalServicioDetalle from './ModalServicioDetalle'; // crea este modal con los datos que quieras mostrar
 
 function CalendarioServicios({ makeAuthenticatedRequest }) {
-  const [eventos, setEventos] = useState([]);
   const [servicioSeleccionado, setServicioSeleccionado] = useState(null);
   const [modalAbierto, setModalAbierto] = useState(false);
 
-  useEffect(() => {
-    async function fetchEventos() {
-      try {
-        const res = await makeAuthenticatedRequest(`${import.meta.env.VITE_API_URL}/servicios/`);
+  // FullCalendar llama a esta función con el rango visible; la API está paginada
+  // por cursor, así que seguimos `next` hasta traer todos los servicios del rango.
+  const fetchEventos = useCallback(async (fetchInfo, successCallback, failureCallback) => {
+    try {
+      const params = new URLSearchParams({ desde: fetchInfo.startStr, hasta: fetchInfo.endStr });
+      let url = `${import.meta.env.VITE_API_URL}/servicios/?${params}`;
+      const servicios = [];
+      while (url) {
+        const res = await makeAuthenticatedRequest(url);
         if (!res.ok) throw new Error('No autorizado o error en la API');
         const data = await res.json();
-        const eventosMapped = data.map(srv => ({
-          id: srv.servicio_id,
-          title: srv.servicio_descripcion,
-          start: srv.servicio_fecha_hora,
-          extendedProps: {
-            tipo_servicio: srv.tipo_servicio,
-            profesor_encargado: srv.profesor_encargado,
-          }
-        }));
-
-        setEventos(eventosMapped);
-      } catch (error) {
-        console.error(error);
+        servicios.push(...data.results);
+        url = data.next;
       }
+      successCallback(servicios.map(srv => ({
+        id: srv.servicio_id,
+        title: srv.servicio_descripcion,
+        start: srv.servicio_fecha_hora,
+        extendedProps: {
+          tipo_servicio: srv.tipo_servicio,
+          profesor_encargado: srv.profesor_encargado,
+        }
+      })));
+    } catch (error) {
+      console.error(error);
+      failureCallback(error);
     }
-    fetchEventos();
   }, [makeAuthenticatedRequest]);
 
   const handleEventClick = (clickInfo) => {
@@ -48,7 +52,7 @@ function CalendarioServicios({ makeAuthenticatedRequest }) {
       <FullCalendar
         plugins={[dayGridPlugin]}
         initialView="dayGridMonth"
-        events={eventos}
+        events={fetchEventos}
         eventClick={handleEventClick}
       />
 
@@ -16,10 +16,17 @@ export default function ModalAsistencia({ isOpen, onClose, makeAuthenticatedRequ
 
     setIsLoading(true);
     try {
-      const response = await makeAuthenticatedRequest(`${import.meta.env.VITE_API_URL}/servicios-disponibles/`);
-      if (!response.ok) throw new Error('No se pudieron cargar los servicios disponibles.');
-      const data = await response.json();
-      setServicios(data);
+      // La API está paginada por cursor: seguimos `next` hasta traer todos los servicios
+      let url = `${import.meta.env.VITE_API_URL}/servicios-disponibles/`;
+      const todos = [];
+      while (url) {
+        const response = await makeAuthenticatedRequest(url);
+        if (!response.ok) throw new Error('No se pudieron cargar los servicios disponibles.');
+        const data = await response.json();
+        todos.push(...data.results);
+        url = data.next;
+      }
+      setServicios(todos);
     } catch (error) {
       Swal.fire('Error', error.message, 'error');
     } finally {
@@ -156,10 +156,17 @@ const GestionNoticiasModal = ({ isOpen, onClose, makeAuthenticatedRequest }) =>
         setIsLoading(true);
         setError(null);
         try {
-            const response = await makeAuthenticatedRequest(`${import.meta.env.VITE_API_URL}/gestionar-noticias/`);
-            if (!response.ok) throw new Error('No se pudieron cargar las noticias.');
-            const data = await response.json();
-            setNoticias(data);
+            // La API está paginada por cursor: seguimos `next` hasta traer todas las noticias
+            let url = `${import.meta.env.VITE_API_URL}/gestionar-noticias/`;
+            const todas = [];
+            while (url) {
+                const response = await makeAuthenticatedRequest(url);
+                if (!response.ok) throw new Error('No se pudieron cargar las noticias.');
+                const data = await response.json();
+                todas.push(...data.results);
+                url = data.next;
+            }
+            setNoticias(todas);
         } catch (err) {
             setError(err.message);
         } finally {